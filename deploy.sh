@@ -173,6 +173,24 @@ else
     }
 fi
 
+# バックグラウンドワーカー（メール送信キュー等）を設定・再起動
+if [ ! -f "/etc/systemd/system/yomohiro_worker.service" ]; then
+    if [ -f "config/yomohiro_worker.service" ]; then
+        echo "⚙️  バックグラウンドワーカーのサービスを設定中（初回セットアップ）..."
+        sudo cp config/yomohiro_worker.service /etc/systemd/system/
+        sudo systemctl daemon-reload
+        sudo systemctl enable yomohiro_worker
+        sudo systemctl start yomohiro_worker
+        echo "✅ バックグラウンドワーカーを設定しました"
+    fi
+else
+    echo "🔄 バックグラウンドワーカーを再起動中..."
+    sudo systemctl restart yomohiro_worker || {
+        echo "⚠️  ワーカーの再起動に失敗しました。状態を確認してください。"
+        sudo systemctl status yomohiro_worker
+    }
+fi
+
 # Nginxをインストール（未インストールの場合）
 if ! command -v nginx &> /dev/null; then
     echo "📦 Nginxをインストール中..."
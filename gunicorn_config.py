@@ -1,4 +1,6 @@
 # Gunicorn設定ファイル
+import os
+import signal
 
 # サーバーソケット
 bind = "127.0.0.1:8000"
@@ -25,3 +27,32 @@ proc_name = "yomohiro_reservation"
 # デーモン化（systemdで管理する場合はFalse）
 daemon = False
 
+
+# ワーカーの再起動（メモリが少しずつ増え続けても一定で入れ替わるようにする）
+# GUNICORN_MAX_REQUESTS 件処理したら再起動（jitter で全ワーカーが同時に再起動しないようにずらす）
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+# RSS が GUNICORN_MAX_WORKER_RSS_MB を超えたワーカーは処理中のリクエストを終えてから再起動する（0 なら無効）
+max_worker_rss_mb = int(os.environ.get("GUNICORN_MAX_WORKER_RSS_MB", "300"))
+
+
+def post_worker_init(worker):
+    # gunicorn がワーカーのシグナルハンドラを設定し直した後に、メモリのスナップショット出力用のハンドラを登録する
+    from reservations import memory_profiling
+
+    signum = memory_profiling.install_signal_handler()
+    if signum:
+        worker.log.info("memory snapshot: kill -%s %s", signal.Signals(signum).name, worker.pid)
+
+
+def post_request(worker, req, environ, resp):
+    if not max_worker_rss_mb:
+        return
+    from reservations.memory_profiling import current_rss_kb
+
+    rss_mb = current_rss_kb() // 1024
+    if rss_mb > max_worker_rss_mb and worker.alive:
+        worker.log.warning(
+            "worker %s: RSS %sMB が上限 %sMB を超えたため再起動します", worker.pid, rss_mb, max_worker_rss_mb,
+        )
+        worker.alive = False
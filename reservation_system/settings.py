@@ -55,10 +55,16 @@ INSTALLED_APPS = [
     'allauth',
     'allauth.account',
     'allauth.socialaccount',
-    'allauth.socialaccount.providers.line',
     'reservations',
 ]
 
+# LINE Login（LINE Developers の LINE Login チャネルの Channel ID / Secret）
+LINE_CHANNEL_ID = config('LINE_CHANNEL_ID', default='')
+LINE_CHANNEL_SECRET = config('LINE_CHANNEL_SECRET', default='')
+if LINE_CHANNEL_ID and LINE_CHANNEL_SECRET:
+    # 未設定なら provider を読み込まない（OAuth 用の views と requests を起動時に読み込まずに済む）
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('reservations'), 'allauth.socialaccount.providers.line')
+
 SITE_ID = 1
 
 MIDDLEWARE = [
@@ -72,6 +78,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'reservations.middleware.SuperuserRequiredMiddleware',  # スーパーユーザー制限ミドルウェア
+    'reservations.middleware.MemoryProfilingMiddleware',  # MEMORY_PROFILING_ENABLED=True のときのみ有効
 ]
 
 ROOT_URLCONF = 'reservation_system.urls'
@@ -163,6 +170,72 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# セッション。予約手続きの入力内容は BookingDraft、会員登録の顔写真は一時ファイルに置き、セッションは小さく保つ。
+# SESSION_PROFILE:
+#   db        … 毎リクエスト django_session を読む（開発時の既定）
+#   cached_db … 読み込みはファイルキャッシュ（同一サーバの全ワーカーで共有）から行い、DB は変更時のみ書く（本番の既定）
+# 期限切れの行は run_worker（または manage.py prune_sessions）が少しずつ削除する。
+SESSION_PROFILE = config('SESSION_PROFILE', default='db' if DEBUG else 'cached_db')
+if SESSION_PROFILE == 'cached_db':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    SESSION_CACHE_ALIAS = 'sessions'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # LocMem はワーカーごとに別のため、セッションはファイルキャッシュで共有する
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('SESSION_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'sessions')),
+        'TIMEOUT': 60 * 60 * 24 * 14,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # 会員QRコードの SVG（トークンごとに 1 回だけ生成。manage.py prerender_member_qr で事前生成できる）
+    'member_qr': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('MEMBER_QR_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'member_qr')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # 全ワーカー（gunicorn・run_worker）で共有する小さな値（管理者通知の宛先など）。破棄も全ワーカーに効く
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('SHARED_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'shared')),
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# 会員登録の顔写真など、複数ステップのフォームで一時保存するファイル（MEDIA_ROOT/tmp）の保持秒数
+TEMP_UPLOAD_TTL_SECONDS = config('TEMP_UPLOAD_TTL_SECONDS', default=3600, cast=int)
+
+# 会員の顔写真はバックグラウンドで長辺 MEMBER_PHOTO_MAX_DIMENSION px の JPEG に縮小し、
+# 一覧表示用に MEMBER_PHOTO_THUMBNAIL_SIZE px 四方のサムネイルを作る
+MEMBER_PHOTO_MAX_DIMENSION = config('MEMBER_PHOTO_MAX_DIMENSION', default=1024, cast=int)
+MEMBER_PHOTO_THUMBNAIL_SIZE = config('MEMBER_PHOTO_THUMBNAIL_SIZE', default=160, cast=int)
+MEMBER_PHOTO_JPEG_QUALITY = config('MEMBER_PHOTO_JPEG_QUALITY', default=85, cast=int)
+
+# 外部カレンダーアプリ購読用の iCalendar フィード（api/calendar/feed/<トークン>.ics）に含める期間
+CALENDAR_FEED_PAST_DAYS = config('CALENDAR_FEED_PAST_DAYS', default=30, cast=int)
+CALENDAR_FEED_FUTURE_DAYS = config('CALENDAR_FEED_FUTURE_DAYS', default=180, cast=int)
+
+# 会員ごとの無断キャンセル数（MemberProfile.no_show_count）を数える期間（日）
+NO_SHOW_WINDOW_DAYS = config('NO_SHOW_WINDOW_DAYS', default=180, cast=int)
+
+# 利用日からこの日数が過ぎた予約・入退室記録をワーカーが毎晩アーカイブ用のテーブルに移す（0: 移さない）
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=0, cast=int)
+
+# ワーカーのメモリ計測（reservations.memory_profiling）。リーク調査時にだけ有効にする
+# MEMORY_PROFILING_ENABLED: ビューごとのメモリ確保量のピーク・RSS の増加を記録する（/api/memory/ で参照）
+# MEMORY_TRACEMALLOC_AT_STARTUP: ワーカー起動時から tracemalloc を有効にする（無効でも /api/memory/ から開始できる）
+MEMORY_PROFILING_ENABLED = config('MEMORY_PROFILING_ENABLED', default=False, cast=bool)
+MEMORY_TRACEMALLOC_AT_STARTUP = config('MEMORY_TRACEMALLOC_AT_STARTUP', default=False, cast=bool)
+MEMORY_TRACEMALLOC_FRAMES = config('MEMORY_TRACEMALLOC_FRAMES', default=5, cast=int)
+# このシグナルをワーカーに送るとスナップショットをログに出力する（空なら無効）
+MEMORY_PROFILING_SIGNAL = config('MEMORY_PROFILING_SIGNAL', default='SIGUSR2')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -189,10 +262,7 @@ ACCOUNT_DEFAULT_HTTP_PROTOCOL = config(
 # LINE 認可へそのまま飛ばす（既定 False だと「続ける」中間ページになる）
 SOCIALACCOUNT_LOGIN_ON_GET = True
 
-# LINE Login（LINE Developers の LINE Login チャネルの Channel ID / Secret）
-LINE_CHANNEL_ID = config('LINE_CHANNEL_ID', default='')
-LINE_CHANNEL_SECRET = config('LINE_CHANNEL_SECRET', default='')
-# カンマ区切り。email は OpenID Connect でメール取得の申請承認後のみ有効（未承認だと別エラーになり得る）
+# LINE Login のスコープ。カンマ区切り。email は OpenID Connect でメール取得の申請承認後のみ有効（未承認だと別エラーになり得る）
 # 例: LINE_LOGIN_SCOPE=profile,openid
 LINE_LOGIN_SCOPE = [
     s.strip()
@@ -259,6 +329,22 @@ REGISTRATION_NOTIFY_EMAILS = [
     for x in config('REGISTRATION_NOTIFY_EMAILS', default='').split(',')
     if x.strip()
 ]
+# 管理者通知のダイジェスト送信。どちらも 0 なら登録ごとに 1 通送る。
+# DIGEST_MINUTES: 最初の未送信通知から何分後にまとめて送るか / DIGEST_SIZE: 何件溜まったら即時に送るか
+REGISTRATION_NOTIFY_DIGEST_MINUTES = config('REGISTRATION_NOTIFY_DIGEST_MINUTES', default=0, cast=int)
+REGISTRATION_NOTIFY_DIGEST_SIZE = config('REGISTRATION_NOTIFY_DIGEST_SIZE', default=0, cast=int)
+# スーパーユーザー宛先一覧のキャッシュ秒数（メール・権限の変更時は即時に破棄される）
+REGISTRATION_NOTIFY_RECIPIENTS_CACHE_SECONDS = config(
+    'REGISTRATION_NOTIFY_RECIPIENTS_CACHE_SECONDS', default=600, cast=int,
+)
+
+# バックグラウンドジョブ（メール送信など）。本番は manage.py run_worker を常駐させる。
+# True のときはキューに入れた直後に同じプロセスで実行する（ワーカーを起動しない開発環境向け）
+BACKGROUND_JOBS_EAGER = config('BACKGROUND_JOBS_EAGER', default=DEBUG, cast=bool)
+BACKGROUND_JOB_MAX_ATTEMPTS = config('BACKGROUND_JOB_MAX_ATTEMPTS', default=5, cast=int)
+# 再試行の待ち時間: 30秒, 60秒, 120秒 ... 最大 1 時間
+BACKGROUND_JOB_RETRY_BASE_SECONDS = config('BACKGROUND_JOB_RETRY_BASE_SECONDS', default=30, cast=int)
+BACKGROUND_JOB_RETRY_MAX_SECONDS = config('BACKGROUND_JOB_RETRY_MAX_SECONDS', default=3600, cast=int)
 
 # Square API settings（SQUARE_INTEGRATION_ENABLED=False のときは API を呼ばず、有料も未決済のまま確定扱い）
 SQUARE_INTEGRATION_ENABLED = config('SQUARE_INTEGRATION_ENABLED', default=False, cast=bool)
@@ -266,3 +352,10 @@ SQUARE_APPLICATION_ID = config('SQUARE_APPLICATION_ID', default='sandbox-sq0idb-
 SQUARE_ACCESS_TOKEN = config('SQUARE_ACCESS_TOKEN', default='EAAAl5UHQGekKNOWGRkLWMJ7NTohmkFaFRZXL2wioazmvTMi-PcFmU9SHpwwdSSe')
 SQUARE_ENVIRONMENT = config('SQUARE_ENVIRONMENT', default='sandbox')  # sandbox or production
 SQUARE_LOCATION_ID = config('SQUARE_LOCATION_ID', default='LHQHHBA22J5E1')
+# Square API の呼び出し（reservations/square_client.py）。SQUARE_BASE_URL を指定するとその URL に接続する（テスト用スタブなど）
+SQUARE_BASE_URL = config('SQUARE_BASE_URL', default='')
+SQUARE_TIMEOUT_SECONDS = config('SQUARE_TIMEOUT_SECONDS', default=10, cast=float)
+SQUARE_MAX_RETRIES = config('SQUARE_MAX_RETRIES', default=2, cast=int)
+SQUARE_RETRY_BACKOFF_SECONDS = config('SQUARE_RETRY_BACKOFF_SECONDS', default=0.5, cast=float)
+SQUARE_CIRCUIT_FAILURE_THRESHOLD = config('SQUARE_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)
+SQUARE_CIRCUIT_RESET_SECONDS = config('SQUARE_CIRCUIT_RESET_SECONDS', default=30, cast=float)
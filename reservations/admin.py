@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Location, TimeSlot, Reservation, Plan, MemberProfile, PaymentTransaction, VisitRecord
+from .models import (
+    Location, TimeSlot, Reservation, ReservationSeries, Plan, MemberProfile, PaymentTransaction, VisitRecord,
+    ArchivedReservation, ArchivedVisitRecord, BackgroundJob, RegistrationNotice, SquareWebhookEvent, BookingGroup, BookingDraft, DailyReservationStat,
+)
+from .square_events import requeue_events
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
@@ -18,7 +22,7 @@ class TimeSlotAdmin(admin.ModelAdmin):
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
     list_display = ['customer_name', 'location', 'date', 'time_slot', 'status', 'created_at']
-    list_filter = ['status', 'date', 'location', 'time_slot']
+    list_filter = ['status', 'is_no_show', 'date', 'location', 'time_slot']
     search_fields = ['customer_name', 'customer_email', 'customer_phone']
     ordering = ['-date', 'time_slot__start_time']
     readonly_fields = ['created_at', 'updated_at']
@@ -31,11 +35,29 @@ class ReservationAdmin(admin.ModelAdmin):
             'fields': ('customer_name', 'customer_email', 'customer_phone')
         }),
         ('その他', {
-            'fields': ('notes', 'created_by', 'created_at', 'updated_at'),
+            'fields': ('notes', 'booking_group', 'series', 'created_by', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
 
+@admin.register(BookingGroup)
+class BookingGroupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'customer_email', 'total_amount', 'status', 'created_by', 'created_at']
+    list_filter = ['status']
+    search_fields = ['customer_email', 'created_by__username', 'created_by__email']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'updated_at']
+    raw_id_fields = ['created_by']
+
+@admin.register(ReservationSeries)
+class ReservationSeriesAdmin(admin.ModelAdmin):
+    list_display = ['customer_name', 'location', 'interval_weeks', 'start_date', 'end_date', 'cancelled_at', 'created_at']
+    list_filter = ['interval_weeks', 'location']
+    search_fields = ['customer_name', 'customer_email']
+    ordering = ['-created_at']
+    readonly_fields = ['cancelled_at', 'created_at', 'updated_at']
+    raw_id_fields = ['created_by']
+
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
     list_display = ['name', 'price', 'is_default', 'is_active', 'created_at']
@@ -45,11 +67,11 @@ class PlanAdmin(admin.ModelAdmin):
 
 @admin.register(MemberProfile)
 class MemberProfileAdmin(admin.ModelAdmin):
-    list_display = ['full_name', 'user', 'gender', 'plan', 'created_at']
+    list_display = ['full_name', 'user', 'gender', 'plan', 'no_show_count', 'created_at']
     list_filter = ['gender', 'plan', 'created_at']
     search_fields = ['full_name', 'user__username', 'user__email', 'phone']
     ordering = ['-created_at']
-    readonly_fields = ['member_qr_token', 'created_at', 'updated_at']
+    readonly_fields = ['member_qr_token', 'no_show_count', 'created_at', 'updated_at']
 
 @admin.register(VisitRecord)
 class VisitRecordAdmin(admin.ModelAdmin):
@@ -60,6 +82,36 @@ class VisitRecordAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+class ArchiveAdmin(admin.ModelAdmin):
+    """manage.py archive_history が移した行。閲覧のみ"""
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedReservation)
+class ArchivedReservationAdmin(ArchiveAdmin):
+    list_display = ['id', 'customer_name', 'location', 'date', 'start_time', 'status', 'is_no_show', 'archived_at']
+    list_filter = ['status', 'is_no_show', 'location']
+    search_fields = ['customer_name', 'customer_email', 'customer_phone']
+    ordering = ['-date', 'start_time']
+
+
+@admin.register(ArchivedVisitRecord)
+class ArchivedVisitRecordAdmin(ArchiveAdmin):
+    list_display = ['id', 'member_profile', 'location', 'date', 'entry_at', 'exit_at', 'billed_amount', 'archived_at']
+    list_filter = ['location']
+    search_fields = ['member_profile__full_name', 'member_profile__user__email']
+    ordering = ['-date', '-entry_at']
+
+
 @admin.register(PaymentTransaction)
 class PaymentTransactionAdmin(admin.ModelAdmin):
     list_display = ['id', 'amount', 'status', 'square_payment_id', 'created_at']
@@ -67,3 +119,61 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
     search_fields = ['square_payment_id', 'square_order_id', 'payment_link_id']
     ordering = ['-created_at']
     readonly_fields = ['created_at', 'updated_at']
+    raw_id_fields = ['reservation', 'booking_group', 'member_profile']
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'last_error']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'updated_at', 'locked_at']
+
+
+@admin.register(RegistrationNotice)
+class RegistrationNoticeAdmin(admin.ModelAdmin):
+    list_display = ['member_profile', 'created_at']
+    ordering = ['created_at']
+
+
+@admin.register(SquareWebhookEvent)
+class SquareWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event_type', 'status', 'event_created_at', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['event_id', 'error']
+    ordering = ['-received_at']
+    readonly_fields = ['received_at', 'processed_at']
+    actions = ['requeue']
+
+    @admin.action(description='選択したイベントを再処理する')
+    def requeue(self, request, queryset):
+        count = requeue_events(queryset)
+        self.message_user(request, f'{count}件のイベントを再処理待ちにしました。')
+
+
+@admin.register(BookingDraft)
+class BookingDraftAdmin(admin.ModelAdmin):
+    list_display = ['token', 'user', 'payment_transaction', 'expires_at', 'updated_at']
+    search_fields = ['token', 'user__username', 'user__email']
+    ordering = ['-updated_at']
+    readonly_fields = ['token', 'created_at', 'updated_at']
+    raw_id_fields = ['user', 'payment_transaction']
+
+
+@admin.register(DailyReservationStat)
+class DailyReservationStatAdmin(admin.ModelAdmin):
+    """自動で更新されるため閲覧のみ（作り直すときは manage.py rebuild_daily_stats）"""
+    list_display = [
+        'date', 'location', 'reservation_count', 'confirmed_count', 'pending_count', 'cancelled_count',
+        'visit_count', 'billed_amount',
+    ]
+    list_filter = ['location']
+    date_hierarchy = 'date'
+    ordering = ['-date', 'location']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,259 @@
+"""
+利用状況・売上の分析（スーパーユーザー向けの分析レポート）。
+
+どの集計も GROUP BY の集計クエリ数回で求め、行を Python に読み込まない。
+Python 側で扱うのは集計結果（場所 × 曜日 × 時間枠、月 × プランなど）だけなので、
+何年分のデータでもクエリの結果件数は期間の月数・場所数・時間枠数で決まる。
+
+- utilization_heatmap: 場所 × 曜日 × 時間枠の予約率（各枠は 1 日 1 件まで予約できる）
+- revenue_by_plan / revenue_by_location: 月別の売上（入退室の請求額と完了した決済の金額）
+- no_show_rates: 確定した予約のうち来場がなかったものの割合
+
+アーカイブ済みの予約・入退室記録（archive.py）も同じように集計して合算する。
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, ExtractIsoWeekDay, TruncMonth
+from django.utils import timezone
+
+from .models import (
+    ArchivedReservation, ArchivedVisitRecord, Location, PaymentTransaction, Plan, Reservation, TimeSlot, VisitRecord,
+)
+from .no_shows import no_show_filter
+
+WEEKDAYS = ['月', '火', '水', '木', '金', '土', '日']
+# 利用率に数える予約（キャンセルは除く）
+ACTIVE_STATUSES = ['confirmed', 'pending']
+
+
+def month_starts(start_date, end_date):
+    """期間に含まれる月の 1 日の一覧。"""
+    months = []
+    current = start_date.replace(day=1)
+    while current <= end_date:
+        months.append(current)
+        current = (current + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def weekday_occurrences(start_date, end_date):
+    """期間内の各曜日（月〜日）の日数。"""
+    days = (end_date - start_date).days + 1
+    if days <= 0:
+        return [0] * 7
+    weeks, rest = divmod(days, 7)
+    counts = [weeks] * 7
+    for i in range(rest):
+        counts[(start_date.weekday() + i) % 7] += 1
+    return counts
+
+
+def _aware_range(start_date, end_date):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start_date, time.min), tz),
+        timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz),
+    )
+
+
+def _month(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def utilization_heatmap(start_date, end_date):
+    """
+    場所ごとの「時間枠 × 曜日」の予約率。
+    戻り値は場所ごとの {'location', 'rows': [{'time_slot', 'cells': [7 曜日分]}], 'reserved', 'rate'}。
+    セルは {'count': 予約数, 'rate': 予約数 / その曜日の日数, 'percent', 'alpha': 表示用の濃さ}。
+    """
+    occurrences = weekday_occurrences(start_date, end_date)
+    counts = {}
+    for model in (Reservation, ArchivedReservation):
+        for location_id, time_slot_id, weekday, n in (
+            model.objects.filter(date__gte=start_date, date__lte=end_date, status__in=ACTIVE_STATUSES)
+            .annotate(weekday=ExtractIsoWeekDay('date'))
+            .values_list('location_id', 'time_slot_id', 'weekday')
+            .annotate(n=Count('id'))
+            .order_by()
+        ):
+            # アーカイブ後に削除された時間枠の予約は数えない
+            if time_slot_id is not None:
+                key = (location_id, time_slot_id, weekday - 1)
+                counts[key] = counts.get(key, 0) + n
+
+    used_locations = {key[0] for key in counts}
+    used_slots = {key[1] for key in counts}
+    locations = Location.objects.filter(Q(is_active=True) | Q(pk__in=used_locations))
+    time_slots = list(TimeSlot.objects.filter(Q(is_active=True) | Q(pk__in=used_slots)).order_by('start_time'))
+    capacity = sum(occurrences) * len(time_slots)
+
+    result = []
+    for location in locations:
+        rows = []
+        reserved = 0
+        for slot in time_slots:
+            cells = []
+            for weekday in range(7):
+                n = counts.get((location.pk, slot.pk, weekday), 0)
+                rate = n / occurrences[weekday] if occurrences[weekday] else 0.0
+                cells.append({'count': n, 'rate': rate, 'percent': round(rate * 100), 'alpha': f'{min(rate, 1.0):.2f}'})
+                reserved += n
+            rows.append({'time_slot': slot, 'cells': cells})
+        rate = reserved / capacity if capacity else 0.0
+        result.append({
+            'location': location, 'rows': rows, 'reserved': reserved, 'rate': rate, 'percent': round(rate * 100, 1),
+        })
+    return result
+
+
+@dataclass
+class RevenueTable:
+    """月別の売上表。rows は {'label', 'visits' / 'payments' / 'monthly': [月ごとの金額], 'total'}。"""
+    months: list
+    rows: list = field(default_factory=list)
+    totals: list = field(default_factory=list)
+    total: Decimal = Decimal(0)
+
+
+def _revenue_table(months, labels, visit_rows, payment_rows):
+    """(月, キー, 金額) の集計結果を キー × 月 の表にする。labels はキー → 表示名。"""
+    index = {month: i for i, month in enumerate(months)}
+    amounts = {}
+    for kind, rows in (('visits', visit_rows), ('payments', payment_rows)):
+        for month, key, amount in rows:
+            i = index.get(_month(month))
+            if i is None or not amount:
+                continue
+            row = amounts.setdefault(key, {'visits': [Decimal(0)] * len(months), 'payments': [Decimal(0)] * len(months)})
+            row[kind][i] += amount
+
+    table = RevenueTable(months=months, totals=[Decimal(0)] * len(months))
+    for key, row in sorted(amounts.items(), key=lambda item: -sum(item[1]['visits']) - sum(item[1]['payments'])):
+        total = sum(row['visits']) + sum(row['payments'])
+        table.rows.append({
+            'label': labels.get(key, '不明'),
+            'visits': row['visits'],
+            'payments': row['payments'],
+            'monthly': [v + p for v, p in zip(row['visits'], row['payments'])],
+            'total': total,
+        })
+        for i in range(len(months)):
+            table.totals[i] += row['visits'][i] + row['payments'][i]
+        table.total += total
+    return table
+
+
+def _visit_revenue(start_date, end_date, key):
+    """入退室の請求額の (月, key, 金額)。アーカイブ済みの入退室記録の分も続けて返す。"""
+    rows = []
+    for model in (VisitRecord, ArchivedVisitRecord):
+        rows += model.objects.filter(
+            date__gte=start_date, date__lte=end_date, billed_amount__isnull=False,
+        ).annotate(month=TruncMonth('date')).values_list('month', key).annotate(
+            amount=Sum('billed_amount'),
+        ).order_by()
+    return rows
+
+
+def _completed_payments(start_date, end_date):
+    start, end = _aware_range(start_date, end_date)
+    return PaymentTransaction.objects.filter(
+        status='completed', created_at__gte=start, created_at__lt=end,
+    ).annotate(month=TruncMonth('created_at'))
+
+
+def revenue_by_plan(start_date, end_date):
+    """
+    月別・プラン別の売上。入退室の請求額は会員のプラン、決済は支払った会員のプラン
+    （会員登録料金は決済の会員、予約の決済は予約した会員）で分ける。
+    """
+    visits = _visit_revenue(start_date, end_date, 'member_profile__plan_id')
+    payments = _completed_payments(start_date, end_date).annotate(
+        plan_id=Coalesce(
+            'member_profile__plan_id',
+            'reservation__created_by__memberprofile__plan_id',
+            'booking_group__created_by__memberprofile__plan_id',
+            output_field=IntegerField(),
+        ),
+    ).values_list('month', 'plan_id').annotate(amount=Sum('amount')).order_by()
+    labels = dict(Plan.objects.values_list('pk', 'name'))
+    labels[None] = 'プランなし・会員以外'
+    return _revenue_table(month_starts(start_date, end_date), labels, visits, payments)
+
+
+def revenue_by_location(start_date, end_date):
+    """月別・場所別の売上。予約グループの決済はグループの予約の場所に数える。"""
+    visits = _visit_revenue(start_date, end_date, 'location_id')
+    group_location, archived_group_location = (
+        model.objects.filter(booking_group=OuterRef('booking_group')).order_by('pk').values('location_id')[:1]
+        for model in (Reservation, ArchivedReservation)
+    )
+    payments = _completed_payments(start_date, end_date).annotate(
+        location_key=Coalesce(
+            'reservation__location_id', Subquery(group_location), Subquery(archived_group_location),
+            output_field=IntegerField(),
+        ),
+    ).values_list('month', 'location_key').annotate(amount=Sum('amount')).order_by()
+    labels = dict(Location.objects.values_list('pk', 'name'))
+    labels[None] = '場所なし（会員登録料金など）'
+    return _revenue_table(month_starts(start_date, end_date), labels, visits, payments)
+
+
+def no_show_rates(start_date, end_date, *, today=None):
+    """
+    場所別の無断キャンセル率。確定した予約のうち、昨日までのものを対象にする。
+    is_no_show（毎晩の判定結果）ではなく同じ条件でその場で数えるため、判定前の期間も含められる
+    （アーカイブ済みの予約は移したときの is_no_show で数える）。
+    戻り値は {'rows': [{'location', 'total', 'no_show', 'rate', 'percent'}], 'total', 'no_show', 'rate', 'percent', 'end_date'}。
+    """
+    today = today or timezone.localdate()
+    end_date = min(end_date, today - timedelta(days=1))
+    stats = {}
+    for model, condition in ((Reservation, no_show_filter()), (ArchivedReservation, Q(is_no_show=True))):
+        for location_id, total, no_show in model.objects.filter(
+            status='confirmed', date__gte=start_date, date__lte=end_date,
+        ).values('location_id').annotate(
+            total=Count('id'),
+            no_show=Count('id', filter=condition),
+        ).values_list('location_id', 'total', 'no_show').order_by():
+            current = stats.get(location_id, (0, 0))
+            stats[location_id] = (current[0] + total, current[1] + no_show)
+    rows = []
+    for location in Location.objects.filter(pk__in=stats):
+        total, no_show = stats[location.pk]
+        rows.append({
+            'location': location, 'total': total, 'no_show': no_show,
+            'rate': no_show / total, 'percent': round(no_show / total * 100, 1),
+        })
+    total = sum(row['total'] for row in rows)
+    no_show = sum(row['no_show'] for row in rows)
+    rate = no_show / total if total else 0.0
+    return {
+        'rows': rows,
+        'total': total,
+        'no_show': no_show,
+        'rate': rate,
+        'percent': round(rate * 100, 1),
+        'end_date': end_date,
+    }
+
+
+def default_period(today=None):
+    """レポートの既定の期間（11 か月前の月初〜今日。今月を含めて 12 か月）。"""
+    today = today or timezone.localdate()
+    start = today.replace(day=1)
+    for _ in range(11):
+        start = (start - timedelta(days=1)).replace(day=1)
+    return start, today
+
+
+def report(start_date, end_date):
+    return {
+        'heatmap': utilization_heatmap(start_date, end_date),
+        'revenue_by_plan': revenue_by_plan(start_date, end_date),
+        'revenue_by_location': revenue_by_location(start_date, end_date),
+        'no_shows': no_show_rates(start_date, end_date),
+    }
@@ -0,0 +1,140 @@
+"""
+古い予約・入退室記録のアーカイブ（manage.py archive_history / バックグラウンドワーカー）。
+
+利用日が ARCHIVE_AFTER_DAYS 日より前の行を ArchivedReservation / ArchivedVisitRecord に移し、
+予約・入退室記録のテーブル（画面・空き状況・無断キャンセルの判定が毎回読むもの）を小さく保つ。
+batch_size 件ずつ「アーカイブ側へ INSERT → 元の行を DELETE」を 1 トランザクションで行うため、
+途中で止めても次に実行したときは残りから続けられる（進み具合を別に記録する必要はない）。
+
+決済（PaymentTransaction.reservation は CASCADE）や入退室記録から参照されている予約は移さない。
+削除は ORM の delete() で行い、ほかの行（決済など）まで消えそうな場合はそのバッチを取り消す。
+日別集計・分析レポート・CSV 出力・ユーザー詳細はアーカイブ済みの行も合わせて読む。
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from . import daily_stats
+from .models import ArchivedReservation, ArchivedVisitRecord, PaymentTransaction, Reservation, VisitRecord
+
+DEFAULT_BATCH_SIZE = 1000
+# 予約の変更・無断キャンセルの判定・決済の照合に使う期間は残す
+MIN_ARCHIVE_DAYS = 90
+
+RESERVATION_FIELDS = [
+    'id', 'location_id', 'time_slot_id', 'date', 'customer_name', 'customer_email', 'customer_phone', 'status',
+    'notes', 'booking_group_id', 'series_id', 'is_no_show', 'created_by_id', 'created_at', 'updated_at',
+]
+VISIT_FIELDS = [
+    'id', 'member_profile_id', 'location_id', 'time_slot_id', 'date', 'reservation_id', 'entry_at', 'exit_at',
+    'billed_amount', 'created_at', 'updated_at',
+]
+
+
+class ArchiveConflict(Exception):
+    """移す行を削除すると、ほかの行まで削除・変更される（移している間に決済などから参照された）"""
+
+
+def check_cutoff(cutoff, today=None):
+    """cutoff が今日から MIN_ARCHIVE_DAYS 日より後なら ValueError（今後の予約を移さないため）。"""
+    latest = (today or timezone.localdate()) - timedelta(days=MIN_ARCHIVE_DAYS)
+    if cutoff > latest:
+        raise ValueError(f'アーカイブできるのは {latest} より前（今日から {MIN_ARCHIVE_DAYS} 日以上前）までです')
+    return cutoff
+
+
+def cutoff_date(days=None, today=None):
+    """この日より前の行をアーカイブする。days を省略すると ARCHIVE_AFTER_DAYS（0 ならアーカイブしない: None）。"""
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_AFTER_DAYS', 0)
+    if not days:
+        return None
+    today = today or timezone.localdate()
+    return check_cutoff(today - timedelta(days=days), today)
+
+
+def archivable_reservations(cutoff):
+    """アーカイブできる予約（利用日が cutoff より前で、決済・入退室記録から参照されていないもの）。"""
+    return Reservation.objects.filter(date__lt=cutoff).exclude(
+        Exists(PaymentTransaction.objects.filter(reservation=OuterRef('pk'))),
+    ).exclude(
+        Exists(VisitRecord.objects.filter(reservation=OuterRef('pk'))),
+    )
+
+
+def archivable_visits(cutoff):
+    return VisitRecord.objects.filter(date__lt=cutoff)
+
+
+def _move(source, archive_model, fields, expressions, *, batch_size, max_batches, pause):
+    """source の行を batch_size 件ずつ archive_model に移し、移した件数を返す。"""
+    moved = 0
+    batches = 0
+    label = source.model._meta.label
+    while max_batches is None or batches < max_batches:
+        ids = list(source.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        batches += 1
+        try:
+            with transaction.atomic(), daily_stats.batched_refresh():
+                # 取得してから移すまでに変更・削除された行を取りこぼさないよう、ロックして読み直す
+                rows = source.filter(pk__in=ids).select_for_update(of=('self',)).order_by().values(*fields, **expressions)
+                archived = archive_model.objects.bulk_create([archive_model(**row) for row in rows])
+                _, deleted = source.model.objects.filter(pk__in=[row.pk for row in archived]).delete()
+                if set(deleted) - {label} or deleted.get(label, 0) != len(archived):
+                    raise ArchiveConflict(deleted)
+        except ArchiveConflict:
+            # このバッチは取り消す。参照された行は次の取得で対象から外れる
+            continue
+        moved += len(archived)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return moved
+
+
+def archive_history(cutoff, *, batch_size=DEFAULT_BATCH_SIZE, max_batches=None, pause=0.0):
+    """
+    利用日が cutoff より前の入退室記録、続いて予約をアーカイブし、(入退室記録の件数, 予約の件数) を返す。
+    入退室記録を先に移すので、その記録から参照されていた予約も同じ実行で移せる。
+    max_batches はそれぞれのテーブルで INSERT / DELETE を繰り返す最大回数（残りは次回に移す）。
+    """
+    check_cutoff(cutoff)
+    options = {'batch_size': batch_size, 'max_batches': max_batches, 'pause': pause}
+    visits = _move(archivable_visits(cutoff), ArchivedVisitRecord, VISIT_FIELDS, {}, **options)
+    reservations = _move(
+        archivable_reservations(cutoff), ArchivedReservation, RESERVATION_FIELDS,
+        {'start_time': F('time_slot__start_time'), 'end_time': F('time_slot__end_time')},
+        **options,
+    )
+    return visits, reservations
+
+
+def recent_reservations(user, limit=10):
+    """
+    ユーザーが作成した予約の新しい順 limit 件。アーカイブ済みの予約も合わせて並べる
+    （決済から参照されている古い予約は残るので、アーカイブ済みの予約より古いことがある。
+    アーカイブ済みの予約には archived_at があり、予約詳細の画面はない）。
+    """
+    reservations = list(
+        Reservation.objects.filter(created_by=user).select_related('location', 'time_slot')
+        .order_by('-date', '-time_slot__start_time')[:limit]
+    )
+    archived = list(
+        ArchivedReservation.objects.filter(created_by=user).select_related('location')
+        .order_by('-date', '-start_time')[:limit]
+    )
+    if not archived:
+        return reservations
+    reservations = sorted(
+        reservations + archived,
+        key=lambda r: (r.date, r.time_slot.start_time if isinstance(r, Reservation) else r.start_time),
+        reverse=True,
+    )
+    return reservations[:limit]
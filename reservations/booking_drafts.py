@@ -0,0 +1,164 @@
+"""
+予約手続き中の入力内容（旧 request.session['reservation_data']）の保存先。
+
+内容は BookingDraft に保存し、セッションには短いトークンだけを置く。
+決済待ちの手続きは決済トランザクションに紐づけておき、決済完了時に finalize() で予約を作成する
+（Webhook からも呼べるため、利用者のブラウザのセッションに依存しない）。
+決済中に他の予約が入って作成できなかった枠は、返金が必要なものとして決済トランザクションの metadata に記録する。
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import series
+from .models import BookingDraft, BookingGroup, Location, PaymentTransaction, Reservation, TimeSlot
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'booking_draft'
+DRAFT_TTL = timedelta(hours=24)
+# 決済リンクは後から支払われることもあるため、決済待ちの手続きは長めに残す
+PAYMENT_DRAFT_TTL = timedelta(days=7)
+
+_CACHE_ATTR = '_booking_draft'
+# 決済は完了したが予約できなかった枠（[{'date': 'YYYY-MM-DD', 'time_slot_id': ID}]）を記録する metadata のキー
+UNFULFILLED_KEY = 'unfulfilled_slots'
+
+
+def _get(request):
+    """リクエスト中は 1 回だけ DB から読む。"""
+    if not hasattr(request, _CACHE_ATTR):
+        draft = None
+        token = request.session.get(SESSION_KEY)
+        if token:
+            draft = BookingDraft.objects.filter(token=token, expires_at__gt=timezone.now()).first()
+        setattr(request, _CACHE_ATTR, draft)
+    return getattr(request, _CACHE_ATTR)
+
+
+def load(request):
+    """手続き中の入力内容（dict）。なければ空の dict。"""
+    draft = _get(request)
+    return dict(draft.data) if draft else {}
+
+
+def save(request, data):
+    """入力内容を保存する（手続きがなければ作成し、トークンをセッションに保存）。"""
+    draft = _get(request)
+    expires_at = timezone.now() + DRAFT_TTL
+    if draft is None or draft.payment_transaction_id:
+        # 決済待ちの手続きは上書きせず、新しい手続きとして扱う
+        draft = BookingDraft.objects.create(
+            data=data,
+            user=request.user if request.user.is_authenticated else None,
+            expires_at=expires_at,
+        )
+        request.session[SESSION_KEY] = draft.token
+    else:
+        draft.data = data
+        draft.expires_at = expires_at
+        draft.save(update_fields=['data', 'expires_at', 'updated_at'])
+    setattr(request, _CACHE_ATTR, draft)
+    return draft
+
+
+def clear(request):
+    """手続きを終了する（決済待ちのものは予約作成まで残す）。"""
+    draft = _get(request)
+    if draft is not None and not draft.payment_transaction_id:
+        draft.delete()
+    request.session.pop(SESSION_KEY, None)
+    setattr(request, _CACHE_ATTR, None)
+
+
+def attach_payment(request, data, payment_transaction):
+    """入力内容を決済トランザクションに紐づけて保存する（決済完了時に finalize() で予約を作成する）。"""
+    draft = save(request, data)
+    draft.payment_transaction = payment_transaction
+    draft.expires_at = timezone.now() + PAYMENT_DRAFT_TTL
+    draft.save(update_fields=['payment_transaction', 'expires_at', 'updated_at'])
+    return draft
+
+
+def purge_expired():
+    """有効期限を過ぎた手続きを削除する。"""
+    return BookingDraft.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def unfulfilled_slots(payment_transaction):
+    """決済は完了したが予約できなかった枠（返金が必要）。なければ空のリスト。"""
+    return payment_transaction.metadata.get(UNFULFILLED_KEY) or []
+
+
+def finalize(payment_transaction):
+    """
+    決済が完了したトランザクションの手続きから予約を作成する。
+    既に作成済み（Webhook とリダイレクトの両方から呼ばれた場合など）なら作成済みの予約を返す。
+    決済中に他の予約が入った枠は作成せず、unfulfilled_slots() で分かるように記録する。
+    """
+    with transaction.atomic():
+        tx = PaymentTransaction.objects.select_for_update().get(pk=payment_transaction.pk)
+        draft = BookingDraft.objects.filter(payment_transaction=tx).first()
+        if draft is None:
+            payment_transaction.metadata = tx.metadata
+            if tx.booking_group_id:
+                return list(Reservation.objects.filter(booking_group_id=tx.booking_group_id).order_by('date', 'id'))
+            return [tx.reservation] if tx.reservation_id else []
+
+        data = draft.data
+        group = tx.booking_group or BookingGroup(
+            customer_email=data.get('customer_email') or '',
+            total_amount=tx.amount,
+            created_by=draft.user,
+        )
+        group.status = 'confirmed'
+        group.save()
+
+        location = Location.objects.get(id=data.get('location'))
+        if data.get('is_multi_date'):
+            requested = data.get('multi_date_slots') or {}
+        else:
+            requested = {data['date']: data.get('time_slot_ids', [])} if data.get('date') else {}
+        slots_by_date = {
+            datetime.fromisoformat(date_str).date(): [int(tid) for tid in time_slot_ids]
+            for date_str, time_slot_ids in requested.items()
+        }
+        # 手続き中に削除された時間枠は作成しない（予約できなかった枠として記録する）
+        existing = set(TimeSlot.objects.filter(
+            id__in={tid for ids in slots_by_date.values() for tid in ids},
+        ).values_list('id', flat=True))
+
+        created = series.create_reservations(
+            location,
+            {day: [tid for tid in ids if tid in existing] for day, ids in slots_by_date.items()},
+            status='confirmed',
+            customer_name=data.get('customer_name'),
+            customer_email=data.get('customer_email'),
+            customer_phone=data.get('customer_phone'),
+            notes=data.get('notes', ''),
+            booking_group=group,
+            created_by=draft.user,
+        )
+
+        tx.booking_group = group
+        if created:
+            tx.reservation = created[0]
+        made = {(r.date, r.time_slot_id) for r in created}
+        missing = [
+            {'date': day.isoformat(), 'time_slot_id': time_slot_id}
+            for day, time_slot_ids in sorted(slots_by_date.items())
+            for time_slot_id in time_slot_ids
+            if (day, time_slot_id) not in made
+        ]
+        if missing:
+            tx.metadata = {**tx.metadata, UNFULFILLED_KEY: missing}
+            logger.warning(
+                '決済 %s は完了しましたが、%d 枠は他の予約が入ったため作成できませんでした（返金が必要です）: %s',
+                tx.pk, len(missing), missing,
+            )
+        tx.save(update_fields=['booking_group', 'reservation', 'metadata', 'updated_at'])
+        payment_transaction.metadata = tx.metadata
+        draft.delete()
+        return created
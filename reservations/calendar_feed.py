@@ -0,0 +1,281 @@
+"""
+カレンダー用の予約フィード（JSON / iCalendar）。
+
+予約は QuerySet.iterator() で少しずつ読み、連続する予約をまとめながら 1 件ずつ書き出す。
+一覧全体をメモリに載せないため、スーパーユーザーが全場所の 1 か月分を取得しても使用メモリは一定。
+- JSON: 画面の FullCalendar 用（api/calendar/events/、ログイン中のユーザー）
+- iCalendar: 外部のカレンダーアプリの購読用（api/calendar/feed/<トークン>.ics、署名付きトークン）
+どちらも ETag / Last-Modified を付け、予約が変わっていなければ 304 を返す。
+"""
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from . import etags
+from .models import Reservation
+
+# 出力の形式を変えたら上げる（ETag が変わり、キャッシュ済みのフィードが取り直される）
+FEED_VERSION = 1
+TOKEN_SALT = 'reservations.calendar_feed'
+CHUNK_SIZE = 500
+# StreamingHttpResponse に渡す 1 回分の目安（小さい書き込みを繰り返さないようにまとめる）
+BUFFER_SIZE = 64 * 1024
+
+EVENT_COLORS = ['#ffc107', '#e0a800', '#ff8c00', '#ff6b35', '#f7931e']
+ICS_STATUS = {'confirmed': 'CONFIRMED', 'pending': 'TENTATIVE', 'cancelled': 'CANCELLED'}
+
+
+def reservations_for(user, start_date, end_date):
+    """
+    user が見られる期間内の予約。スーパーユーザーは全件、一般ユーザーは自分の予約のみ、未ログインは空。
+    iter_groups でまとめられるよう、日付・場所・メールアドレス・開始時刻の順に並べる。
+    """
+    if not user.is_authenticated:
+        return Reservation.objects.none()
+    reservations = Reservation.objects.filter(date__gte=start_date, date__lte=end_date)
+    if not user.is_superuser:
+        reservations = reservations.filter(Q(created_by=user) | Q(customer_email=user.email))
+    return reservations.select_related('location', 'time_slot').only(
+        'id', 'date', 'customer_name', 'customer_email', 'customer_phone', 'status', 'notes', 'updated_at',
+        'location__id', 'location__name', 'time_slot__start_time', 'time_slot__end_time',
+    ).order_by(
+        'date', 'location__display_order', 'location__name', 'location_id',
+        'customer_email', 'time_slot__start_time',
+    )
+
+
+def feed_validators(reservations, *parts):
+    """
+    フィードの ETag / Last-Modified。集計 1 回で求め、予約の本体は読まない。
+    削除は最終更新日時に現れないため件数として ETag に含める（Last-Modified だけの再検証では検出できない）。
+    """
+    stats = reservations.order_by().aggregate(
+        count=Count('id'),
+        max_id=Max('id'),
+        reservation=Max('updated_at'),
+        location=Max('location__updated_at'),
+        time_slot=Max('time_slot__updated_at'),
+    )
+    updated = [value for key in ('reservation', 'location', 'time_slot') if (value := stats[key]) is not None]
+    return etags.validators(
+        FEED_VERSION, *parts, stats['count'], stats['max_id'], *updated,
+        last_modified=max(updated) if updated else None,
+    )
+
+
+def _is_consecutive(previous, reservation):
+    # 前の終了時間と開始時間が同じか、1分以内なら連続（group_consecutive_reservations と同じ判定）
+    prev_end = previous.time_slot.end_time
+    start = reservation.time_slot.start_time
+    return prev_end == start or (
+        datetime.combine(date.today(), start) - datetime.combine(date.today(), prev_end)
+    ).total_seconds() <= 60
+
+
+def _group(reservations):
+    first = reservations[0]
+    return {
+        'reservations': reservations,
+        'start_time': first.time_slot.start_time,
+        'end_time': reservations[-1].time_slot.end_time,
+        'customer_name': first.customer_name,
+        'customer_email': first.customer_email,
+        'location': first.location,
+        'date': first.date,
+        'status': first.status,
+        'notes': first.notes or '',
+        'ids': [r.id for r in reservations],
+    }
+
+
+def iter_groups(reservations):
+    """
+    reservations_for の順に並んだ予約から、連続する予約のまとまりを順に返す。
+    group_consecutive_reservations と同じまとまりを、全件を読み込まずに作る。
+    """
+    current = []
+    for reservation in reservations:
+        if current and (
+            (reservation.date, reservation.location_id, reservation.customer_email)
+            != (current[0].date, current[0].location_id, current[0].customer_email)
+            or not _is_consecutive(current[-1], reservation)
+        ):
+            yield _group(current)
+            current = []
+        current.append(reservation)
+    if current:
+        yield _group(current)
+
+
+def event_dict(group):
+    """FullCalendar のイベント（従来の get_calendar_events と同じ形）。"""
+    start_time = datetime.combine(group['date'], group['start_time'])
+    end_time = datetime.combine(group['date'], group['end_time'])
+    color = EVENT_COLORS[group['location'].id % len(EVENT_COLORS)]
+    return {
+        'id': f"group_{group['ids'][0]}",
+        'title': f"{group['customer_name']} - {group['location'].name} - {_time_range(group)}",
+        'start': start_time.isoformat(),
+        'end': end_time.isoformat(),
+        'backgroundColor': color,
+        'borderColor': color,
+        'textColor': '#000',
+        'extendedProps': {
+            'location': group['location'].name,
+            'customer_name': group['customer_name'],
+            'customer_email': group['customer_email'],
+            'customer_phone': group['reservations'][0].customer_phone,
+            'status': group['status'],
+            'notes': group['notes'],
+            'reservation_ids': group['ids'],
+            'count': len(group['reservations']),
+        },
+    }
+
+
+def _time_range(group):
+    # 複数の予約がある場合は枠数も表示する
+    text = f"{group['start_time'].strftime('%H:%M')}-{group['end_time'].strftime('%H:%M')}"
+    if len(group['reservations']) > 1:
+        text += f" ({len(group['reservations'])}枠)"
+    return text
+
+
+def _buffered(pieces, size=BUFFER_SIZE):
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _json_pieces(groups):
+    yield '['
+    for i, group in enumerate(groups):
+        if i:
+            yield ', '
+        yield json.dumps(event_dict(group))
+    yield ']'
+
+
+def stream_json(reservations, chunk_size=CHUNK_SIZE):
+    """イベントの JSON 配列を少しずつ返すイテレータ。"""
+    return _buffered(_json_pieces(iter_groups(reservations.iterator(chunk_size=chunk_size))))
+
+
+def _ics_escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', '\\n')
+    )
+
+
+def _ics_line(line):
+    """RFC 5545 の行折り返し（75 オクテットごと。マルチバイト文字の途中では切らない）。"""
+    parts = []
+    current = ''
+    current_bytes = 0
+    limit = 75
+    for char in line:
+        char_bytes = len(char.encode('utf-8'))
+        if current_bytes + char_bytes > limit:
+            parts.append(current)
+            # 続きの行は先頭の空白 1 文字を含めて 75 オクテット
+            current, current_bytes, limit = ' ', 1, 75
+        current += char
+        current_bytes += char_bytes
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def _ics_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ics_event(group, domain):
+    tz = timezone.get_default_timezone()
+    start = timezone.make_aware(datetime.combine(group['date'], group['start_time']), tz)
+    end = timezone.make_aware(datetime.combine(group['date'], group['end_time']), tz)
+    stamp = max(r.updated_at for r in group['reservations'])
+    description = f"予約者: {group['customer_name']}\n予約枠: {_time_range(group)}"
+    if group['notes']:
+        description += f"\n備考: {group['notes']}"
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:reservation-{group['ids'][0]}@{domain}",
+        f'DTSTAMP:{_ics_datetime(stamp)}',
+        f'LAST-MODIFIED:{_ics_datetime(stamp)}',
+        f'DTSTART:{_ics_datetime(start)}',
+        f'DTEND:{_ics_datetime(end)}',
+        f"SUMMARY:{_ics_escape(group['customer_name'] + ' - ' + group['location'].name)}",
+        f"LOCATION:{_ics_escape(group['location'].name)}",
+        f'DESCRIPTION:{_ics_escape(description)}',
+        f"STATUS:{ICS_STATUS.get(group['status'], 'CONFIRMED')}",
+        'END:VEVENT',
+    ]
+    return ''.join(_ics_line(line) for line in lines)
+
+
+def _ics_pieces(groups, domain, name):
+    yield ''.join(_ics_line(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:-//{domain}//reservations//JA',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_ics_escape(name)}',
+        f'X-WR-TIMEZONE:{settings.TIME_ZONE}',
+    ])
+    for group in groups:
+        yield _ics_event(group, domain)
+    yield _ics_line('END:VCALENDAR')
+
+
+def stream_ics(reservations, *, domain, name='予約', chunk_size=CHUNK_SIZE):
+    """iCalendar（.ics）を少しずつ返すイテレータ。日時は UTC で書き出す。"""
+    return _buffered(_ics_pieces(iter_groups(reservations.iterator(chunk_size=chunk_size)), domain, name))
+
+
+def feed_range(today=None):
+    """購読フィードの期間（CALENDAR_FEED_PAST_DAYS 日前〜CALENDAR_FEED_FUTURE_DAYS 日後）。"""
+    today = today or timezone.localdate()
+    return (
+        today - timedelta(days=getattr(settings, 'CALENDAR_FEED_PAST_DAYS', 30)),
+        today + timedelta(days=getattr(settings, 'CALENDAR_FEED_FUTURE_DAYS', 180)),
+    )
+
+
+def _user_key(user):
+    # パスワードを変更するとトークンが無効になる
+    return salted_hmac(TOKEN_SALT, user.password, algorithm='sha256').hexdigest()[:16]
+
+
+def feed_token(user):
+    """購読用 URL に含める署名付きトークン。"""
+    return signing.dumps({'u': user.pk, 'k': _user_key(user)}, salt=TOKEN_SALT)
+
+
+def user_for_token(token):
+    """トークンのユーザー（無効なトークン・無効なユーザーなら None）。"""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict):
+        return None
+    user = User.objects.filter(pk=data.get('u'), is_active=True).first()
+    if user is None or not constant_time_compare(str(data.get('k', '')), _user_key(user)):
+        return None
+    return user
@@ -0,0 +1,184 @@
+"""
+日別・場所別の集計（DailyReservationStat）の更新と読み出し。
+
+予約・入退室記録が保存・削除されると、signals.py がコミット後に該当する（日付, 場所）の行を元データから再計算する。
+差分の加算ではなく再計算なので、同時更新や保存の失敗で値がずれることはない（1 行あたり集計 1 回）。
+QuerySet.update() などシグナルの出ない一括更新では refresh_matching_on_commit() を呼ぶこと。
+
+ダッシュボードは予約テーブルを数えずにこの表を合計する（予約件数ではなく日数 × 場所数に比例する）。
+アーカイブ済みの予約・入退室記録（archive.py）も数えるため、アーカイブしても集計は変わらない。
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+
+from .models import (
+    ArchivedReservation, ArchivedVisitRecord, DailyReservationStat, Location, Reservation, VisitRecord,
+)
+
+STAT_FIELDS = [
+    'reservation_count', 'confirmed_count', 'pending_count', 'cancelled_count', 'visit_count', 'billed_amount',
+]
+# rebuild() で 1 回に集計する日数
+REBUILD_BATCH_DAYS = 31
+
+# batched_refresh() の中で refresh_on_commit() された組
+_batched = threading.local()
+
+
+def _reservation_stats(reservations):
+    return reservations.values('date', 'location_id').annotate(
+        reservation_count=Count('id'),
+        confirmed_count=Count('id', filter=Q(status='confirmed')),
+        pending_count=Count('id', filter=Q(status='pending')),
+        cancelled_count=Count('id', filter=Q(status='cancelled')),
+    ).order_by()
+
+
+def _visit_stats(visits):
+    return visits.values('date', 'location_id').annotate(
+        visit_count=Count('id'),
+        billed_amount=Sum('billed_amount', default=0),
+    ).order_by()
+
+
+def _collect(cells=None, **filters):
+    """
+    filters で絞り込んだ元データ（アーカイブ済みを含む）を集計して {(日付, 場所ID): {フィールド: 値}} を返す。
+    cells を渡すとその組だけにする。
+    """
+    rows = {cell: dict.fromkeys(STAT_FIELDS, 0) for cell in cells or ()}
+    querysets = [
+        _reservation_stats(Reservation.objects.filter(**filters)),
+        _reservation_stats(ArchivedReservation.objects.filter(**filters)),
+        _visit_stats(VisitRecord.objects.filter(**filters)),
+        _visit_stats(ArchivedVisitRecord.objects.filter(**filters)),
+    ]
+    for queryset in querysets:
+        for row in queryset:
+            cell = (row.pop('date'), row.pop('location_id'))
+            if cells is not None and cell not in rows:
+                continue
+            values = rows.setdefault(cell, dict.fromkeys(STAT_FIELDS, 0))
+            for name, value in row.items():
+                values[name] += value
+    return rows
+
+
+def _save(rows):
+    DailyReservationStat.objects.bulk_create(
+        [DailyReservationStat(date=date, location_id=location_id, **values) for (date, location_id), values in rows.items()],
+        update_conflicts=True,
+        unique_fields=['date', 'location'],
+        update_fields=STAT_FIELDS + ['updated_at'],
+    )
+
+
+def refresh(cells):
+    """（日付, 場所ID）の組ごとに集計を元データから計算し直す。"""
+    cells = {(date, location_id) for date, location_id in cells if date is not None and location_id is not None}
+    if not cells:
+        return 0
+    dates = {date for date, _ in cells}
+    location_ids = {location_id for _, location_id in cells}
+    # 場所ごと削除された場合（集計行も CASCADE で消えている）は作り直さない
+    existing = set(Location.objects.filter(pk__in=location_ids).values_list('pk', flat=True))
+    cells = {cell for cell in cells if cell[1] in existing}
+    if not cells:
+        return 0
+    rows = _collect(cells, date__in=dates, location_id__in=existing)
+    _save(rows)
+    return len(rows)
+
+
+def refresh_on_commit(cells):
+    """トランザクションのコミット後に refresh() する（自動コミット中はすぐに実行される）。"""
+    pending = getattr(_batched, 'cells', None)
+    if pending is not None:
+        pending.update(cells)
+        return
+    transaction.on_commit(partial(refresh, set(cells)))
+
+
+@contextmanager
+def batched_refresh():
+    """
+    この中の refresh_on_commit() をまとめ、抜けるときに 1 回だけ登録する。
+    QuerySet.delete() のように行ごとにシグナルが出る一括処理で、行ごとに再計算しないために使う。
+    """
+    previous = getattr(_batched, 'cells', None)
+    cells = _batched.cells = set()
+    try:
+        yield
+    finally:
+        _batched.cells = previous
+    refresh_on_commit(cells)
+
+
+def refresh_matching_on_commit(reservations):
+    """
+    QuerySet.update() など、シグナルの出ない一括更新の後に呼ぶ。
+    reservations（予約の QuerySet）に該当する日付・場所をコミット後に調べて再計算する。
+    """
+    def run():
+        refresh(reservations.values_list('date', 'location_id').distinct().order_by())
+
+    transaction.on_commit(run)
+
+
+def rebuild(start_date=None, end_date=None, *, batch_days=REBUILD_BATCH_DAYS):
+    """
+    期間内（省略時は全期間）の集計を元データから作り直す。作った行数を返す。
+    batch_days 日ずつ、集計行の削除と作成を 1 トランザクションで行う。
+    """
+    if start_date is None or end_date is None:
+        bounds = [
+            model.objects.aggregate(first=Min('date'), last=Max('date'))
+            for model in (Reservation, ArchivedReservation, VisitRecord, ArchivedVisitRecord)
+        ]
+        firsts = [b['first'] for b in bounds if b['first'] is not None]
+        lasts = [b['last'] for b in bounds if b['last'] is not None]
+        if not firsts:
+            DailyReservationStat.objects.filter(
+                **({'date__gte': start_date} if start_date else {}),
+                **({'date__lte': end_date} if end_date else {}),
+            ).delete()
+            return 0
+        start_date = start_date or min(firsts)
+        end_date = end_date or max(lasts)
+
+    created = 0
+    batch_start = start_date
+    while batch_start <= end_date:
+        batch_end = min(batch_start + timedelta(days=batch_days - 1), end_date)
+        with transaction.atomic():
+            DailyReservationStat.objects.filter(date__gte=batch_start, date__lte=batch_end).delete()
+            rows = _collect(date__gte=batch_start, date__lte=batch_end)
+            _save(rows)
+        created += len(rows)
+        batch_start = batch_end + timedelta(days=1)
+    return created
+
+
+def reservation_counts(today):
+    """
+    トップページ・管理者ダッシュボードの予約数（キャンセルを含む）。
+    today: 今日、month: 今月 1 日以降、recent: 7 日前以降。
+    """
+    stats = DailyReservationStat.objects.aggregate(
+        today=Sum('reservation_count', filter=Q(date=today)),
+        month=Sum('reservation_count', filter=Q(date__gte=today.replace(day=1))),
+        recent=Sum('reservation_count', filter=Q(date__gte=today - timedelta(days=7))),
+    )
+    return {key: value or 0 for key, value in stats.items()}
+
+
+def locations_with_reservation_count():
+    """全期間の場所別予約数（reservation_count で注釈し、多い順）。"""
+    return Location.objects.annotate(
+        reservation_count=Sum('daily_stats__reservation_count', default=0),
+    ).order_by('-reservation_count')
@@ -0,0 +1,92 @@
+"""
+メール本文のレンダリング。
+
+テンプレートは reservations/templates/reservations/emails/ に次の名前で置く:
+  <name>.html          HTML 本文（必須）
+  <name>.txt           テキスト本文（省略時は HTML からタグを除いたもの）
+  <name>_subject.txt   件名（1 行。省略時は render_email の subject 引数）
+テキスト本文・件名は HTML ではないため、全体を {% autoescape off %} で囲む。
+
+メール専用のテンプレートエンジン（タグライブラリは TEMPLATES の設定と同じ）で Django の cached loader を使い、コンパイル済みテンプレートを
+プロセス内で再利用する。render_bulk() は同じ Context を push/pop しながら宛先ごとに描画する。
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.template import Context, Engine, TemplateDoesNotExist, engines
+from django.utils.html import strip_tags
+
+EMAIL_TEMPLATE_DIR = 'reservations/emails'
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    subject: str
+    text: str
+    html: str
+
+
+@lru_cache(maxsize=1)
+def email_engine():
+    """
+    メール用テンプレートエンジン（cached loader 固定。DEBUG の自動リロードの影響を受けない）。
+    {% load %} できるライブラリと builtins はサイトのテンプレートエンジン（settings.TEMPLATES）から引き継ぐ。
+    """
+    site = engines['django'].engine
+    return Engine(
+        dirs=site.dirs,
+        loaders=[
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+        libraries=site.libraries,
+        builtins=[name for name in site.builtins if name not in Engine.default_builtins],
+        debug=False,
+    )
+
+
+@lru_cache(maxsize=None)
+def _templates(name):
+    """(subject, text, html) のコンパイル済みテンプレート。存在しないものは None。"""
+    engine = email_engine()
+
+    def load(suffix):
+        try:
+            return engine.get_template(f'{EMAIL_TEMPLATE_DIR}/{name}{suffix}')
+        except TemplateDoesNotExist:
+            return None
+
+    html = load('.html')
+    if html is None:
+        raise TemplateDoesNotExist(f'{EMAIL_TEMPLATE_DIR}/{name}.html')
+    return load('_subject.txt'), load('.txt'), html
+
+
+def _render(templates, context, subject):
+    subject_tpl, text_tpl, html_tpl = templates
+    html = html_tpl.render(context)
+    text = text_tpl.render(context) if text_tpl else strip_tags(html)
+    if subject_tpl:
+        subject = ' '.join(subject_tpl.render(context).split())
+    return RenderedEmail(subject=subject or '', text=text.strip() + '\n', html=html)
+
+
+def render_email(name, context, *, subject=''):
+    """1 通分の件名・テキスト・HTML を描画する。"""
+    return _render(_templates(name), Context(context), subject)
+
+
+def render_bulk(name, contexts, *, common=None, subject=''):
+    """
+    同じテンプレートで複数の宛先分を描画する（contexts は宛先ごとの dict の iterable）。
+    common は全宛先で共通の値（site_url など）。
+    """
+    templates = _templates(name)
+    context = Context(common or {})
+    rendered = []
+    for ctx in contexts:
+        with context.push(ctx):
+            rendered.append(_render(templates, context, subject))
+    return rendered
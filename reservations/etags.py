@@ -0,0 +1,57 @@
+"""
+ETag / Last-Modified による条件付き GET の共通処理。
+
+ビューは応答の内容を決める値（検索条件・件数・最終更新日時など）から validators() で検証子を作り、
+not_modified() が 304 を返せばそれを返す。本体を作った応答には apply() で同じ検証子を付ける。
+"""
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts, weak=False):
+    """parts（文字列化できる値）から ETag を作る。"""
+    digest = hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+@dataclass(frozen=True)
+class Validators:
+    etag: str = None
+    last_modified: datetime = None
+
+    @property
+    def last_modified_timestamp(self):
+        if self.last_modified is None:
+            return None
+        return int(self.last_modified.timestamp())
+
+
+def validators(*parts, last_modified=None, weak=False):
+    return Validators(etag=make_etag(*parts, weak=weak), last_modified=last_modified)
+
+
+def not_modified(request, validators):
+    """条件に一致すれば 304（GET/HEAD 以外なら 412）の応答、一致しなければ None。"""
+    return get_conditional_response(
+        request, etag=validators.etag, last_modified=validators.last_modified_timestamp,
+    )
+
+
+def apply(response, validators, *, cache_control='private, no-cache', vary_cookie=True):
+    """
+    応答に検証子と Cache-Control を付ける。
+    既定の no-cache は「キャッシュしてよいが毎回再検証する」で、304 になれば本体を作らずに済む。
+    """
+    if validators.etag:
+        response['ETag'] = validators.etag
+    if validators.last_modified is not None:
+        response['Last-Modified'] = http_date(validators.last_modified_timestamp)
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    if vary_cookie:
+        patch_vary_headers(response, ['Cookie'])
+    return response
@@ -0,0 +1,187 @@
+"""
+予約・入退室記録・決済の CSV 出力。
+
+行は values_list().iterator() で少しずつ読み、1 行ずつ CSV にして返すため、
+何年分を出力してもワーカーのメモリ使用量は一定（PostgreSQL ではサーバーサイドカーソルで読む）。
+画面（export_csv）と manage.py export_data の両方から使う。
+Excel でそのまま開けるよう、先頭に BOM を付けた UTF-8 で出力する。
+お客様名などフォームから入力された値が数式として実行されないよう、= + - @ などで始まる値の先頭には ' を付ける。
+予約・入退室記録はアーカイブ済みの行（archive.py）を先に、続けて現在のテーブルの行を出力する。
+"""
+import csv
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import ArchivedReservation, ArchivedVisitRecord, PaymentTransaction, Reservation, VisitRecord
+
+CHUNK_SIZE = 2000
+BOM = '﻿'
+# Excel などが数式として扱う先頭の文字（imports.py は取り込み時に付けた ' を外す）
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+@dataclass(frozen=True)
+class ExportFilter:
+    """出力の条件。日付は予約・入退室は利用日、決済は作成日時（ローカル日付）で絞り込む。"""
+    start_date: object = None
+    end_date: object = None
+    location_id: int = None
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def _local(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _filter_by_date(queryset, filters):
+    if filters.start_date:
+        queryset = queryset.filter(date__gte=filters.start_date)
+    if filters.end_date:
+        queryset = queryset.filter(date__lte=filters.end_date)
+    if filters.location_id:
+        queryset = queryset.filter(location_id=filters.location_id)
+    return queryset
+
+
+def _reservations(filters):
+    fields = [
+        'customer_name', 'customer_email', 'customer_phone', 'status', 'is_no_show',
+        'booking_group_id', 'created_by__username', 'created_at',
+    ]
+    archived = _filter_by_date(ArchivedReservation.objects.all(), filters).order_by('date', 'start_time', 'pk')
+    current = _filter_by_date(Reservation.objects.all(), filters).order_by('date', 'time_slot__start_time', 'pk')
+    return [
+        archived.values_list('pk', 'date', 'start_time', 'end_time', 'location__name', *fields),
+        current.values_list('pk', 'date', 'time_slot__start_time', 'time_slot__end_time', 'location__name', *fields),
+    ]
+
+
+def _reservation_row(row):
+    pk, day, start, end, location, name, email, phone, status, no_show, group_id, created_by, created_at = row
+    return [
+        pk, day.isoformat(), start.strftime('%H:%M'), end.strftime('%H:%M'), location,
+        name, email, phone, STATUS_LABELS['reservation'].get(status, status), '1' if no_show else '',
+        group_id or '', created_by or '', _local(created_at),
+    ]
+
+
+def _visits(filters):
+    return [
+        _filter_by_date(model.objects.all(), filters).order_by('date', 'entry_at', 'pk').values_list(
+            'pk', 'date', 'location__name', 'member_profile__full_name', 'member_profile__user__email',
+            'member_profile__plan__name', 'entry_at', 'exit_at', 'billed_amount', 'reservation_id',
+        )
+        for model in (ArchivedVisitRecord, VisitRecord)
+    ]
+
+
+def _visit_row(row):
+    pk, day, location, name, email, plan, entry_at, exit_at, billed, reservation_id = row
+    return [
+        pk, day.isoformat(), location, name, email, plan or '', _local(entry_at), _local(exit_at),
+        '' if billed is None else billed, reservation_id or '',
+    ]
+
+
+def _payments(filters):
+    queryset = PaymentTransaction.objects.all()
+    if filters.start_date:
+        queryset = queryset.filter(created_at__gte=_aware(filters.start_date))
+    if filters.end_date:
+        queryset = queryset.filter(created_at__lt=_aware(filters.end_date + timedelta(days=1)))
+    if filters.location_id:
+        in_group, archived_in_group = (
+            model.objects.filter(booking_group=OuterRef('booking_group'), location_id=filters.location_id)
+            for model in (Reservation, ArchivedReservation)
+        )
+        queryset = queryset.filter(
+            Q(reservation__location_id=filters.location_id) | Exists(in_group) | Exists(archived_in_group),
+        )
+    return [queryset.order_by('created_at', 'pk').values_list(
+        'pk', 'created_at', 'updated_at', 'status', 'amount', 'currency', 'square_payment_id', 'square_order_id',
+        'payment_link_id', 'reservation_id', 'booking_group_id', 'member_profile__full_name',
+    )]
+
+
+def _payment_row(row):
+    (pk, created_at, updated_at, status, amount, currency, payment_id, order_id, link_id,
+     reservation_id, group_id, member) = row
+    return [
+        pk, _local(created_at), _local(updated_at), STATUS_LABELS['payment'].get(status, status), amount, currency,
+        payment_id or '', order_id or '', link_id or '', reservation_id or '', group_id or '', member or '',
+    ]
+
+
+STATUS_LABELS = {
+    'reservation': dict(Reservation.STATUS_CHOICES),
+    'payment': dict(PaymentTransaction.STATUS_CHOICES),
+}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    label: str
+    header: list
+    # 条件 → 順に出力する QuerySet のリスト
+    querysets: object
+    format_row: object
+
+
+DATASETS = {
+    'reservations': Dataset(
+        '予約',
+        ['予約ID', '予約日', '開始', '終了', '場所', 'お客様名', 'メールアドレス', '電話番号', 'ステータス',
+         '無断キャンセル', '予約グループID', '作成者', '作成日時'],
+        _reservations, _reservation_row,
+    ),
+    'visits': Dataset(
+        '入退室記録',
+        ['記録ID', '利用日', '場所', '会員', 'メールアドレス', 'プラン', '入場日時', '退場日時', '請求額', '予約ID'],
+        _visits, _visit_row,
+    ),
+    'payments': Dataset(
+        '決済',
+        ['決済ID', '作成日時', '更新日時', 'ステータス', '金額', '通貨', 'Square決済ID', 'Square注文ID',
+         '決済リンクID', '予約ID', '予約グループID', '会員'],
+        _payments, _payment_row,
+    ),
+}
+
+
+def _safe(value):
+    """数式として実行される文字列の先頭に ' を付ける（数値・日付はそのまま）。"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """csv.writer の書き込み先。書いた 1 行をそのまま返す。"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(name, filters=ExportFilter(), *, bom=True, chunk_size=CHUNK_SIZE):
+    """name のデータセットを CSV の行（文字列）ごとに返すイテレータ。"""
+    dataset = DATASETS[name]
+    writer = csv.writer(_Echo())
+    if bom:
+        yield BOM
+    yield writer.writerow(dataset.header)
+    for queryset in dataset.querysets(filters):
+        for row in queryset.iterator(chunk_size=chunk_size):
+            yield writer.writerow([_safe(value) for value in dataset.format_row(row)])
+
+
+def filename(name, filters=ExportFilter()):
+    parts = [name]
+    if filters.start_date or filters.end_date:
+        parts.append(f"{filters.start_date or ''}_{filters.end_date or ''}")
+    return '-'.join(parts) + '.csv'
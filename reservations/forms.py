@@ -3,7 +3,8 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.db.models import Q
-from .models import Location, TimeSlot, Reservation, Plan, MemberProfile
+from .models import Location, TimeSlot, Reservation, ReservationSeries, Plan, MemberProfile
+from .series import MAX_OCCURRENCES as MAX_SERIES_OCCURRENCES, occurrence_dates as series_occurrence_dates
 from datetime import date
 import re
 
@@ -181,6 +182,104 @@ class ReservationForm(forms.ModelForm):
 
         return cleaned_data
 
+class ReservationSeriesForm(forms.Form):
+    """繰り返し予約フォーム（毎週・隔週の同じ時間枠を回数か終了日まで）"""
+    location = forms.ModelChoiceField(
+        queryset=Location.objects.filter(is_active=True),
+        label='場所',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    time_slots = forms.ModelMultipleChoiceField(
+        queryset=TimeSlot.objects.filter(is_active=True),
+        label='時間枠',
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
+        help_text='複数の時間枠を選択できます'
+    )
+    start_date = forms.DateField(
+        label='初回',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    interval_weeks = forms.TypedChoiceField(
+        choices=ReservationSeries.INTERVAL_CHOICES,
+        coerce=int,
+        initial=1,
+        label='間隔',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    count = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=MAX_SERIES_OCCURRENCES,
+        label='回数',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': MAX_SERIES_OCCURRENCES})
+    )
+    until = forms.DateField(
+        required=False,
+        label='終了日',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    customer_name = forms.CharField(
+        max_length=100,
+        label='お客様名',
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    customer_email = forms.EmailField(
+        label='メールアドレス',
+        widget=forms.EmailInput(attrs={'class': 'form-control'})
+    )
+    notes = forms.CharField(
+        required=False,
+        label='備考',
+        widget=forms.Textarea(attrs={'rows': 3, 'class': 'form-control'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        self.fields['start_date'].widget.attrs['min'] = date.today().isoformat()
+        if self.user and self.user.is_authenticated:
+            profile = MemberProfile.objects.filter(user=self.user).first()
+            self.fields['customer_name'].initial = profile.full_name if profile else (self.user.get_full_name() or self.user.username)
+            self.fields['customer_email'].initial = self.user.email
+
+    def max_date(self):
+        """最終回にできる日（一般ユーザーは1ヶ月先、特別ユーザーは3ヶ月先まで。スーパーユーザーは回数の上限のみ）"""
+        if self.user and self.user.is_superuser:
+            return None
+        from datetime import timedelta
+        profile = MemberProfile.objects.filter(user=self.user).first() if self.user and self.user.is_authenticated else None
+        return date.today() + timedelta(days=90 if profile and profile.is_special_user else 30)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        count, until = cleaned_data.get('count'), cleaned_data.get('until')
+        if not count and not until:
+            raise ValidationError('回数か終了日を入力してください。')
+        if count and until:
+            raise ValidationError('回数と終了日はどちらか一方を入力してください。')
+        if start_date:
+            if start_date < date.today():
+                raise ValidationError('過去の日付は予約できません。')
+            if until and until < start_date:
+                raise ValidationError('終了日は初回以降にしてください。')
+            max_date = self.max_date()
+            if max_date and start_date > max_date:
+                raise ValidationError(f'予約は {max_date:%Y年%m月%d日} まで可能です。')
+        return cleaned_data
+
+    def occurrence_dates(self):
+        """各回の日付（予約可能期間を超える回は含めない）"""
+        until = self.cleaned_data['until']
+        max_date = self.max_date()
+        if max_date:
+            until = min(until, max_date) if until else max_date
+        return series_occurrence_dates(
+            self.cleaned_data['start_date'], self.cleaned_data['interval_weeks'],
+            count=self.cleaned_data['count'], until=until,
+        )
+
+
 class TimeSlotForm(forms.ModelForm):
     """時間枠フォーム"""
     class Meta:
@@ -241,6 +340,69 @@ class ReservationSearchForm(forms.Form):
     )
 
 
+class AnalyticsPeriodForm(forms.Form):
+    """分析レポートの期間"""
+    start = forms.DateField(
+        label='開始日',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    end = forms.DateField(
+        label='終了日',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+
+    # 1 回のレポートで扱う最長の期間（月別の表の列数を抑える）
+    MAX_DAYS = 366 * 5
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end:
+            if start > end:
+                raise forms.ValidationError('開始日は終了日以前にしてください。')
+            if (end - start).days > self.MAX_DAYS:
+                raise forms.ValidationError('期間は5年以内にしてください。')
+        return cleaned_data
+
+
+class DataExportForm(forms.Form):
+    """CSV 出力の条件"""
+    DATASET_CHOICES = [
+        ('reservations', '予約'),
+        ('visits', '入退室記録'),
+        ('payments', '決済'),
+    ]
+    dataset = forms.ChoiceField(
+        choices=DATASET_CHOICES,
+        label='データ',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    start = forms.DateField(
+        required=False,
+        label='開始日',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    end = forms.DateField(
+        required=False,
+        label='終了日',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    location = forms.ModelChoiceField(
+        queryset=Location.objects.all(),
+        required=False,
+        label='場所',
+        empty_label='すべての場所',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError('開始日は終了日以前にしてください。')
+        return cleaned_data
+
+
 # 会員登録フォーム - Step1: 基本情報
 class MemberRegistrationStep1Form(forms.Form):
     """会員登録 Step1: 基本情報"""
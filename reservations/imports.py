@@ -0,0 +1,376 @@
+"""
+会員・予約の CSV 取り込み（manage.py import_members / import_reservations）。
+
+CSV は少しずつ読み、IMPORT_BATCH_SIZE 行ごとに
+1. 行ごとの形式チェック（モデルのフィールドの検証をそのまま使う）
+2. 既存データとの照合（メールアドレス・予約枠をまとめて 1 回の IN クエリで調べる）
+3. bulk_create（チャンクごとに 1 トランザクション。一意制約に反した場合は 1 行ずつ保存し直す）
+を行う。問題のある行は取り込まず、行番号とエラーを ImportResult.errors に残す。
+見出しは英語のキー（email など）のほか、exports.py が出力する日本語の見出しも使える。
+"""
+import csv
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from . import daily_stats
+from .exports import FORMULA_PREFIXES
+from .member_utils import get_default_regular_member_plan
+from .models import Location, MemberProfile, Plan, Reservation, TimeSlot
+from .series import ACTIVE_STATUSES
+
+IMPORT_BATCH_SIZE = 1000
+
+MEMBER_COLUMNS = {
+    'email': ['メールアドレス'],
+    'full_name': ['氏名', '会員'],
+    'gender': ['性別'],
+    'phone': ['電話番号'],
+    'postal_code': ['郵便番号'],
+    'address': ['住所'],
+    'plan': ['プラン'],
+    'is_special_user': ['特別ユーザー'],
+}
+RESERVATION_COLUMNS = {
+    'date': ['予約日'],
+    'start_time': ['開始'],
+    'location': ['場所'],
+    'customer_name': ['お客様名'],
+    'customer_email': ['メールアドレス'],
+    'customer_phone': ['電話番号'],
+    'status': ['ステータス'],
+    'notes': ['備考'],
+}
+REQUIRED_RESERVATION_COLUMNS = {
+    'date': '予約日', 'start_time': '開始時刻', 'location': '場所', 'customer_name': 'お客様名', 'customer_email': 'メールアドレス',
+}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'はい', '○'}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    # (行番号, エラー内容)
+    errors: list = field(default_factory=list)
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(f, columns):
+    """
+    CSV を (行番号, {キー: 値}) ごとに返す。見出しの別名（日本語）はキーに読み替える。
+    必須でない列がなくてもよく、値の前後の空白は除く。
+    exports.py が数式の無効化のために付けた先頭の ' は外す。
+    """
+    reader = csv.reader(f)
+    try:
+        header = next(reader)
+    except StopIteration:
+        return
+    aliases = {alias: key for key, names in columns.items() for alias in [key, *names]}
+    keys = [aliases.get(name.strip().lstrip('﻿')) for name in header]
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        values = dict.fromkeys(columns, '')
+        for key, value in zip(keys, row):
+            if key and not values[key]:
+                value = value.strip()
+                if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+                    value = value[1:]
+                values[key] = value
+        yield reader.line_num, values
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _clean(model, name, value):
+    """モデルのフィールドの検証（max_length・validators・choices）を通した値を返す。"""
+    model_field = model._meta.get_field(name)
+    try:
+        return model_field.clean(value, None)
+    except ValidationError as e:
+        raise RowError(f'{model_field.verbose_name}: {" ".join(e.messages)}')
+
+
+def _choice(model, name, value, default):
+    """選択肢の値（male など）か表示名（男性など）を値にする。"""
+    if not value:
+        return default
+    for key, label in model._meta.get_field(name).choices:
+        if value in (key, label):
+            return key
+    raise RowError(f'{model._meta.get_field(name).verbose_name}が不正です: {value}')
+
+
+# 会員
+
+
+def _member_from_row(values, plans, default_plan):
+    if not values['email']:
+        raise RowError('メールアドレスは必須です')
+    email = User.objects.normalize_email(_clean(User, 'email', values['email']))
+    if not values['full_name']:
+        raise RowError('氏名は必須です')
+    plan = default_plan
+    if values['plan']:
+        plan = plans.get(values['plan'])
+        if plan is None:
+            raise RowError(f'プランが見つかりません: {values["plan"]}')
+    profile = MemberProfile(
+        full_name=_clean(MemberProfile, 'full_name', values['full_name']),
+        gender=_choice(MemberProfile, 'gender', values['gender'], 'other'),
+        phone=_clean(MemberProfile, 'phone', values['phone']),
+        postal_code=_clean(MemberProfile, 'postal_code', values['postal_code']),
+        address=values['address'],
+        plan=plan,
+        is_special_user=values['is_special_user'].lower() in TRUE_VALUES,
+    )
+    return email, profile
+
+
+def import_members(rows, *, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    会員（User と MemberProfile）を取り込む。ユーザー名はメールアドレス（会員登録と同じ）。
+    パスワードは設定しない（使えないパスワード）ので、会員はパスワードの再設定からログインする。
+    プランは名前か ID で指定し、空欄なら通常会員のプラン。登録済みのメールアドレスの行はエラーにする。
+    dry_run では保存せず、created は取り込める件数になる。
+    """
+    result = ImportResult()
+    plans = {}
+    for plan in Plan.objects.all():
+        plans.setdefault(plan.name, plan)
+        plans[str(plan.pk)] = plan
+    default_plan = get_default_regular_member_plan()
+    # ファイル内の重複の検出用（小文字のメールアドレス）
+    seen = set()
+    # パスワードのハッシュ計算を行ごとにしない（使えないパスワードはハッシュしない）
+    password = make_password(None)
+
+    for chunk in _chunks(rows, batch_size):
+        parsed = []
+        for line, values in chunk:
+            try:
+                email, profile = _member_from_row(values, plans, default_plan)
+            except RowError as e:
+                result.error(line, str(e))
+                continue
+            if email.lower() in seen:
+                result.error(line, f'ファイル内でメールアドレスが重複しています: {email}')
+                continue
+            seen.add(email.lower())
+            parsed.append((line, email, profile))
+
+        existing = _registered_emails([email.lower() for _, email, _ in parsed])
+        new = []
+        for line, email, profile in parsed:
+            if email.lower() in existing:
+                result.error(line, f'登録済みのメールアドレスです: {email}')
+            else:
+                new.append((line, email, profile))
+        if dry_run:
+            result.created += len(new)
+            continue
+        if not new:
+            continue
+
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [User(username=email, email=email, password=password) for _, email, _ in new],
+                )
+                for user, (_, _, profile) in zip(users, new):
+                    profile.user = user
+                MemberProfile.objects.bulk_create([profile for _, _, profile in new])
+        except IntegrityError:
+            # 読み込み中に同じメールアドレスが登録された場合など。1 行ずつ保存し直し、保存できない行だけエラーにする
+            result.created += _create_members_one_by_one(new, password, result)
+            continue
+        result.created += len(new)
+    result.errors.sort()
+    return result
+
+
+def _registered_emails(lowered):
+    """小文字のメールアドレスのうち、メールアドレスかユーザー名として登録済みのもの（小文字）。"""
+    return set(
+        User.objects.annotate(email_lower=Lower('email')).filter(email_lower__in=lowered)
+        .values_list('email_lower', flat=True)
+    ) | set(
+        User.objects.annotate(username_lower=Lower('username')).filter(username_lower__in=lowered)
+        .values_list('username_lower', flat=True)
+    )
+
+
+def _create_members_one_by_one(new, password, result):
+    """(行番号, メールアドレス, 会員プロフィール) を 1 件ずつ（行ごとのセーブポイントで）保存し、保存できた件数を返す。"""
+    created = 0
+    with transaction.atomic():
+        for line, email, profile in new:
+            try:
+                with transaction.atomic():
+                    # 失敗したチャンクで作成したユーザーは取り消されているため、作り直す
+                    user, = User.objects.bulk_create([User(username=email, email=email, password=password)])
+                    profile.user = user
+                    MemberProfile.objects.bulk_create([profile])
+            except IntegrityError as e:
+                result.error(line, f'{email} を保存できませんでした: {e}')
+                continue
+            created += 1
+    return created
+
+
+# 予約
+
+
+def _time(value):
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            pass
+    raise RowError(f'開始時刻は HH:MM 形式で指定してください: {value}')
+
+
+def _date(value):
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise RowError(f'予約日は YYYY-MM-DD 形式で指定してください: {value}')
+
+
+def _reservation_from_row(values, locations, time_slots):
+    for key, label in REQUIRED_RESERVATION_COLUMNS.items():
+        if not values[key]:
+            raise RowError(f'{label}は必須です')
+    location = locations.get(values['location'])
+    if location is None:
+        raise RowError(f'場所が見つかりません: {values["location"]}')
+    start_time = _time(values['start_time'])
+    time_slot = time_slots.get(start_time)
+    if time_slot is None:
+        raise RowError(f'開始時刻 {start_time:%H:%M} の時間枠がありません')
+    return Reservation(
+        location=location,
+        time_slot=time_slot,
+        date=_date(values['date']),
+        customer_name=_clean(Reservation, 'customer_name', values['customer_name']),
+        customer_email=_clean(Reservation, 'customer_email', values['customer_email']),
+        customer_phone=_clean(Reservation, 'customer_phone', values['customer_phone']),
+        status=_choice(Reservation, 'status', values['status'], 'confirmed'),
+        notes=values['notes'],
+    )
+
+
+def import_reservations(rows, *, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    予約を取り込む。場所は名前か ID、時間枠は開始時刻（HH:MM）で指定し、ステータスの既定は確認済み。
+    同じ場所・時間枠・日付の予約（キャンセル済みを除く）がすでにある行はエラーにする。
+    メールアドレスが会員と一致する予約は、その会員が作成したものとして登録する（マイページに表示される）。
+    dry_run では保存せず、created は取り込める件数になる。
+    """
+    result = ImportResult()
+    locations = {}
+    for location in Location.objects.all():
+        locations.setdefault(location.name, location)
+        locations[str(location.pk)] = location
+    time_slots = {}
+    # 同じ開始時刻の時間枠が複数ある場合は有効なものを使う
+    for time_slot in TimeSlot.objects.order_by('-is_active', 'pk'):
+        time_slots.setdefault(time_slot.start_time, time_slot)
+    seen = set()
+
+    for chunk in _chunks(rows, batch_size):
+        parsed = []
+        for line, values in chunk:
+            try:
+                reservation = _reservation_from_row(values, locations, time_slots)
+            except RowError as e:
+                result.error(line, str(e))
+                continue
+            # キャンセル済みの予約は枠を塞がない
+            key = (reservation.location_id, reservation.time_slot_id, reservation.date)
+            if reservation.status != 'cancelled':
+                if key in seen:
+                    result.error(line, 'ファイル内で同じ枠の予約が重複しています')
+                    continue
+                seen.add(key)
+            parsed.append((line, reservation))
+
+        existing = _booked_slots([r for _, r in parsed])
+        members = dict(
+            User.objects.annotate(email_lower=Lower('email')).filter(
+                email_lower__in={r.customer_email.lower() for _, r in parsed},
+            ).values_list('email_lower', 'pk')
+        )
+        new = []
+        for line, reservation in parsed:
+            key = (reservation.location_id, reservation.time_slot_id, reservation.date)
+            if reservation.status != 'cancelled' and key in existing:
+                result.error(line, f'{reservation.date} {reservation.time_slot} {reservation.location.name} はすでに予約されています')
+                continue
+            reservation.created_by_id = members.get(reservation.customer_email.lower())
+            new.append((line, reservation))
+        if dry_run:
+            result.created += len(new)
+            continue
+        if not new:
+            continue
+
+        try:
+            with transaction.atomic():
+                Reservation.objects.bulk_create([reservation for _, reservation in new])
+                # bulk_create ではシグナルが出ないため、日別集計はここで更新する
+                daily_stats.refresh_on_commit({(r.date, r.location_id) for _, r in new})
+        except IntegrityError:
+            # 読み込み中に同じ枠が予約された場合など。1 行ずつ保存し直し、保存できない行だけエラーにする
+            result.created += _create_reservations_one_by_one(new, result)
+            continue
+        result.created += len(new)
+    result.errors.sort()
+    return result
+
+
+def _booked_slots(reservations):
+    """予約と同じ日付・場所・時間枠の有効な予約（キャンセル済みを除く）の (場所ID, 時間枠ID, 日付) の集合。"""
+    return set(
+        Reservation.objects.filter(
+            date__in={r.date for r in reservations},
+            location_id__in={r.location_id for r in reservations},
+            time_slot_id__in={r.time_slot_id for r in reservations},
+            status__in=ACTIVE_STATUSES,
+        ).values_list('location_id', 'time_slot_id', 'date')
+    )
+
+
+def _create_reservations_one_by_one(new, result):
+    """(行番号, 予約) を 1 件ずつ（行ごとのセーブポイントで）保存し、保存できた件数を返す。"""
+    created = []
+    with transaction.atomic():
+        for line, reservation in new:
+            try:
+                with transaction.atomic():
+                    Reservation.objects.bulk_create([reservation])
+            except IntegrityError as e:
+                result.error(line, f'{reservation.date} {reservation.time_slot} {reservation.location.name} を保存できませんでした: {e}')
+                continue
+            created.append(reservation)
+        daily_stats.refresh_on_commit({(r.date, r.location_id) for r in created})
+    return len(created)
@@ -0,0 +1,190 @@
+"""
+DB テーブルをキューとして使うバックグラウンドジョブ（外部ブローカー不要）。
+
+- enqueue() でジョブを登録し、manage.py run_worker が claim_jobs() → run_jobs() で処理する。
+- 失敗したジョブは指数バックオフで再試行し、max_attempts を超えたら failed にする。
+- 同じタスクのジョブはまとめて処理し、batch_context（SMTP 接続など）を 1 回だけ開いて共有する。
+"""
+import logging
+import random
+from contextlib import nullcontext
+from datetime import timedelta
+from importlib import import_module
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# ハンドラを定義しているモジュール（run_jobs 前に読み込んで登録させる）
+HANDLER_MODULES = [
+    'reservations.mailer',
+    'reservations.photo_processing',
+    'reservations.registration_notifications',
+    'reservations.square_events',
+]
+
+_handlers = {}
+
+
+def job_handler(task, batch_context=None):
+    """
+    タスク名にハンドラを登録するデコレータ。
+    batch_context を指定すると、同じタスクのジョブを処理する間だけその戻り値（コンテキストマネージャ）を開き、
+    ハンドラには handler(payload, resource) の形で渡す。指定しない場合は handler(payload)。
+    """
+    def decorator(func):
+        _handlers[task] = (func, batch_context)
+        return func
+    return decorator
+
+
+def _load_handlers():
+    for module_name in HANDLER_MODULES:
+        import_module(module_name)
+
+
+def enqueue(task, payload=None, *, run_after=None, max_attempts=None):
+    """
+    ジョブを登録する。BACKGROUND_JOBS_EAGER=True（開発時の既定）のときはその場で実行する。
+    """
+    job = BackgroundJob.objects.create(
+        task=task,
+        payload=payload or {},
+        run_after=run_after or timezone.now(),
+        max_attempts=max_attempts or getattr(settings, 'BACKGROUND_JOB_MAX_ATTEMPTS', 5),
+    )
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False) and job.run_after <= timezone.now():
+        run_jobs([job])
+    return job
+
+
+def enqueue_once(task, payload=None, *, run_after=None):
+    """
+    同じタスクの待機中ジョブがなければ登録する。既にあれば実行予定を早い方に寄せて再利用する
+    （ダイジェスト送信のように「まとめて 1 回」処理したいタスク向け）。
+    """
+    run_after = run_after or timezone.now()
+    existing = BackgroundJob.objects.filter(task=task, status='pending').order_by('run_after').first()
+    if existing is None:
+        return enqueue(task, payload, run_after=run_after)
+    if run_after < existing.run_after:
+        existing.run_after = run_after
+        existing.save(update_fields=['run_after', 'updated_at'])
+        if getattr(settings, 'BACKGROUND_JOBS_EAGER', False) and run_after <= timezone.now():
+            run_jobs([existing])
+    return existing
+
+
+def retry_delay(attempts):
+    """attempts 回目の失敗後に待つ時間（指数バックオフ＋最大 10% のジッター）。"""
+    base = getattr(settings, 'BACKGROUND_JOB_RETRY_BASE_SECONDS', 30)
+    cap = getattr(settings, 'BACKGROUND_JOB_RETRY_MAX_SECONDS', 3600)
+    delay = min(base * (2 ** max(attempts - 1, 0)), cap)
+    return timedelta(seconds=delay * (1 + random.random() * 0.1))
+
+
+def claim_rows(model, rows, condition, **values):
+    """
+    rows を 1 件ずつ「condition を満たす場合だけ values に UPDATE」し、更新できた（取得できた）ものだけを返す。
+    SKIP LOCKED のないバックエンド（SQLite）では複数のワーカーが同じ行を読めるため、これで 1 つのワーカーだけが取得する。
+    """
+    manager = model._default_manager
+    return [row for row in rows if manager.filter(pk=row.pk, **condition).update(**values) == 1]
+
+
+def claim_jobs(limit=50):
+    """
+    実行可能なジョブを最大 limit 件取得し running にする。
+    PostgreSQL では SKIP LOCKED により複数ワーカーでも同じジョブを取り合わない。
+    SKIP LOCKED がない場合は、待機中のままのジョブだけを 1 件ずつ条件付き UPDATE で取得する。
+    """
+    now = timezone.now()
+    values = {'status': 'running', 'locked_at': now, 'updated_at': now}
+    with transaction.atomic():
+        qs = BackgroundJob.objects.filter(status='pending', run_after__lte=now).order_by('run_after', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            jobs = list(qs.select_for_update(skip_locked=True)[:limit])
+            if jobs:
+                BackgroundJob.objects.filter(id__in=[j.id for j in jobs]).update(**values)
+        else:
+            jobs = claim_rows(BackgroundJob, list(qs[:limit]), {'status': 'pending'}, **values)
+    for job in jobs:
+        job.status = 'running'
+        job.locked_at = now
+    return jobs
+
+
+def requeue_stale_jobs(timeout_seconds=900):
+    """ワーカーが落ちて running のまま残ったジョブを待機中に戻す。"""
+    threshold = timezone.now() - timedelta(seconds=timeout_seconds)
+    return BackgroundJob.objects.filter(status='running', locked_at__lt=threshold).update(
+        status='pending', locked_at=None,
+    )
+
+
+def purge_finished_jobs(days=14):
+    """完了から days 日を過ぎたジョブを削除する（失敗ジョブは調査用に残す）。"""
+    threshold = timezone.now() - timedelta(days=days)
+    return BackgroundJob.objects.filter(status='done', updated_at__lt=threshold).delete()[0]
+
+
+def _mark_done(job):
+    job.status = 'done'
+    job.attempts += 1
+    job.last_error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'attempts', 'last_error', 'locked_at', 'updated_at'])
+
+
+def _mark_failed(job, error):
+    job.attempts += 1
+    job.last_error = str(error)[:2000]
+    job.locked_at = None
+    if job.attempts >= job.max_attempts:
+        job.status = 'failed'
+        logger.error('ジョブ %s (%s) が %d 回失敗したため中止しました: %s', job.id, job.task, job.attempts, error)
+    else:
+        job.status = 'pending'
+        job.run_after = timezone.now() + retry_delay(job.attempts)
+        logger.warning('ジョブ %s (%s) が失敗しました（%d 回目）。再試行します: %s', job.id, job.task, job.attempts, error)
+    job.save(update_fields=['status', 'attempts', 'last_error', 'locked_at', 'run_after', 'updated_at'])
+
+
+def run_jobs(jobs):
+    """取得済みのジョブを実行する。戻り値は成功件数。"""
+    _load_handlers()
+    succeeded = 0
+    ordered = sorted(jobs, key=lambda j: (j.task, j.run_after, j.id))
+    for task, group in groupby(ordered, key=lambda j: j.task):
+        group = list(group)
+        handler, batch_context = _handlers.get(task, (None, None))
+        if handler is None:
+            for job in group:
+                _mark_failed(job, f'未登録のタスクです: {task}')
+            continue
+
+        pending = list(group)
+        try:
+            with (batch_context() if batch_context else nullcontext()) as resource:
+                while pending:
+                    job = pending.pop(0)
+                    try:
+                        if batch_context:
+                            handler(job.payload, resource)
+                        else:
+                            handler(job.payload)
+                    except Exception as e:
+                        _mark_failed(job, e)
+                    else:
+                        _mark_done(job)
+                        succeeded += 1
+        except Exception as e:
+            # 共有リソースを開けない（SMTP サーバに接続できない等）場合は残りをまとめて再試行へ
+            for job in pending:
+                _mark_failed(job, e)
+    return succeeded
@@ -0,0 +1,41 @@
+"""送信メールのキュー投入と送信処理（送信は run_worker が 1 本の SMTP 接続でまとめて行う）。"""
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from .jobs import enqueue, job_handler
+
+SEND_MAIL_TASK = 'mail.send'
+
+
+def queue_mail(subject, recipients, *, html='', body='', from_email=None):
+    """メールを送信キューに登録する（リクエスト中は SMTP に接続しない）。"""
+    return enqueue(SEND_MAIL_TASK, {
+        'subject': subject,
+        'body': body,
+        'html': html,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+        'to': list(recipients),
+    })
+
+
+def build_message(payload, connection=None):
+    message = EmailMultiAlternatives(
+        payload['subject'],
+        payload.get('body', ''),
+        payload.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+        payload['to'],
+        connection=connection,
+    )
+    if payload.get('html'):
+        message.attach_alternative(payload['html'], 'text/html')
+    return message
+
+
+def open_connection():
+    # バックエンドの接続はコンテキストマネージャとして open/close される
+    return get_connection(fail_silently=False)
+
+
+@job_handler(SEND_MAIL_TASK, batch_context=open_connection)
+def send_queued_mail(payload, connection):
+    build_message(payload, connection=connection).send()
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import archive
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'日付は YYYY-MM-DD 形式で指定してください: {value}')
+
+
+class Command(BaseCommand):
+    help = '利用日が古い予約・入退室記録をアーカイブ用のテーブルに移します（途中で止めても次回は残りから続けます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='今日から何日より前の行を移すか（既定: ARCHIVE_AFTER_DAYS）')
+        parser.add_argument('--before', type=_date, help='この日（YYYY-MM-DD）より前の行を移す（--days の代わり）')
+        parser.add_argument(
+            '--batch-size', type=int, default=archive.DEFAULT_BATCH_SIZE,
+            help=f'1 トランザクションで移す件数（既定: {archive.DEFAULT_BATCH_SIZE}）',
+        )
+        parser.add_argument('--max-batches', type=int, default=None, help='テーブルごとに繰り返す最大回数（既定: 無制限）')
+        parser.add_argument('--pause', type=float, default=0.1, help='バッチ間の待機秒数（既定: 0.1）')
+        parser.add_argument('--dry-run', action='store_true', help='移さずに対象の件数だけ表示する')
+
+    def handle(self, *args, **options):
+        if options['before'] and options['days'] is not None:
+            raise CommandError('--days と --before は同時に指定できません')
+        try:
+            if options['before']:
+                cutoff = archive.check_cutoff(options['before'])
+            else:
+                cutoff = archive.cutoff_date(options['days'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if cutoff is None:
+            raise CommandError('--days か --before を指定するか、ARCHIVE_AFTER_DAYS を設定してください')
+
+        if options['dry_run']:
+            visits = archive.archivable_visits(cutoff).count()
+            reservations = archive.archivable_reservations(cutoff).count()
+            self.stdout.write(f'{cutoff} より前: 入退室記録 {visits}件、予約 {reservations}件をアーカイブできます')
+            return
+
+        visits, reservations = archive.archive_history(
+            cutoff,
+            batch_size=max(options['batch_size'], 1),
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{cutoff} より前の入退室記録 {visits}件、予約 {reservations}件をアーカイブしました'
+        ))
@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from reservations.models import MemberProfile
+from reservations.photo_processing import PhotoOptions, apply_result, process_image, read_photo
+
+
+def _process(args):
+    # 子プロセスで実行する（DB・ストレージには触れない）
+    profile_id, data, options = args
+    try:
+        return profile_id, process_image(data, options), None
+    except ValueError as e:
+        return profile_id, None, str(e)
+
+
+class Command(BaseCommand):
+    help = '既存の会員の顔写真を縮小・再エンコードし、サムネイルを作成します（プロセスプールで並列処理）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='画像処理のプロセス数（既定: CPU 数）',
+        )
+        parser.add_argument('--batch-size', type=int, default=50, help='まとめて読み込む件数（既定: 50）')
+        parser.add_argument('--all', action='store_true', help='サムネイル作成済みの写真も処理し直す')
+
+    def handle(self, *args, **options):
+        queryset = MemberProfile.objects.exclude(photo='').exclude(photo__isnull=True).select_related('user')
+        if not options['all']:
+            queryset = queryset.filter(photo_thumbnail__in=['', None])
+        profile_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+        photo_options = PhotoOptions.from_settings()
+        batch_size = max(options['batch_size'], 1)
+        processed = skipped = failed = 0
+
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            for start in range(0, len(profile_ids), batch_size):
+                profiles = queryset.in_bulk(profile_ids[start:start + batch_size])
+                work = []
+                for profile in profiles.values():
+                    try:
+                        work.append((profile.pk, read_photo(profile), photo_options))
+                    except FileNotFoundError:
+                        self.stderr.write(f'会員 {profile.pk}: 写真のファイルがありません（{profile.photo.name}）')
+                        failed += 1
+
+                for profile_id, result, error in executor.map(_process, work):
+                    if error:
+                        self.stderr.write(f'会員 {profile_id}: {error}')
+                        failed += 1
+                    elif apply_result(profiles[profile_id], *result):
+                        processed += 1
+                    else:
+                        # 処理中に写真が差し替えられた（差し替え後の写真はジョブで処理される）
+                        skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(profile_ids)}件中 {processed}件を処理しました（スキップ {skipped}件、失敗 {failed}件）'
+        ))
@@ -0,0 +1,67 @@
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from reservations.email_rendering import render_bulk, render_email
+
+TEMPLATES = ['registration_complete', 'registration_admin_notice', 'registration_admin_digest', 'reservation_confirmed']
+
+
+def _sample_context(name, i):
+    """DB を使わずにテンプレートへ渡すダミーのコンテキストを作る。"""
+    plan = SimpleNamespace(name='一般会員')
+    user = SimpleNamespace(username=f'member{i}', email=f'member{i}@example.com')
+    profile = SimpleNamespace(full_name=f'会員 {i}', plan=plan, user=user, created_at=datetime(2025, 4, 1, 10, 0))
+    if name == 'registration_admin_digest':
+        return {'profiles': [profile] * 10}
+    if name == 'reservation_confirmed':
+        location = SimpleNamespace(name='会議室A')
+        slot = SimpleNamespace(start_time=dtime(10, 0), end_time=dtime(10, 30))
+        reservations = [
+            SimpleNamespace(date=date(2025, 4, 1) + timedelta(days=d), time_slot=slot, location=location)
+            for d in range(3)
+        ]
+        return {'customer_name': f'会員 {i}', 'reservations': reservations, 'total_amount': 3000}
+    return {'user': user, 'profile': profile}
+
+
+class Command(BaseCommand):
+    help = 'メールテンプレートの描画時間を計測します（render_to_string と email_rendering の比較）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500, help='1 テンプレートあたりの描画回数（既定: 500）')
+        parser.add_argument('--template', choices=TEMPLATES, action='append', help='対象テンプレート（複数指定可。既定: 全て）')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        common = {'site_url': 'https://example.com/'}
+
+        for name in options['template'] or TEMPLATES:
+            contexts = [_sample_context(name, i) for i in range(count)]
+            path = f'reservations/emails/{name}.html'
+
+            # 初回のコンパイルは計測から除く
+            render_email(name, {**contexts[0], **common})
+
+            start = time.perf_counter()
+            for ctx in contexts:
+                render_to_string(path, {**ctx, **common})
+            baseline = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for ctx in contexts:
+                render_email(name, {**ctx, **common})
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            render_bulk(name, contexts, common=common)
+            bulk = time.perf_counter() - start
+
+            self.stdout.write(
+                f'{name}: render_to_string(HTML のみ) {baseline / count * 1000:.3f}ms/通, '
+                f'render_email(件名+テキスト+HTML) {single / count * 1000:.3f}ms/通, '
+                f'render_bulk {bulk / count * 1000:.3f}ms/通'
+            )
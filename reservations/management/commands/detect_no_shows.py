@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reservations import no_shows
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'日付は YYYY-MM-DD 形式で指定してください: {value}')
+
+
+class Command(BaseCommand):
+    help = '確認済みで来場がなかった予約に無断キャンセルの印を付け、会員ごとの件数を更新します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=_date, help='開始日（YYYY-MM-DD。既定: 終了日）')
+        parser.add_argument('--to', dest='end', type=_date, help='終了日（YYYY-MM-DD。既定: 昨日）')
+        parser.add_argument(
+            '--batch-days', type=int, default=no_shows.DETECT_BATCH_DAYS,
+            help=f'1 回の UPDATE で判定する日数（既定: {no_shows.DETECT_BATCH_DAYS}）',
+        )
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate() - timedelta(days=1)
+        start = options['start'] or end
+        if start > end:
+            raise CommandError('開始日は終了日以前にしてください')
+
+        flagged, cleared = no_shows.detect(start, end, batch_days=max(options['batch_days'], 1))
+        members = no_shows.update_member_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'{start}〜{end}: 無断キャンセル {flagged}件を設定、{cleared}件を解除しました（会員 {members}人の件数を更新）'
+        ))
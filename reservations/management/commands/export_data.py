@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import exports
+from reservations.models import Location
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'日付は YYYY-MM-DD 形式で指定してください: {value}')
+
+
+class Command(BaseCommand):
+    help = '予約・入退室記録・決済を CSV に出力します（行を少しずつ読むため、全期間でもメモリ使用量は一定です）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS), help='出力するデータ')
+        parser.add_argument('--from', dest='start', type=_date, help='開始日（YYYY-MM-DD）')
+        parser.add_argument('--to', dest='end', type=_date, help='終了日（YYYY-MM-DD）')
+        parser.add_argument('--location', type=int, help='場所の ID')
+        parser.add_argument('--output', '-o', help='出力先のファイル（既定: 標準出力）')
+        parser.add_argument('--no-bom', action='store_true', help='先頭に BOM を付けない（Excel 以外で読む場合）')
+
+    def handle(self, *args, **options):
+        if options['start'] and options['end'] and options['start'] > options['end']:
+            raise CommandError('開始日は終了日以前にしてください')
+        if options['location'] and not Location.objects.filter(pk=options['location']).exists():
+            raise CommandError(f'場所が見つかりません: {options["location"]}')
+
+        filters = exports.ExportFilter(
+            start_date=options['start'], end_date=options['end'], location_id=options['location'],
+        )
+        lines = exports.iter_csv(options['dataset'], filters, bom=not options['no_bom'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        written = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            for line in lines:
+                f.write(line)
+                written += 1
+        # 見出し行と BOM は件数に含めない
+        rows = written - (1 if options['no_bom'] else 2)
+        self.stderr.write(self.style.SUCCESS(f'{rows}件を {options["output"]} に出力しました'))
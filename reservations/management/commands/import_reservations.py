@@ -0,0 +1,49 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import imports
+
+
+class Command(BaseCommand):
+    help = '予約を CSV から取り込みます（同じ枠の予約がある行は取り込みません）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV ファイル')
+        parser.add_argument('--encoding', default='utf-8-sig', help='文字コード（既定: UTF-8。Excel の CSV は cp932）')
+        parser.add_argument(
+            '--batch-size', type=int, default=imports.IMPORT_BATCH_SIZE,
+            help=f'1 トランザクションで取り込む行数（既定: {imports.IMPORT_BATCH_SIZE}）',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='検証だけ行い、保存しない')
+        parser.add_argument('--errors', help='エラーの行を CSV（行番号, エラー）で書き出すファイル（既定: 標準エラー出力）')
+
+    def handle(self, *args, **options):
+        try:
+            f = open(options['path'], encoding=options['encoding'], newline='')
+        except (OSError, LookupError) as e:
+            raise CommandError(f'ファイルを開けません: {e}')
+        with f:
+            try:
+                result = imports.import_reservations(
+                    imports.read_rows(f, imports.RESERVATION_COLUMNS),
+                    batch_size=max(options['batch_size'], 1),
+                    dry_run=options['dry_run'],
+                )
+            except UnicodeDecodeError as e:
+                # それまでのまとまりは保存済み
+                raise CommandError(f'文字コードが {options["encoding"]} ではありません（--encoding で指定してください）: {e}')
+
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8-sig', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['行', 'エラー'])
+                writer.writerows(result.errors)
+        else:
+            for line, message in result.errors:
+                self.stderr.write(f'{line}行目: {message}')
+
+        verb = '取り込めます（--dry-run のため保存していません）' if options['dry_run'] else '取り込みました'
+        self.stdout.write(self.style.SUCCESS(f'予約 {result.created}件を{verb}'))
+        if result.errors:
+            self.stdout.write(self.style.WARNING(f'エラー {len(result.errors)}件（該当の行は取り込んでいません）'))
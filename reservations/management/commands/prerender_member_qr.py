@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import member_qr
+from reservations.models import MemberProfile
+
+
+class Command(BaseCommand):
+    help = '全会員の会員QRコード（SVG）を生成してキャッシュします'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='まとめて処理する件数（既定: 500）')
+        parser.add_argument('--force', action='store_true', help='キャッシュ済みのものも生成し直す')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        tokens = MemberProfile.objects.order_by('pk').values_list('member_qr_token', flat=True)
+        total = rendered = 0
+        batch = []
+        try:
+            for token in tokens.iterator(chunk_size=batch_size):
+                batch.append(token)
+                if len(batch) >= batch_size:
+                    rendered += member_qr.prerender(batch, force=options['force'])
+                    total += len(batch)
+                    batch = []
+            if batch:
+                rendered += member_qr.prerender(batch, force=options['force'])
+                total += len(batch)
+        except member_qr.QRUnavailable as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'{total}件中 {rendered}件の会員QRコードを生成しました'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from reservations import temp_uploads
+from reservations.session_cleanup import DEFAULT_BATCH_SIZE, prune_expired_sessions
+
+
+class Command(BaseCommand):
+    help = '期限切れのセッションと一時アップロードを少しずつ削除します（clearsessions の代わり）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'1 回の DELETE で削除する件数（既定: {DEFAULT_BATCH_SIZE}）',
+        )
+        parser.add_argument('--max-batches', type=int, default=None, help='削除を繰り返す最大回数（既定: 無制限）')
+        parser.add_argument('--pause', type=float, default=0.1, help='バッチ間の待機秒数（既定: 0.1）')
+
+    def handle(self, *args, **options):
+        sessions = prune_expired_sessions(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+        )
+        uploads = temp_uploads.purge_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f'期限切れセッション {sessions}件、一時アップロード {uploads}件を削除しました'
+        ))
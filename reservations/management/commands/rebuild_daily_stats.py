@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import daily_stats
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'日付は YYYY-MM-DD 形式で指定してください: {value}')
+
+
+class Command(BaseCommand):
+    help = '日別・場所別の集計（ダッシュボード用）を予約・入退室記録から作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=_date, help='開始日（YYYY-MM-DD。既定: 最も古いデータの日）')
+        parser.add_argument('--to', dest='end', type=_date, help='終了日（YYYY-MM-DD。既定: 最も新しいデータの日）')
+        parser.add_argument(
+            '--batch-days', type=int, default=daily_stats.REBUILD_BATCH_DAYS,
+            help=f'1 トランザクションで処理する日数（既定: {daily_stats.REBUILD_BATCH_DAYS}）',
+        )
+
+    def handle(self, *args, **options):
+        if options['start'] and options['end'] and options['start'] > options['end']:
+            raise CommandError('開始日は終了日以前にしてください')
+        rows = daily_stats.rebuild(options['start'], options['end'], batch_days=max(options['batch_days'], 1))
+        self.stdout.write(self.style.SUCCESS(f'日別集計を {rows}件作り直しました'))
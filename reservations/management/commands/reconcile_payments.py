@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reservations.payment_reconciliation import SquareListError, reconcile_payments
+from reservations.square_client import SquareUnavailable
+
+
+class Command(BaseCommand):
+    help = 'Square の決済一覧と決済トランザクションを突き合わせ、ステータスをまとめて更新します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3, help='何日前以降の決済を対象にするか（既定: 3）')
+        parser.add_argument('--page-size', type=int, default=100, help='1 ページあたりの取得件数（既定: 100、最大 100）')
+        parser.add_argument('--dry-run', action='store_true', help='更新せずに件数だけ表示する')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'SQUARE_INTEGRATION_ENABLED', False):
+            raise CommandError('Square 連携が無効です（SQUARE_INTEGRATION_ENABLED=False）')
+
+        begin_time = (timezone.now() - timedelta(days=options['days'])).strftime('%Y-%m-%dT%H:%M:%SZ')
+        try:
+            result = reconcile_payments(
+                begin_time=begin_time,
+                location_id=getattr(settings, 'SQUARE_LOCATION_ID', ''),
+                page_size=min(options['page_size'], 100),
+                dry_run=options['dry_run'],
+            )
+        except (SquareListError, SquareUnavailable) as e:
+            raise CommandError(str(e))
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{result.pages}ページ・{result.payments}件の決済を確認しました: '
+            f'更新 {result.updated}件、該当トランザクションなし {result.unmatched}件、'
+            f'予約確定 {result.confirmed_reservations}件'
+        ))
@@ -0,0 +1,76 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from reservations import archive, booking_drafts, jobs, no_shows, temp_uploads
+from reservations.session_cleanup import prune_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'バックグラウンドジョブ（メール送信など）を処理するワーカーを起動します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='待機中のジョブを 1 回処理して終了する')
+        parser.add_argument('--batch-size', type=int, default=50, help='1 回に取得するジョブ数（既定: 50）')
+        parser.add_argument('--interval', type=float, default=5.0, help='ジョブがないときの待機秒数（既定: 5）')
+        parser.add_argument(
+            '--stale-timeout', type=int, default=900,
+            help='running のまま放置されたジョブを待機中に戻すまでの秒数（既定: 900）',
+        )
+        parser.add_argument('--purge-days', type=int, default=14, help='完了ジョブを削除するまでの日数（既定: 14）')
+
+    def handle(self, *args, **options):
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        batch_size = options['batch_size']
+        # ARCHIVE_AFTER_DAYS の誤りでワーカー全体（メール送信など）を止めないよう、起動時に確認してアーカイブだけ無効にする
+        archive_enabled = True
+        try:
+            archive.cutoff_date()
+        except ValueError as e:
+            archive_enabled = False
+            self.stderr.write(f'ARCHIVE_AFTER_DAYS が不正なため、アーカイブは行いません: {e}')
+        self.stdout.write('バックグラウンドワーカーを起動しました')
+        last_purge = 0.0
+        last_no_show_date = None
+
+        while not self._stopping:
+            close_old_connections()
+            jobs.requeue_stale_jobs(options['stale_timeout'])
+            if time.monotonic() - last_purge > 3600:
+                jobs.purge_finished_jobs(options['purge_days'])
+                booking_drafts.purge_expired()
+                # 1 時間あたりの削除量を抑え、残りは次回に回す
+                prune_expired_sessions(max_batches=20, pause=0.1)
+                temp_uploads.purge_expired()
+                last_purge = time.monotonic()
+            if last_no_show_date != timezone.localdate():
+                # 1 日 1 回、昨日までの数日分の無断キャンセルを判定し直す
+                no_shows.run_nightly()
+                # ARCHIVE_AFTER_DAYS を過ぎた予約・入退室記録を移す（1 晩あたりの量を抑え、残りは翌晩に回す）
+                cutoff = archive.cutoff_date() if archive_enabled else None
+                if cutoff:
+                    archive.archive_history(cutoff, max_batches=20, pause=0.1)
+                last_no_show_date = timezone.localdate()
+
+            claimed = jobs.claim_jobs(batch_size)
+            if claimed:
+                succeeded = jobs.run_jobs(claimed)
+                self.stdout.write(f'{len(claimed)}件のジョブを処理しました（成功 {succeeded}件）')
+
+            if options['once']:
+                if len(claimed) < batch_size:
+                    break
+                continue
+            if len(claimed) < batch_size:
+                time.sleep(options['interval'])
+
+        self.stdout.write('バックグラウンドワーカーを停止しました')
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
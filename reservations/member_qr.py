@@ -0,0 +1,90 @@
+"""
+会員QRコード（SVG）の生成とキャッシュ。
+
+member_qr_token は変わらないため、SVG はトークンごとに 1 回だけ生成してキャッシュ（既定はファイル）に置く。
+画像の URL と ETag にはトークンから求めたバージョンを含め、ブラウザには長期間キャッシュさせる。
+見た目（サイズ・誤り訂正レベルなど）を変えたら RENDER_VERSION を上げること。
+"""
+import hashlib
+import io
+
+from django.core.cache import caches
+from django.urls import reverse
+
+RENDER_VERSION = 1
+CACHE_ALIAS = 'member_qr'
+PAYLOAD_PREFIX = 'YOMOHIRO_MEMBER:'
+
+
+class QRUnavailable(RuntimeError):
+    """qrcode ライブラリが利用できない。"""
+
+
+def payload(token):
+    return f'{PAYLOAD_PREFIX}{token}'
+
+
+def version(token):
+    """画像の URL・ETag に使う値（トークンと RENDER_VERSION から決まる）。"""
+    return hashlib.sha256(f'{RENDER_VERSION}:{token}'.encode()).hexdigest()[:32]
+
+
+def etag(token):
+    return f'"{version(token)}"'
+
+
+def image_url(profile):
+    return reverse('reservations:member_qr_image_versioned', kwargs={'version': version(profile.member_qr_token)})
+
+
+def render_svg(token):
+    """QR コードの SVG を生成する。PNG+Pillow 経由だと PIL 未導入環境で失敗するため SVG にする。"""
+    try:
+        import qrcode
+        import qrcode.image.svg
+    except ImportError as e:
+        raise QRUnavailable('QRライブラリが利用できません。') from e
+
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=6,
+        border=2,
+        image_factory=qrcode.image.svg.SvgPathImage,
+    )
+    qr.add_data(payload(token))
+    qr.make(fit=True)
+    buf = io.BytesIO()
+    qr.make_image().save(buf)
+    return buf.getvalue()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _cache_key(token):
+    return f'member_qr:{version(token)}'
+
+
+def get_svg(token):
+    """キャッシュ済みの SVG を返す（なければ生成してキャッシュする）。"""
+    cache = _cache()
+    key = _cache_key(token)
+    svg = cache.get(key)
+    if svg is None:
+        svg = render_svg(token)
+        cache.set(key, svg, None)
+    return svg
+
+
+def prerender(tokens, *, force=False):
+    """トークンの一覧の SVG をまとめて生成してキャッシュする。生成した件数を返す。"""
+    cache = _cache()
+    keys = {_cache_key(token): token for token in tokens}
+    if not force:
+        for key in cache.get_many(list(keys)):
+            del keys[key]
+    if keys:
+        cache.set_many({key: render_svg(token) for key, token in keys.items()}, None)
+    return len(keys)
@@ -0,0 +1,162 @@
+"""
+ワーカープロセスのメモリ計測（リーク調査用）。
+
+- snapshot(): tracemalloc によるメモリ確保の多い箇所の一覧（基準スナップショットとの差分も可）。
+  スーパーユーザーの /api/memory/ か、ワーカーへのシグナル（MEMORY_PROFILING_SIGNAL）でログに出力して参照する。
+- MemoryProfilingMiddleware（reservations.middleware）がビューごとの確保量のピークと RSS の増加を記録する。
+- current_rss_kb() は gunicorn_config.py の RSS によるワーカー再起動でも使う。
+
+値はすべてワーカープロセス単位。tracemalloc は動作が遅くなるため、既定では調査時にだけ有効にする。
+"""
+import logging
+import os
+import resource
+import signal
+import threading
+import tracemalloc
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# スナップショットから除外する（import 処理・tracemalloc 自体の確保）
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+_lock = threading.Lock()
+_baseline = None
+
+
+def current_rss_kb():
+    """現在の RSS（KB）。/proc がない環境では最大 RSS で代用する。"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def start_tracing(frames=None):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames or getattr(settings, 'MEMORY_TRACEMALLOC_FRAMES', 5))
+
+
+def stop_tracing():
+    global _baseline
+    with _lock:
+        _baseline = None
+    tracemalloc.stop()
+
+
+def take_baseline():
+    """現在の状態を基準スナップショットにする（以降の snapshot(diff=True) はここからの増加分）。"""
+    global _baseline
+    start_tracing()
+    with _lock:
+        _baseline = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def snapshot(*, limit=20, key_type='lineno', diff=False):
+    """メモリ確保の多い箇所の一覧。tracemalloc が無効なら tracing=False だけを返す。"""
+    result = {'pid': os.getpid(), 'rss_kb': current_rss_kb(), 'tracing': tracemalloc.is_tracing()}
+    if not result['tracing']:
+        return result
+
+    current, peak = tracemalloc.get_traced_memory()
+    result.update(traced_kb=current // 1024, traced_peak_kb=peak // 1024)
+    snap = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    with _lock:
+        baseline = _baseline
+    if diff and baseline is not None:
+        stats = snap.compare_to(baseline, key_type)
+        result['top'] = [
+            {
+                'location': _format_traceback(stat.traceback),
+                'size_kb': round(stat.size / 1024, 1),
+                'size_diff_kb': round(stat.size_diff / 1024, 1),
+                'count_diff': stat.count_diff,
+            }
+            for stat in stats[:limit]
+        ]
+    else:
+        result['top'] = [
+            {'location': _format_traceback(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+            for stat in snap.statistics(key_type)[:limit]
+        ]
+    result['diff'] = bool(diff and baseline is not None)
+    return result
+
+
+def _format_traceback(traceback):
+    frame = traceback[0]
+    return f'{frame.filename}:{frame.lineno}'
+
+
+class ViewMemoryStats:
+    """ビューごとの呼び出し回数・確保量のピーク（tracemalloc 有効時）・RSS の増加。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def record(self, view_name, *, peak_kb=None, rss_growth_kb=0):
+        with self._lock:
+            view = self._views.setdefault(view_name, {
+                'calls': 0, 'traced_calls': 0, 'max_peak_kb': 0, 'total_peak_kb': 0,
+                'rss_growth_kb': 0, 'max_rss_growth_kb': 0,
+            })
+            view['calls'] += 1
+            if peak_kb is not None:
+                view['traced_calls'] += 1
+                view['max_peak_kb'] = max(view['max_peak_kb'], peak_kb)
+                view['total_peak_kb'] += peak_kb
+            view['rss_growth_kb'] += rss_growth_kb
+            view['max_rss_growth_kb'] = max(view['max_rss_growth_kb'], rss_growth_kb)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for name, view in self._views.items():
+                traced = view['traced_calls']
+                result[name] = {
+                    'calls': view['calls'],
+                    'avg_peak_kb': round(view['total_peak_kb'] / traced, 1) if traced else None,
+                    'max_peak_kb': view['max_peak_kb'] if traced else None,
+                    'rss_growth_kb': view['rss_growth_kb'],
+                    'max_rss_growth_kb': view['max_rss_growth_kb'],
+                }
+            return dict(sorted(result.items(), key=lambda item: -(item[1]['max_peak_kb'] or 0)))
+
+
+view_stats = ViewMemoryStats()
+
+
+def _log_snapshot(signum, frame):
+    # シグナルハンドラではログ出力だけを行う（スナップショットは基準との差分があれば差分）
+    data = snapshot(limit=25, diff=True)
+    logger.warning('memory snapshot pid=%s rss=%sKB tracing=%s', data['pid'], data['rss_kb'], data['tracing'])
+    for stat in data.get('top', []):
+        logger.warning('  %s', stat)
+    for name, view in view_stats.snapshot().items():
+        logger.warning('  view %s %s', name, view)
+
+
+def install_signal_handler():
+    """
+    MEMORY_PROFILING_SIGNAL（既定 SIGUSR2）を受けたらスナップショットをログに出力する。
+    gunicorn はワーカー起動時にシグナルハンドラを設定し直すため、post_worker_init から呼ぶ。
+    """
+    name = getattr(settings, 'MEMORY_PROFILING_SIGNAL', 'SIGUSR2')
+    if not name:
+        return None
+    signum = getattr(signal, name)
+    signal.signal(signum, _log_snapshot)
+    return signum
@@ -1,7 +1,13 @@
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import resolve
 
+from . import memory_profiling
+
 class SuperuserRequiredMiddleware:
     """スーパーユーザーのみアクセス可能なURLを制限するミドルウェア"""
     
@@ -29,6 +35,8 @@ class SuperuserRequiredMiddleware:
         'reservations:user_detail',
         'reservations:user_edit',
         'reservations:user_delete',
+        'reservations:square_metrics',
+        'reservations:memory_report',
     ]
     
     def __init__(self, get_response):
@@ -60,3 +68,37 @@ class SuperuserRequiredMiddleware:
         response = self.get_response(request)
         return response
 
+
+class MemoryProfilingMiddleware:
+    """
+    ビューごとのメモリ確保量のピークと RSS の増加を記録する（MEMORY_PROFILING_ENABLED=True のときのみ）。
+    確保量のピークは tracemalloc 有効時のみ。tracemalloc.reset_peak() はプロセス全体の値のため、
+    1 ワーカー 1 リクエストずつ処理する sync ワーカーを前提とする。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEMORY_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        if getattr(settings, 'MEMORY_TRACEMALLOC_AT_STARTUP', False):
+            memory_profiling.start_tracing()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_traced = tracemalloc.get_traced_memory()[0]
+        start_rss = memory_profiling.current_rss_kb()
+
+        response = self.get_response(request)
+
+        peak_kb = None
+        if tracing and tracemalloc.is_tracing():
+            peak_kb = max(tracemalloc.get_traced_memory()[1] - start_traced, 0) // 1024
+        match = getattr(request, 'resolver_match', None)
+        memory_profiling.view_stats.record(
+            match.view_name if match else 'unresolved',
+            peak_kb=peak_kb,
+            rss_growth_kb=max(memory_profiling.current_rss_kb() - start_rss, 0),
+        )
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0013_location_display_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='タスク名')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='引数')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '実行中'), ('done', '完了'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='ステータス')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='試行回数')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='最大試行回数')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='取得日時')),
+                ('last_error', models.TextField(blank=True, verbose_name='最終エラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'バックグラウンドジョブ',
+                'verbose_name_plural': 'バックグラウンドジョブ',
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='reservation_status_89cffd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0014_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationNotice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reservations.memberprofile', verbose_name='会員')),
+            ],
+            options={
+                'verbose_name': '会員登録通知（送信待ち）',
+                'verbose_name_plural': '会員登録通知（送信待ち）',
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0015_registrationnotice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SquareWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True, verbose_name='イベントID')),
+                ('event_type', models.CharField(blank=True, max_length=100, verbose_name='イベント種別')),
+                ('payload', models.JSONField(default=dict, verbose_name='受信内容')),
+                ('event_created_at', models.DateTimeField(blank=True, null=True, verbose_name='イベント発生日時')),
+                ('status', models.CharField(choices=[('pending', '未処理'), ('processed', '処理済み'), ('ignored', '対象外'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='ステータス')),
+                ('error', models.TextField(blank=True, verbose_name='エラー')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='受信日時')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='処理日時')),
+            ],
+            options={
+                'verbose_name': 'Square Webhook イベント',
+                'verbose_name_plural': 'Square Webhook イベント',
+                'ordering': ['event_created_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'event_created_at'], name='reservation_status_db2f22_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0016_squarewebhookevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='payment_link_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True, verbose_name='決済リンクID'),
+        ),
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='square_order_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True, verbose_name='Square注文ID'),
+        ),
+    ]
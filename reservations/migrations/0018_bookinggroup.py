@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reservations', '0017_paymenttransaction_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_email', models.EmailField(blank=True, max_length=254, verbose_name='メールアドレス')),
+                ('total_amount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='合計金額')),
+                ('status', models.CharField(choices=[('pending', '決済待ち'), ('confirmed', '確定')], default='pending', max_length=20, verbose_name='ステータス')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='作成者')),
+            ],
+            options={
+                'verbose_name': '予約グループ',
+                'verbose_name_plural': '予約グループ',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='booking_group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='reservations.bookinggroup', verbose_name='予約グループ'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='booking_group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='reservations.bookinggroup', verbose_name='予約グループ'),
+        ),
+    ]
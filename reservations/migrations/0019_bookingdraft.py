@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import reservations.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reservations', '0018_bookinggroup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=reservations.models._booking_draft_token, max_length=16, unique=True, verbose_name='トークン')),
+                ('data', models.JSONField(default=dict, verbose_name='入力内容')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('payment_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='booking_draft', to='reservations.paymenttransaction', verbose_name='決済トランザクション')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '予約手続き中データ',
+                'verbose_name_plural': '予約手続き中データ',
+                'indexes': [models.Index(fields=['expires_at'], name='reservation_expires_21dd2d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:37
+
+from django.db import migrations, models
+import reservations.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0019_bookingdraft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberprofile',
+            name='photo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to=reservations.models.member_photo_thumbnail_path, verbose_name='顔写真サムネイル'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0020_memberprofile_photo_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timeslot',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
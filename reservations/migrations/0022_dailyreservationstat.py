@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def populate_daily_stats(apps, schema_editor):
+    """既存の予約・入退室記録から集計を作る（以降は reservations.daily_stats が更新する）。"""
+    Reservation = apps.get_model('reservations', 'Reservation')
+    VisitRecord = apps.get_model('reservations', 'VisitRecord')
+    DailyReservationStat = apps.get_model('reservations', 'DailyReservationStat')
+
+    rows = {}
+    reservation_stats = Reservation.objects.values('date', 'location_id').annotate(
+        reservation_count=Count('id'),
+        confirmed_count=Count('id', filter=Q(status='confirmed')),
+        pending_count=Count('id', filter=Q(status='pending')),
+        cancelled_count=Count('id', filter=Q(status='cancelled')),
+    ).order_by()
+    visit_stats = VisitRecord.objects.values('date', 'location_id').annotate(
+        visit_count=Count('id'),
+        billed_amount=Sum('billed_amount', default=0),
+    ).order_by()
+    for queryset in (reservation_stats, visit_stats):
+        for row in queryset:
+            key = (row.pop('date'), row.pop('location_id'))
+            rows.setdefault(key, {}).update(row)
+    DailyReservationStat.objects.bulk_create(
+        [DailyReservationStat(date=date, location_id=location_id, **values) for (date, location_id), values in rows.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0021_timeslot_updated_at_auto_now'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReservationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('reservation_count', models.PositiveIntegerField(default=0, verbose_name='予約数')),
+                ('confirmed_count', models.PositiveIntegerField(default=0, verbose_name='確認済み')),
+                ('pending_count', models.PositiveIntegerField(default=0, verbose_name='保留中')),
+                ('cancelled_count', models.PositiveIntegerField(default=0, verbose_name='キャンセル')),
+                ('visit_count', models.PositiveIntegerField(default=0, verbose_name='入場数')),
+                ('billed_amount', models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='請求額（円）')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='reservations.location', verbose_name='場所')),
+            ],
+            options={
+                'verbose_name': '日別集計',
+                'verbose_name_plural': '日別集計',
+                'ordering': ['-date', 'location'],
+                'unique_together': {('date', 'location')},
+            },
+        ),
+        migrations.RunPython(populate_daily_stats, migrations.RunPython.noop),
+    ]
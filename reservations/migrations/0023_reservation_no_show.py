@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0022_dailyreservationstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberprofile',
+            name='no_show_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='無断キャンセル数'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='is_no_show',
+            field=models.BooleanField(default=False, editable=False, verbose_name='無断キャンセル'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date', 'status'], name='reservation_date_b616a1_idx'),
+        ),
+    ]
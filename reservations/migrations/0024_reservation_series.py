@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reservations', '0023_reservation_no_show'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval_weeks', models.PositiveSmallIntegerField(choices=[(1, '毎週'), (2, '隔週')], default=1, verbose_name='間隔')),
+                ('start_date', models.DateField(verbose_name='初回')),
+                ('end_date', models.DateField(verbose_name='最終回')),
+                ('customer_name', models.CharField(max_length=100, verbose_name='お客様名')),
+                ('customer_email', models.EmailField(max_length=254, verbose_name='メールアドレス')),
+                ('notes', models.TextField(blank=True, verbose_name='備考')),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True, verbose_name='キャンセル日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '繰り返し予約',
+                'verbose_name_plural': '繰り返し予約',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservation',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('location', 'time_slot', 'date'), name='unique_active_reservation_slot'),
+        ),
+        migrations.AddField(
+            model_name='reservationseries',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='作成者'),
+        ),
+        migrations.AddField(
+            model_name='reservationseries',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reservations.location', verbose_name='場所'),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='reservations.reservationseries', verbose_name='繰り返し予約'),
+        ),
+    ]
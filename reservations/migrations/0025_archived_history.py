@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reservations', '0024_reservation_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedVisitRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='記録ID')),
+                ('date', models.DateField(verbose_name='利用日')),
+                ('reservation_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='紐付け予約ID')),
+                ('entry_at', models.DateTimeField(verbose_name='入場日時')),
+                ('exit_at', models.DateTimeField(blank=True, null=True, verbose_name='退場日時')),
+                ('billed_amount', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True, verbose_name='請求額（円）')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日時')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_visit_records', to='reservations.location', verbose_name='場所')),
+                ('member_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_visit_records', to='reservations.memberprofile', verbose_name='会員')),
+                ('time_slot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reservations.timeslot', verbose_name='時間枠')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みの入退室記録',
+                'verbose_name_plural': 'アーカイブ済みの入退室記録',
+                'ordering': ['-date', '-entry_at'],
+                'indexes': [models.Index(fields=['date', 'location'], name='reservation_date_95501b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReservation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='予約ID')),
+                ('start_time', models.TimeField(verbose_name='開始時刻')),
+                ('end_time', models.TimeField(verbose_name='終了時刻')),
+                ('date', models.DateField(verbose_name='予約日')),
+                ('customer_name', models.CharField(max_length=100, verbose_name='お客様名')),
+                ('customer_email', models.EmailField(max_length=254, verbose_name='メールアドレス')),
+                ('customer_phone', models.CharField(blank=True, default='', max_length=15, verbose_name='電話番号')),
+                ('status', models.CharField(choices=[('confirmed', '確認済み'), ('pending', '保留中'), ('cancelled', 'キャンセル')], max_length=20, verbose_name='ステータス')),
+                ('notes', models.TextField(blank=True, verbose_name='備考')),
+                ('is_no_show', models.BooleanField(default=False, verbose_name='無断キャンセル')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日時')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')),
+                ('booking_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_reservations', to='reservations.bookinggroup', verbose_name='予約グループ')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='作成者')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reservations', to='reservations.location', verbose_name='場所')),
+                ('series', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_reservations', to='reservations.reservationseries', verbose_name='繰り返し予約')),
+                ('time_slot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reservations.timeslot', verbose_name='時間枠')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みの予約',
+                'verbose_name_plural': 'アーカイブ済みの予約',
+                'ordering': ['-date', 'start_time'],
+                'indexes': [models.Index(fields=['date', 'status'], name='reservation_date_62ed1f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0025_archived_history'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='reservation',
+            options={'verbose_name': '予約', 'verbose_name_plural': '予約'},
+        ),
+    ]
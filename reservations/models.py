@@ -1,3 +1,4 @@
+import secrets
 import uuid
 
 from django.db import models
@@ -34,7 +35,7 @@ class TimeSlot(models.Model):
     end_time = models.TimeField(verbose_name='終了時間')
     is_active = models.BooleanField(default=True, verbose_name='有効')
     created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = '時間枠'
@@ -44,6 +45,67 @@ class TimeSlot(models.Model):
     def __str__(self):
         return f"{self.start_time} - {self.end_time}"
 
+class BookingGroup(models.Model):
+    """1 回の申し込み（1 件の決済）でまとめて作成された予約のグループ"""
+    STATUS_CHOICES = [
+        ('pending', '決済待ち'),
+        ('confirmed', '確定'),
+    ]
+
+    customer_email = models.EmailField(blank=True, verbose_name='メールアドレス')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name='合計金額')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='ステータス')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='作成者')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = '予約グループ'
+        verbose_name_plural = '予約グループ'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"予約グループ #{self.id} ({self.get_status_display()})"
+
+
+class ReservationSeries(models.Model):
+    """繰り返し予約（毎週・隔週の同じ場所・時間枠）。各回は Reservation.series で紐付く。"""
+    INTERVAL_CHOICES = [
+        (1, '毎週'),
+        (2, '隔週'),
+    ]
+
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, verbose_name='場所')
+    interval_weeks = models.PositiveSmallIntegerField(choices=INTERVAL_CHOICES, default=1, verbose_name='間隔')
+    start_date = models.DateField(verbose_name='初回')
+    end_date = models.DateField(verbose_name='最終回')
+    customer_name = models.CharField(max_length=100, verbose_name='お客様名')
+    customer_email = models.EmailField(verbose_name='メールアドレス')
+    notes = models.TextField(blank=True, verbose_name='備考')
+    # 今後の回をまとめてキャンセルした日時
+    cancelled_at = models.DateTimeField(null=True, blank=True, verbose_name='キャンセル日時')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='作成者')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = '繰り返し予約'
+        verbose_name_plural = '繰り返し予約'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.customer_name} - {self.location.name} {self.get_interval_weeks_display()} {self.start_date}〜{self.end_date}"
+
+
+class ReservationQuerySet(models.QuerySet):
+    def for_display(self):
+        """
+        画面に並べる順（日付の新しい順、同じ日は開始時刻の順）。
+        時間枠を JOIN して並べ替えるため、一覧を表示するときだけ使う（件数・存在確認・values_list には付けない）。
+        """
+        return self.order_by('-date', 'time_slot__start_time')
+
+
 class Reservation(models.Model):
     """予約"""
     STATUS_CHOICES = [
@@ -74,16 +136,48 @@ class Reservation(models.Model):
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='ステータス')
     notes = models.TextField(blank=True, verbose_name='備考')
+    booking_group = models.ForeignKey(
+        BookingGroup,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservations',
+        verbose_name='予約グループ',
+    )
+    series = models.ForeignKey(
+        ReservationSeries,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservations',
+        verbose_name='繰り返し予約',
+    )
+    # 確認済みなのに来場がなかった予約（manage.py detect_no_shows が毎晩まとめて設定する）
+    is_no_show = models.BooleanField(default=False, editable=False, verbose_name='無断キャンセル')
     
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='作成者')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ReservationQuerySet.as_manager()
+
     class Meta:
         verbose_name = '予約'
         verbose_name_plural = '予約'
-        unique_together = ['location', 'time_slot', 'date']
-        ordering = ['-date', 'time_slot__start_time']
+        # 既定の並び順は付けない（時間枠の JOIN と ORDER BY がすべてのクエリに付くため）。
+        # 表示する一覧は for_display() か order_by() で明示的に並べる
+        constraints = [
+            # 同じ枠の予約は 1 件まで。キャンセル済みの予約は枠を塞がない（空き状況・重複チェックと同じ扱い）
+            models.UniqueConstraint(
+                fields=['location', 'time_slot', 'date'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_active_reservation_slot',
+            ),
+        ]
+        indexes = [
+            # 日付範囲での集計・無断キャンセルの判定用
+            models.Index(fields=['date', 'status']),
+        ]
 
     def __str__(self):
         return f"{self.customer_name} - {self.location.name} - {self.date} {self.time_slot}"
@@ -118,6 +212,11 @@ def member_photo_upload_path(instance, filename):
     return f'member_photos/{instance.user.id}/{filename}'
 
 
+def member_photo_thumbnail_path(instance, filename):
+    """会員の顔写真（一覧用サムネイル）のアップロードパス"""
+    return f'member_photos/{instance.user.id}/thumbs/{filename}'
+
+
 class MemberProfile(models.Model):
     """会員プロフィール"""
     GENDER_CHOICES = [
@@ -151,9 +250,16 @@ class MemberProfile(models.Model):
     
     # 特別ユーザーフラグ（3ヶ月先まで予約可能）
     is_special_user = models.BooleanField(default=False, verbose_name='特別ユーザー')
+
+    # 直近 NO_SHOW_WINDOW_DAYS 日の無断キャンセル数（manage.py detect_no_shows が更新する）
+    no_show_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='無断キャンセル数')
     
     # 顔写真
     photo = models.ImageField(upload_to=member_photo_upload_path, blank=True, null=True, verbose_name='顔写真')
+    # 縮小・再エンコード後に photo_processing が作成する（一覧表示用）
+    photo_thumbnail = models.ImageField(
+        upload_to=member_photo_thumbnail_path, blank=True, null=True, editable=False, verbose_name='顔写真サムネイル',
+    )
 
     # 会員QRコード（施設確認等）。プロフィール1件につき1つの不変トークン。
     member_qr_token = models.UUIDField(
@@ -190,12 +296,20 @@ class PaymentTransaction(models.Model):
     ]
 
     reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, null=True, blank=True, verbose_name='予約')
+    booking_group = models.ForeignKey(
+        BookingGroup,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payments',
+        verbose_name='予約グループ',
+    )
     member_profile = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, null=True, blank=True, verbose_name='会員')
     
     # Square決済情報
     square_payment_id = models.CharField(max_length=255, unique=True, null=True, blank=True, verbose_name='Square決済ID')
-    square_order_id = models.CharField(max_length=255, null=True, blank=True, verbose_name='Square注文ID')
-    payment_link_id = models.CharField(max_length=255, null=True, blank=True, verbose_name='決済リンクID')
+    square_order_id = models.CharField(max_length=255, null=True, blank=True, db_index=True, verbose_name='Square注文ID')
+    payment_link_id = models.CharField(max_length=255, null=True, blank=True, db_index=True, verbose_name='決済リンクID')
     payment_link_url = models.URLField(null=True, blank=True, verbose_name='決済リンクURL')
     
     # 決済情報
@@ -265,3 +379,227 @@ class VisitRecord(models.Model):
 
     def __str__(self):
         return f'{self.member_profile.full_name} {self.date} {self.location.name}'
+
+
+class ArchivedReservation(models.Model):
+    """
+    アーカイブ済みの予約（閲覧のみ）。manage.py archive_history が古い予約を Reservation から移す。
+    ID は元の予約の ID のまま。時間枠の時刻は移した時点の値を持つ（時間枠を変更・削除しても履歴は変わらない）。
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name='予約ID')
+    location = models.ForeignKey(
+        Location, on_delete=models.CASCADE, related_name='archived_reservations', verbose_name='場所',
+    )
+    time_slot = models.ForeignKey(
+        TimeSlot, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='時間枠',
+    )
+    start_time = models.TimeField(verbose_name='開始時刻')
+    end_time = models.TimeField(verbose_name='終了時刻')
+    date = models.DateField(verbose_name='予約日')
+    customer_name = models.CharField(max_length=100, verbose_name='お客様名')
+    customer_email = models.EmailField(verbose_name='メールアドレス')
+    customer_phone = models.CharField(max_length=15, blank=True, default='', verbose_name='電話番号')
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES, verbose_name='ステータス')
+    notes = models.TextField(blank=True, verbose_name='備考')
+    booking_group = models.ForeignKey(
+        BookingGroup, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_reservations',
+        verbose_name='予約グループ',
+    )
+    series = models.ForeignKey(
+        ReservationSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_reservations',
+        verbose_name='繰り返し予約',
+    )
+    is_no_show = models.BooleanField(default=False, verbose_name='無断キャンセル')
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='作成者',
+    )
+    created_at = models.DateTimeField(verbose_name='作成日時')
+    updated_at = models.DateTimeField(verbose_name='更新日時')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')
+
+    class Meta:
+        verbose_name = 'アーカイブ済みの予約'
+        verbose_name_plural = 'アーカイブ済みの予約'
+        ordering = ['-date', 'start_time']
+        indexes = [
+            models.Index(fields=['date', 'status']),
+        ]
+
+    def __str__(self):
+        return f'{self.customer_name} - {self.date} {self.start_time:%H:%M}'
+
+
+class ArchivedVisitRecord(models.Model):
+    """アーカイブ済みの入退室記録（閲覧のみ）。ID は元の入退室記録の ID のまま。"""
+    id = models.BigIntegerField(primary_key=True, verbose_name='記録ID')
+    member_profile = models.ForeignKey(
+        MemberProfile, on_delete=models.CASCADE, related_name='archived_visit_records', verbose_name='会員',
+    )
+    location = models.ForeignKey(
+        Location, on_delete=models.CASCADE, related_name='archived_visit_records', verbose_name='場所',
+    )
+    time_slot = models.ForeignKey(
+        TimeSlot, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='時間枠',
+    )
+    date = models.DateField(verbose_name='利用日')
+    # 紐付け予約の ID（Reservation か ArchivedReservation のどちらかにある）
+    reservation_id = models.BigIntegerField(null=True, blank=True, db_index=True, verbose_name='紐付け予約ID')
+    entry_at = models.DateTimeField(verbose_name='入場日時')
+    exit_at = models.DateTimeField(null=True, blank=True, verbose_name='退場日時')
+    billed_amount = models.DecimalField(
+        max_digits=10, decimal_places=0, null=True, blank=True, verbose_name='請求額（円）',
+    )
+    created_at = models.DateTimeField(verbose_name='作成日時')
+    updated_at = models.DateTimeField(verbose_name='更新日時')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')
+
+    class Meta:
+        verbose_name = 'アーカイブ済みの入退室記録'
+        verbose_name_plural = 'アーカイブ済みの入退室記録'
+        ordering = ['-date', '-entry_at']
+        indexes = [
+            models.Index(fields=['date', 'location']),
+        ]
+
+    def __str__(self):
+        return f'{self.member_profile_id} {self.date} {self.location_id}'
+
+
+class DailyReservationStat(models.Model):
+    """
+    日別・場所別の予約数・入退室数・請求額の集計（ダッシュボード用）。
+    予約・入退室記録の保存・削除時に reservations.daily_stats が該当する日・場所の行を再計算する。
+    manage.py rebuild_daily_stats で元データから作り直せる。
+    """
+    date = models.DateField(verbose_name='日付')
+    location = models.ForeignKey(
+        Location, on_delete=models.CASCADE, related_name='daily_stats', verbose_name='場所',
+    )
+    reservation_count = models.PositiveIntegerField(default=0, verbose_name='予約数')
+    confirmed_count = models.PositiveIntegerField(default=0, verbose_name='確認済み')
+    pending_count = models.PositiveIntegerField(default=0, verbose_name='保留中')
+    cancelled_count = models.PositiveIntegerField(default=0, verbose_name='キャンセル')
+    visit_count = models.PositiveIntegerField(default=0, verbose_name='入場数')
+    billed_amount = models.DecimalField(max_digits=12, decimal_places=0, default=0, verbose_name='請求額（円）')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = '日別集計'
+        verbose_name_plural = '日別集計'
+        unique_together = ['date', 'location']
+        ordering = ['-date', 'location']
+
+    def __str__(self):
+        return f'{self.date} {self.location_id} 予約{self.reservation_count}件'
+
+
+class BackgroundJob(models.Model):
+    """バックグラウンドジョブ（DB をキューとして使い、manage.py run_worker が処理する）"""
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '実行中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name='タスク名')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='引数')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='ステータス')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='試行回数')
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name='最大試行回数')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='実行予定日時')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='取得日時')
+    last_error = models.TextField(blank=True, verbose_name='最終エラー')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'バックグラウンドジョブ'
+        verbose_name_plural = 'バックグラウンドジョブ'
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.id} ({self.get_status_display()})'
+
+
+class RegistrationNotice(models.Model):
+    """管理者向け会員登録通知の送信待ち（ダイジェスト送信でまとめて送る）"""
+    member_profile = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, verbose_name='会員')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = '会員登録通知（送信待ち）'
+        verbose_name_plural = '会員登録通知（送信待ち）'
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f'{self.member_profile.full_name} ({self.created_at})'
+
+
+class SquareWebhookEvent(models.Model):
+    """Square Webhook の受信イベント（受信時は保存のみ。処理は run_worker が行う）"""
+    STATUS_CHOICES = [
+        ('pending', '未処理'),
+        ('processed', '処理済み'),
+        ('ignored', '対象外'),
+        ('failed', '失敗'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True, verbose_name='イベントID')
+    event_type = models.CharField(max_length=100, blank=True, verbose_name='イベント種別')
+    payload = models.JSONField(default=dict, verbose_name='受信内容')
+    event_created_at = models.DateTimeField(null=True, blank=True, verbose_name='イベント発生日時')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='ステータス')
+    error = models.TextField(blank=True, verbose_name='エラー')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='受信日時')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='処理日時')
+
+    class Meta:
+        verbose_name = 'Square Webhook イベント'
+        verbose_name_plural = 'Square Webhook イベント'
+        ordering = ['event_created_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'event_created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} {self.event_id} ({self.get_status_display()})'
+
+
+def _booking_draft_token():
+    return secrets.token_urlsafe(9)
+
+
+class BookingDraft(models.Model):
+    """
+    予約手続き中の入力内容（予約作成 → 確認 → 決済）。セッションにはトークンだけを保存する。
+    決済待ちになったものは payment_transaction に紐づき、決済完了時（Webhook またはリダイレクト）に予約を作成する。
+    """
+    token = models.CharField(max_length=16, unique=True, default=_booking_draft_token, verbose_name='トークン')
+    data = models.JSONField(default=dict, verbose_name='入力内容')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, verbose_name='ユーザー')
+    payment_transaction = models.OneToOneField(
+        PaymentTransaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='booking_draft',
+        verbose_name='決済トランザクション',
+    )
+    expires_at = models.DateTimeField(verbose_name='有効期限')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = '予約手続き中データ'
+        verbose_name_plural = '予約手続き中データ'
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f'予約手続き {self.token}'
+
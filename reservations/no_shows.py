@@ -0,0 +1,106 @@
+"""
+無断キャンセル（確認済みなのに来場がなかった予約）の判定。
+
+入退室記録は入場時に pick_reservation_for_entry が選んだ予約にしか紐付かないため、
+同じ日・同じ場所にその会員の入退室記録があれば来場したものとみなす（会員は予約の作成者かメールアドレスで照合）。
+メールアドレスは大文字・小文字を区別しない（update_member_counts の割り当てと同じ）。
+判定は日付範囲ごとに UPDATE 2 回（NOT EXISTS の相関サブクエリ）で行い、予約を Python に読み込まない。
+毎晩 run_worker が直近の数日分を判定し直す（後から入退室記録が修正された場合にも追従する）。
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import ArchivedReservation, ArchivedVisitRecord, MemberProfile, Reservation, VisitRecord
+
+# detect() で 1 回の UPDATE が対象にする日数
+DETECT_BATCH_DAYS = 31
+
+
+def no_show_filter():
+    """
+    来場がなかった予約の条件（Reservation の QuerySet に filter() で使う）。
+    アーカイブ済みの入退室記録も見る（決済から参照されている予約は、入退室記録だけがアーカイブされることがある）。
+    """
+    condition = Q()
+    for model in (VisitRecord, ArchivedVisitRecord):
+        linked = model.objects.filter(reservation_id=OuterRef('pk'))
+        # iexact は LIKE になり、メールアドレスの _ がワイルドカードとして扱われるため Lower() 同士で比べる
+        same_day = model.objects.annotate(member_email=Lower('member_profile__user__email')).filter(
+            Q(member_profile__user=OuterRef('created_by')) | Q(member_email=Lower(OuterRef('customer_email'))),
+            location=OuterRef('location'),
+            date=OuterRef('date'),
+        )
+        condition &= ~Exists(linked) & ~Exists(same_day)
+    return condition
+
+
+def detect(start_date, end_date, *, batch_days=DETECT_BATCH_DAYS):
+    """
+    期間内の予約の is_no_show を設定し直す。(設定した件数, 解除した件数) を返す。
+    確認済み以外の予約（後からキャンセルされたものなど）は解除する。
+    """
+    flagged = cleared = 0
+    batch_start = start_date
+    while batch_start <= end_date:
+        batch_end = min(batch_start + timedelta(days=batch_days - 1), end_date)
+        reservations = Reservation.objects.filter(date__gte=batch_start, date__lte=batch_end)
+        with transaction.atomic():
+            flagged += reservations.filter(no_show_filter(), status='confirmed', is_no_show=False).update(
+                is_no_show=True,
+            )
+            cleared += reservations.filter(is_no_show=True).exclude(
+                Q(no_show_filter(), status='confirmed'),
+            ).update(is_no_show=False)
+        batch_start = batch_end + timedelta(days=1)
+    return flagged, cleared
+
+
+def window_start(today=None):
+    today = today or timezone.localdate()
+    return today - timedelta(days=getattr(settings, 'NO_SHOW_WINDOW_DAYS', 180))
+
+
+def update_member_counts(today=None):
+    """
+    会員ごとの直近 NO_SHOW_WINDOW_DAYS 日の無断キャンセル数（MemberProfile.no_show_count）を更新する。
+    予約はメールアドレスの会員、該当がなければ作成者に割り当てる（管理者が代わりに予約した場合も本人に数える）。
+    期間内にアーカイブ済みの予約があれば、それも数える。
+    変わった会員の数を返す。
+    """
+    profiles = {
+        user_id: (pk, (email or '').lower(), count)
+        for pk, user_id, email, count in MemberProfile.objects.values_list('pk', 'user_id', 'user__email', 'no_show_count')
+    }
+    by_email = {email: user_id for user_id, (_, email, _) in profiles.items() if email}
+
+    counts = Counter()
+    for model in (Reservation, ArchivedReservation):
+        for created_by_id, customer_email in model.objects.filter(
+            is_no_show=True, date__gte=window_start(today),
+        ).values_list('created_by_id', 'customer_email').iterator():
+            user_id = by_email.get((customer_email or '').lower(), created_by_id)
+            if user_id in profiles:
+                counts[user_id] += 1
+
+    changed = [
+        MemberProfile(pk=pk, no_show_count=counts[user_id])
+        for user_id, (pk, _, current) in profiles.items()
+        if counts[user_id] != current
+    ]
+    MemberProfile.objects.bulk_update(changed, ['no_show_count'], batch_size=500)
+    return len(changed)
+
+
+def run_nightly(today=None, *, lookback_days=3):
+    """昨日までの lookback_days 日分を判定し直し、会員ごとの件数を更新する。"""
+    today = today or timezone.localdate()
+    yesterday = today - timedelta(days=1)
+    result = detect(yesterday - timedelta(days=lookback_days - 1), yesterday)
+    update_member_counts(today)
+    return result
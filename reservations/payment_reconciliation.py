@@ -0,0 +1,109 @@
+"""
+Square の決済一覧と PaymentTransaction の突き合わせ（manage.py reconcile_payments）。
+
+Webhook の取りこぼしを補うため、Square の list_payments をページ単位で取得し、
+ページごとに 1 クエリで対応するトランザクションを引いて bulk_update でまとめて反映する。
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import square_client
+from .models import PaymentTransaction
+from .square_events import (
+    PAYMENT_STATUS_MAP, TransactionIndex, complete_bookings, is_newer_payment, payment_sequence,
+)
+
+UPDATE_FIELDS = ['square_payment_id', 'status', 'metadata', 'updated_at']
+
+
+@dataclass
+class ReconcileResult:
+    pages: int = 0
+    payments: int = 0
+    updated: int = 0
+    unmatched: int = 0
+    confirmed_reservations: int = 0
+
+
+class SquareListError(RuntimeError):
+    """list_payments がエラーを返した。"""
+
+
+def iter_payment_pages(*, begin_time=None, end_time=None, location_id=None, page_size=100):
+    """Square の決済一覧をページ（payment の dict のリスト）ごとに返す。"""
+    cursor = None
+    while True:
+        result = square_client.call(
+            'payments.list_payments',
+            idempotent=True,
+            begin_time=begin_time,
+            end_time=end_time,
+            location_id=location_id or None,
+            sort_order='ASC',
+            cursor=cursor,
+            limit=page_size,
+        )
+        if not result.is_success():
+            raise SquareListError(f'Square の決済一覧を取得できませんでした（HTTP {result.status_code}）: {result.errors}')
+        body = result.body or {}
+        yield body.get('payments') or []
+        cursor = body.get('cursor')
+        if not cursor:
+            return
+
+
+def reconcile_page(payments, *, dry_run=False):
+    """1 ページ分の決済を反映する。戻り値は (更新件数, 未対応件数, 確定した予約数)。"""
+    index = TransactionIndex(payments)
+    changed = {}
+    unmatched = 0
+    completed = []
+    now = timezone.now()
+
+    for payment in payments:
+        tx = index.find(payment.get('order_id'), payment.get('id'))
+        if tx is None:
+            unmatched += 1
+            continue
+        status = PAYMENT_STATUS_MAP.get(payment.get('status'), 'pending')
+        sequence = payment_sequence(payment)
+        if not is_newer_payment(tx, status, sequence):
+            continue
+        payment_id = payment.get('id') or tx.square_payment_id
+        if (tx.status, tx.square_payment_id) == (status, payment_id) \
+                and tx.metadata.get('square_payment_sequence') == sequence:
+            continue
+        tx.square_payment_id = payment_id
+        tx.status = status
+        tx.metadata = {**tx.metadata, 'square_payment_sequence': sequence}
+        tx.updated_at = now
+        changed[tx.pk] = tx
+        if status == 'completed':
+            completed.append(tx)
+
+    if dry_run:
+        return len(changed), unmatched, 0
+
+    confirmed = 0
+    with transaction.atomic():
+        if changed:
+            PaymentTransaction.objects.bulk_update(changed.values(), UPDATE_FIELDS, batch_size=500)
+        if completed:
+            confirmed = complete_bookings(completed)
+    return len(changed), unmatched, confirmed
+
+
+def reconcile_payments(*, begin_time=None, end_time=None, location_id=None, page_size=100, dry_run=False):
+    result = ReconcileResult()
+    for payments in iter_payment_pages(
+        begin_time=begin_time, end_time=end_time, location_id=location_id, page_size=page_size,
+    ):
+        updated, unmatched, confirmed = reconcile_page(payments, dry_run=dry_run)
+        result.pages += 1
+        result.payments += len(payments)
+        result.updated += updated
+        result.unmatched += unmatched
+        result.confirmed_reservations += confirmed
+    return result
@@ -0,0 +1,138 @@
+"""
+会員の顔写真の縮小・再エンコードとサムネイル作成（Pillow）。
+
+写真が変わるとジョブ（member_photos.process）を登録し、リクエストの外で処理する。
+- 元画像は向き（EXIF）を補正し、長辺 MEMBER_PHOTO_MAX_DIMENSION px 以下の JPEG にする
+  （既に条件を満たす JPEG はそのまま使う）
+- 一覧表示用に MEMBER_PHOTO_THUMBNAIL_SIZE px 四方のサムネイルを作る
+画像処理（process_image）は DB やストレージに触れないため、backfill_member_photos ではプロセスプールで並列に実行する。
+"""
+import io
+import logging
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .jobs import enqueue, job_handler
+from .models import MemberProfile, member_photo_thumbnail_path
+
+logger = logging.getLogger(__name__)
+
+PROCESS_TASK = 'member_photos.process'
+# EXIF の Orientation タグ
+_ORIENTATION = 0x0112
+
+
+@dataclass(frozen=True)
+class PhotoOptions:
+    max_dimension: int = 1024
+    thumbnail_size: int = 160
+    quality: int = 85
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_dimension=getattr(settings, 'MEMBER_PHOTO_MAX_DIMENSION', cls.max_dimension),
+            thumbnail_size=getattr(settings, 'MEMBER_PHOTO_THUMBNAIL_SIZE', cls.thumbnail_size),
+            quality=getattr(settings, 'MEMBER_PHOTO_JPEG_QUALITY', cls.quality),
+        )
+
+
+def _encode_jpeg(image, quality):
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def process_image(data, options=PhotoOptions()):
+    """
+    画像のバイト列から (縮小後の JPEG, サムネイルの JPEG) を作る。
+    元画像をそのまま使える場合、1 つ目は None。画像として読めなければ ValueError。
+    """
+    # Pillow はワーカーで写真を処理するときだけ読み込む（ジョブのハンドラ登録時には読み込まない）
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f'画像を読み込めません: {e}') from e
+
+    keep_original = (
+        image.format == 'JPEG'
+        and max(image.size) <= options.max_dimension
+        and image.getexif().get(_ORIENTATION, 1) == 1
+    )
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    normalized = None
+    if not keep_original:
+        image.thumbnail((options.max_dimension, options.max_dimension), Image.LANCZOS)
+        normalized = _encode_jpeg(image, options.quality)
+
+    size = (options.thumbnail_size, options.thumbnail_size)
+    thumbnail = ImageOps.fit(image, size, Image.LANCZOS, centering=(0.5, 0.4))
+    return normalized, _encode_jpeg(thumbnail, options.quality)
+
+
+def read_photo(profile):
+    with profile.photo.open('rb') as f:
+        return f.read()
+
+
+def apply_result(profile, normalized, thumbnail):
+    """
+    process_image の結果を保存する。処理中に写真が差し替えられていたら保存せず False を返す。
+    シグナルで再処理されないよう、モデルの更新は QuerySet.update() で行う。
+    """
+    storage = profile.photo.storage
+    original_name = profile.photo.name
+    old_thumbnail = profile.photo_thumbnail.name
+
+    photo_name = original_name
+    if normalized is not None:
+        photo_name = storage.save(
+            profile.photo.field.generate_filename(profile, 'photo.jpg'), ContentFile(normalized),
+        )
+    thumbnail_name = storage.save(member_photo_thumbnail_path(profile, 'photo.jpg'), ContentFile(thumbnail))
+
+    updated = MemberProfile.objects.filter(pk=profile.pk, photo=original_name).update(
+        photo=photo_name, photo_thumbnail=thumbnail_name,
+    )
+    if not updated:
+        for name in {photo_name, thumbnail_name} - {original_name}:
+            storage.delete(name)
+        return False
+
+    for name in (original_name if photo_name != original_name else None, old_thumbnail):
+        if name:
+            storage.delete(name)
+    profile.photo.name = photo_name
+    profile.photo_thumbnail.name = thumbnail_name
+    return True
+
+
+def process_profile_photo(profile, options=None):
+    """1 件の会員の写真を処理する（写真がない・読めない場合は False）。"""
+    if not profile.photo:
+        return False
+    try:
+        normalized, thumbnail = process_image(read_photo(profile), options or PhotoOptions.from_settings())
+    except (ValueError, FileNotFoundError) as e:
+        logger.warning('会員 %s の顔写真を処理できませんでした: %s', profile.pk, e)
+        return False
+    return apply_result(profile, normalized, thumbnail)
+
+
+def enqueue_photo_processing(profile):
+    return enqueue(PROCESS_TASK, {'profile_id': profile.pk})
+
+
+@job_handler(PROCESS_TASK)
+def process_photo_job(payload):
+    profile = MemberProfile.objects.select_related('user').filter(pk=payload['profile_id']).first()
+    if profile is not None:
+        process_profile_photo(profile)
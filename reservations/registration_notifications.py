@@ -1,18 +1,44 @@
-"""会員登録完了時のメール（会員本人・管理者）。"""
+"""会員登録完了時のメール（会員本人・管理者）。送信自体は mailer のキュー経由で run_worker が行う。"""
+import logging
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.cache import caches
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .email_rendering import render_email
+from .jobs import enqueue_once, job_handler
+from .mailer import open_connection, queue_mail
+from .models import RegistrationNotice
+
+logger = logging.getLogger(__name__)
+
+RECIPIENTS_CACHE_KEY = 'registration_notify_recipients'
+# default（LocMem）はワーカーごとのため、破棄が全ワーカーに届くよう共有のキャッシュに置く
+RECIPIENTS_CACHE_ALIAS = 'shared'
+ADMIN_DIGEST_TASK = 'mail.registration_admin_digest'
 
 
 def registration_notify_recipients():
     """
     管理者向け通知の宛先。
     REGISTRATION_NOTIFY_EMAILS が空でなければその一覧、空なら is_superuser かつメールありのユーザー。
+    後者はキャッシュし、スーパーユーザーのメール等が変わったら signals で破棄する。
     """
     configured = getattr(settings, 'REGISTRATION_NOTIFY_EMAILS', None) or []
     if configured:
         return list(configured)
+    return caches[RECIPIENTS_CACHE_ALIAS].get_or_set(
+        RECIPIENTS_CACHE_KEY,
+        _superuser_recipients,
+        getattr(settings, 'REGISTRATION_NOTIFY_RECIPIENTS_CACHE_SECONDS', 600),
+    )
+
+
+def _superuser_recipients():
     return list(
         User.objects.filter(is_superuser=True, is_active=True)
         .exclude(email__in=('', None))
@@ -21,43 +47,99 @@ def registration_notify_recipients():
     )
 
 
+def invalidate_notify_recipients():
+    caches[RECIPIENTS_CACHE_ALIAS].delete(RECIPIENTS_CACHE_KEY)
+
+
+def admin_digest_enabled():
+    return bool(
+        getattr(settings, 'REGISTRATION_NOTIFY_DIGEST_MINUTES', 0)
+        or getattr(settings, 'REGISTRATION_NOTIFY_DIGEST_SIZE', 0)
+    )
+
+
 def send_registration_mails(request, user, profile, *, send_user_mail=True, send_admin_mail=True):
     """
-    会員登録完了メールを会員本人と（設定に応じて）管理者へ送る。
-    送信失敗時も例外は握りつぶし、登録処理自体は継続できるようにする。
+    会員登録完了メールを会員本人と（設定に応じて）管理者へ送る（送信キューに登録するだけ）。
+    ダイジェスト設定時、管理者向けは RegistrationNotice に溜めて一定件数・一定時間ごとにまとめて送る。
+    登録失敗時も例外は握りつぶし、登録処理自体は継続できるようにする。
     """
     site_url = request.build_absolute_uri('/')
     ctx = {'user': user, 'profile': profile, 'site_url': site_url}
 
     if send_user_mail:
         try:
-            subject = '会員登録が完了しました'
-            html = render_to_string('reservations/emails/registration_complete.html', ctx)
-            send_mail(
-                subject,
-                '',
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                html_message=html,
-                fail_silently=False,
-            )
-        except Exception as e:
-            print(f'会員向け登録完了メール送信エラー: {e}')
+            mail = render_email('registration_complete', ctx)
+            queue_mail(mail.subject, [user.email], html=mail.html, body=mail.text)
+        except Exception:
+            logger.exception('会員向け登録完了メールのキュー登録に失敗しました (user_id=%s)', user.pk)
 
     if send_admin_mail:
+        if admin_digest_enabled():
+            try:
+                add_registration_notice(profile, site_url=site_url)
+            except Exception:
+                logger.exception('管理者向け会員登録通知の登録に失敗しました (user_id=%s)', user.pk)
+            return
+
         recipients = registration_notify_recipients()
         if not recipients:
             return
         try:
-            subject = '[会員登録] 新規会員が登録されました'
-            html = render_to_string('reservations/emails/registration_admin_notice.html', ctx)
-            send_mail(
-                subject,
-                '',
+            mail = render_email('registration_admin_notice', ctx)
+            queue_mail(mail.subject, recipients, html=mail.html, body=mail.text)
+        except Exception:
+            logger.exception('管理者向け会員登録通知メールのキュー登録に失敗しました (user_id=%s)', user.pk)
+
+
+def add_registration_notice(profile, *, site_url=''):
+    """
+    管理者向け通知を送信待ちに追加し、ダイジェスト送信ジョブを予約する。
+    REGISTRATION_NOTIFY_DIGEST_SIZE 件溜まったら即時、そうでなければ最初の通知から
+    REGISTRATION_NOTIFY_DIGEST_MINUTES 分後に送る。
+    """
+    RegistrationNotice.objects.create(member_profile=profile)
+    size = getattr(settings, 'REGISTRATION_NOTIFY_DIGEST_SIZE', 0)
+    minutes = getattr(settings, 'REGISTRATION_NOTIFY_DIGEST_MINUTES', 0)
+
+    now = timezone.now()
+    if size and RegistrationNotice.objects.count() >= size:
+        run_after = now
+    elif minutes:
+        oldest = RegistrationNotice.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        run_after = (oldest or now) + timedelta(minutes=minutes)
+    else:
+        # 件数のみ指定で未達の場合は、次の登録を待つ
+        return
+    enqueue_once(ADMIN_DIGEST_TASK, {'site_url': site_url}, run_after=run_after)
+
+
+@job_handler(ADMIN_DIGEST_TASK, batch_context=open_connection)
+def send_registration_admin_digest(payload, connection):
+    """送信待ちの管理者向け通知を 1 通のダイジェストにまとめ、共有の SMTP 接続で送る。"""
+    with transaction.atomic():
+        qs = RegistrationNotice.objects.select_related('member_profile__user', 'member_profile__plan')
+        if db_connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True, of=('self',))
+        notices = list(qs)
+        if not notices:
+            return
+
+        recipients = registration_notify_recipients()
+        if recipients:
+            profiles = [n.member_profile for n in notices]
+            mail = render_email('registration_admin_digest', {
+                'profiles': profiles,
+                'site_url': payload.get('site_url', ''),
+            })
+            message = EmailMultiAlternatives(
+                mail.subject,
+                mail.text,
                 settings.DEFAULT_FROM_EMAIL,
                 recipients,
-                html_message=html,
-                fail_silently=False,
+                connection=connection,
             )
-        except Exception as e:
-            print(f'管理者向け会員登録通知メール送信エラー: {e}')
+            message.attach_alternative(mail.html, 'text/html')
+            connection.send_messages([message])
+
+        RegistrationNotice.objects.filter(id__in=[n.id for n in notices]).delete()
@@ -0,0 +1,108 @@
+"""
+繰り返し予約（ReservationSeries）の展開・作成・一括変更。
+
+各回の日付はサーバー側で展開し、空きの確認は全回分をまとめて 1 回のクエリで行う。
+予約は bulk_create でまとめて作成し、今後の回の変更・キャンセルも UPDATE 1 回で行う
+（bulk_create / update() ではシグナルが出ないため、日別集計はここで更新する）。
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import daily_stats
+from .models import Reservation, ReservationSeries
+
+ACTIVE_STATUSES = ['confirmed', 'pending']
+# 1 つの繰り返し予約で作成する回数の上限（毎週で約 1 年）
+MAX_OCCURRENCES = 52
+
+
+def occurrence_dates(start_date, interval_weeks, *, count=None, until=None):
+    """初回から interval_weeks 週ごとの日付。count 回か until（含む）までで、MAX_OCCURRENCES 回を超えない。"""
+    dates = []
+    current = start_date
+    step = timedelta(weeks=interval_weeks)
+    while len(dates) < min(count or MAX_OCCURRENCES, MAX_OCCURRENCES) and (until is None or current <= until):
+        dates.append(current)
+        current += step
+    return dates
+
+
+def taken_slots(location_id, slots_by_date):
+    """
+    slots_by_date（{日付: [時間枠ID]}）のうち、すでに予約されている (日付, 時間枠ID) の集合。
+    全日付分を 1 回のクエリで調べる（日付・時間枠の IN で絞り、組み合わせは Python 側で照合）。
+    """
+    if not slots_by_date:
+        return set()
+    time_slot_ids = {time_slot_id for ids in slots_by_date.values() for time_slot_id in ids}
+    wanted = {(day, time_slot_id) for day, ids in slots_by_date.items() for time_slot_id in ids}
+    return wanted & set(
+        Reservation.objects.filter(
+            location_id=location_id,
+            date__in=list(slots_by_date),
+            time_slot_id__in=time_slot_ids,
+            status__in=ACTIVE_STATUSES,
+        ).values_list('date', 'time_slot_id')
+    )
+
+
+def create_reservations(location, slots_by_date, *, status, customer_name, customer_email, customer_phone='',
+                        notes='', booking_group=None, series=None, created_by=None):
+    """
+    slots_by_date（{日付: [時間枠ID]}）の予約をまとめて作成し、作成した予約のリストを返す。
+    すでに予約されている枠は作成しない。
+    """
+    taken = taken_slots(location.pk, slots_by_date)
+    reservations = [
+        Reservation(
+            location=location,
+            time_slot_id=time_slot_id,
+            date=day,
+            customer_name=customer_name,
+            customer_email=customer_email,
+            customer_phone=customer_phone or '',
+            notes=notes,
+            status=status,
+            booking_group=booking_group,
+            series=series,
+            created_by=created_by,
+        )
+        for day, time_slot_ids in sorted(slots_by_date.items())
+        for time_slot_id in time_slot_ids
+        if (day, time_slot_id) not in taken
+    ]
+    if not reservations:
+        return []
+    with transaction.atomic():
+        Reservation.objects.bulk_create(reservations)
+        daily_stats.refresh_on_commit({(r.date, r.location_id) for r in reservations})
+    return reservations
+
+
+def upcoming(series, today=None):
+    """今日以降の、キャンセルされていない回。"""
+    today = today or timezone.localdate()
+    return series.reservations.filter(date__gte=today, status__in=ACTIVE_STATUSES)
+
+
+def update_upcoming(series, *, customer_name, notes, today=None):
+    """今日以降の回のお客様名・備考を変更する（UPDATE 1 回）。変更した予約の件数を返す。"""
+    with transaction.atomic():
+        series.customer_name = customer_name
+        series.notes = notes
+        series.save(update_fields=['customer_name', 'notes', 'updated_at'])
+        return upcoming(series, today).update(customer_name=customer_name, notes=notes, updated_at=timezone.now())
+
+
+def cancel_upcoming(series, today=None):
+    """今日以降の回をキャンセルする（UPDATE 1 回）。キャンセルした予約の件数を返す。"""
+    today = today or timezone.localdate()
+    now = timezone.now()
+    with transaction.atomic():
+        count = upcoming(series, today).update(status='cancelled', updated_at=now)
+        ReservationSeries.objects.filter(pk=series.pk).update(cancelled_at=now, updated_at=now)
+        daily_stats.refresh_matching_on_commit(series.reservations.filter(date__gte=today))
+    series.cancelled_at = now
+    return count
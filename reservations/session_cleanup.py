@@ -0,0 +1,38 @@
+"""
+期限切れセッションの削除（manage.py prune_sessions / バックグラウンドワーカー）。
+
+clearsessions は 1 回の DELETE で全件を消すため、セッションテーブルが大きいと
+長時間ロックを持ち続ける。ここでは session_key を小分けに取得して少しずつ削除する。
+"""
+import time
+
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def prune_expired_sessions(*, batch_size=DEFAULT_BATCH_SIZE, max_batches=None, pause=0.0):
+    """
+    期限切れのセッションを batch_size 件ずつ削除し、削除件数を返す。
+    max_batches を指定すると、その回数で打ち切る（残りは次回に削除する）。
+    """
+    now = timezone.now()
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            break
+        with transaction.atomic():
+            deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+        batches += 1
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
@@ -0,0 +1,83 @@
+"""モデル変更時のキャッシュ破棄など。ReservationsConfig.ready() で読み込む。"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import daily_stats
+from .models import MemberProfile, Reservation, VisitRecord
+from .registration_notifications import invalidate_notify_recipients
+
+# 管理者通知の宛先に影響する User のフィールド
+_NOTIFY_RECIPIENT_FIELDS = {'email', 'is_superuser', 'is_active'}
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # ログイン時の last_login 更新などでは破棄しない
+    if update_fields is not None and not (set(update_fields) & _NOTIFY_RECIPIENT_FIELDS):
+        return
+    if created and not instance.is_superuser:
+        return
+    invalidate_notify_recipients()
+
+
+@receiver(post_delete, sender=User)
+def _user_deleted(sender, instance, **kwargs):
+    if instance.is_superuser:
+        invalidate_notify_recipients()
+
+
+def _photo_name(profile):
+    # 遅延読み込み（only/defer）のフィールドに触れて余計なクエリを出さないよう __dict__ から読む
+    value = profile.__dict__.get('photo')
+    return getattr(value, 'name', value)
+
+
+@receiver(post_init, sender=MemberProfile)
+def _member_profile_loaded(sender, instance, **kwargs):
+    instance._loaded_photo_name = _photo_name(instance)
+
+
+@receiver(post_save, sender=MemberProfile)
+def _member_profile_saved(sender, instance, update_fields=None, **kwargs):
+    # 写真が変わったら縮小・サムネイル作成をバックグラウンドで行う
+    if update_fields is not None and 'photo' not in update_fields:
+        return
+    photo_name = _photo_name(instance)
+    if photo_name == instance._loaded_photo_name:
+        return
+    instance._loaded_photo_name = photo_name
+    if photo_name:
+        from .photo_processing import enqueue_photo_processing
+
+        enqueue_photo_processing(instance)
+    elif instance.photo_thumbnail:
+        # 写真を削除したらサムネイルも削除する
+        instance.photo_thumbnail.delete(save=False)
+        MemberProfile.objects.filter(pk=instance.pk).update(photo_thumbnail='')
+
+
+def _stat_cell(instance):
+    # 集計（DailyReservationStat）の行。遅延読み込みのフィールドには触れない
+    return instance.__dict__.get('date'), instance.__dict__.get('location_id')
+
+
+@receiver(post_init, sender=Reservation)
+@receiver(post_init, sender=VisitRecord)
+def _stat_source_loaded(sender, instance, **kwargs):
+    instance._loaded_stat_cell = _stat_cell(instance)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_save, sender=VisitRecord)
+def _stat_source_saved(sender, instance, **kwargs):
+    # 日付・場所を変えた場合は変更前の行も再計算する
+    cells = {instance._loaded_stat_cell, (instance.date, instance.location_id)}
+    instance._loaded_stat_cell = (instance.date, instance.location_id)
+    daily_stats.refresh_on_commit(cells)
+
+
+@receiver(post_delete, sender=Reservation)
+@receiver(post_delete, sender=VisitRecord)
+def _stat_source_deleted(sender, instance, **kwargs):
+    daily_stats.refresh_on_commit({_stat_cell(instance), instance._loaded_stat_cell})
@@ -0,0 +1,240 @@
+"""
+Square API の呼び出し。
+
+- クライアントはプロセス内で 1 つだけ作り、HTTP 接続（requests の Session）を使い回す。
+- 呼び出しごとにタイムアウト（SQUARE_TIMEOUT_SECONDS）を設け、べき等な呼び出し（GET・idempotency_key 付きの作成）のみ
+  ジッター付きの指数バックオフで再試行する。
+- 通信エラー・5xx が続いたらサーキットブレーカーを開き、SQUARE_CIRCUIT_RESET_SECONDS の間は Square に接続せず即座に失敗させる。
+- 操作ごとのレイテンシ・エラー数を記録し、metrics_snapshot() で参照できる（プロセス単位）。
+
+使い方: call('checkout.create_payment_link', body={...}, idempotent=True)
+"""
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 再試行・ブレーカーの対象にする HTTP ステータス（Square 側の一時的な障害）
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+LATENCY_SAMPLES = 200
+
+
+class SquareUnavailable(RuntimeError):
+    """サーキットブレーカーが開いているため Square を呼び出さなかった。"""
+
+
+_lock = threading.Lock()
+_client = None
+_client_key = None
+
+
+def _settings_key():
+    return (
+        settings.SQUARE_ACCESS_TOKEN,
+        settings.SQUARE_ENVIRONMENT,
+        getattr(settings, 'SQUARE_BASE_URL', ''),
+        getattr(settings, 'SQUARE_TIMEOUT_SECONDS', 10),
+    )
+
+
+def get_client():
+    """プロセス共通の Square クライアント（設定が変わったときだけ作り直す）。"""
+    global _client, _client_key
+    key = _settings_key()
+    with _lock:
+        if _client is None or _client_key != key:
+            _client = _build_client(*key)
+            _client_key = key
+        return _client
+
+
+def sdk_available():
+    """Square SDK がインストールされているか（SDK 自体は読み込まない）。"""
+    return importlib.util.find_spec('square') is not None
+
+
+def _build_client(access_token, environment, base_url, timeout):
+    from square.client import Client
+
+    options = {
+        'access_token': access_token,
+        'timeout': timeout,
+        # 再試行はこのモジュールで行う（べき等な呼び出しだけを対象にするため）
+        'max_retries': 0,
+    }
+    if base_url:
+        options.update(environment='custom', custom_url=base_url.rstrip('/'))
+    else:
+        options['environment'] = 'sandbox' if environment == 'sandbox' else 'production'
+    return Client(**options)
+
+
+def reset():
+    """クライアント・ブレーカー・メトリクスを初期化する（テスト用）。"""
+    global _client, _client_key
+    with _lock:
+        _client = None
+        _client_key = None
+    breaker.reset()
+    metrics.reset()
+
+
+class CircuitBreaker:
+    """連続失敗で開き、一定時間後に 1 回だけ試行（half-open）して閉じるかを決める。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.opened_at = 0.0
+
+    def allow(self):
+        threshold_reset = getattr(settings, 'SQUARE_CIRCUIT_RESET_SECONDS', 30)
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= threshold_reset:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        threshold = getattr(settings, 'SQUARE_CIRCUIT_FAILURE_THRESHOLD', 5)
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= threshold:
+                if self.state != 'open':
+                    logger.warning('Square API の失敗が続いたため呼び出しを停止します（%d 回連続）', self.failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.state == 'open'
+
+
+class Metrics:
+    """操作ごとの呼び出し回数・エラー数・レイテンシ。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops = {}
+
+    def reset(self):
+        with self._lock:
+            self._ops = {}
+
+    def record(self, operation, elapsed_ms, *, error=False, retry=False, rejected=False):
+        with self._lock:
+            op = self._ops.setdefault(operation, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'rejected': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'latencies': deque(maxlen=LATENCY_SAMPLES),
+            })
+            if rejected:
+                op['rejected'] += 1
+                return
+            op['calls'] += 1
+            op['errors'] += int(error)
+            op['retries'] += int(retry)
+            op['total_ms'] += elapsed_ms
+            op['max_ms'] = max(op['max_ms'], elapsed_ms)
+            op['latencies'].append(elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for name, op in self._ops.items():
+                samples = sorted(op['latencies'])
+                result[name] = {
+                    'calls': op['calls'],
+                    'errors': op['errors'],
+                    'retries': op['retries'],
+                    'rejected': op['rejected'],
+                    'avg_ms': round(op['total_ms'] / op['calls'], 1) if op['calls'] else None,
+                    'p50_ms': round(_percentile(samples, 50), 1) if samples else None,
+                    'p95_ms': round(_percentile(samples, 95), 1) if samples else None,
+                    'max_ms': round(op['max_ms'], 1),
+                }
+            return result
+
+
+def _percentile(samples, pct):
+    index = min(len(samples) - 1, int(round((pct / 100) * (len(samples) - 1))))
+    return samples[index]
+
+
+breaker = CircuitBreaker()
+metrics = Metrics()
+
+
+def metrics_snapshot():
+    return {
+        'pid': os.getpid(),
+        'circuit': {'state': breaker.state, 'consecutive_failures': breaker.failures},
+        'operations': metrics.snapshot(),
+    }
+
+
+def _resolve(client, operation):
+    api_name, method_name = operation.split('.', 1)
+    return getattr(getattr(client, api_name), method_name)
+
+
+def _is_transient(result):
+    return getattr(result, 'status_code', None) in TRANSIENT_STATUSES
+
+
+def call(operation, *args, idempotent=False, **kwargs):
+    """
+    Square API を呼び出して SDK の ApiResponse を返す（operation は 'checkout.create_payment_link' の形式）。
+    idempotent=True の呼び出しのみ、通信エラー・一時的なエラーを SQUARE_MAX_RETRIES 回まで再試行する。
+    ブレーカーが開いているときは SquareUnavailable、通信エラーが解消しなければ最後の例外を送出する。
+    """
+    if not breaker.allow():
+        metrics.record(operation, 0, rejected=True)
+        raise SquareUnavailable('Square API が一時的に利用できません。しばらくしてから再度お試しください。')
+
+    method = _resolve(get_client(), operation)
+    max_retries = getattr(settings, 'SQUARE_MAX_RETRIES', 2) if idempotent else 0
+    backoff = getattr(settings, 'SQUARE_RETRY_BACKOFF_SECONDS', 0.5)
+
+    attempt = 0
+    while True:
+        error = result = None
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            error = e
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        failed = error is not None or _is_transient(result)
+        metrics.record(operation, elapsed_ms, error=failed or not result.is_success(), retry=attempt > 0)
+        if not failed:
+            breaker.record_success()
+            return result
+
+        breaker.record_failure()
+        if attempt >= max_retries or breaker.is_open:
+            if error is not None:
+                raise error
+            return result
+        attempt += 1
+        # full jitter: 0〜backoff*2^(n-1) 秒の間でランダムに待つ
+        time.sleep(random.uniform(0, backoff * (2 ** (attempt - 1))))
@@ -0,0 +1,230 @@
+"""
+Square Webhook イベントの取り込みと処理。
+
+Webhook では受信内容を SquareWebhookEvent に保存して処理ジョブを予約するだけにし、
+run_worker が発生順にまとめて処理する。イベント ID で重複を除くため、Square の再送は何度届いても 1 回しか処理されない。
+"""
+import hashlib
+import json
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import booking_drafts, daily_stats
+from .jobs import claim_rows, enqueue_once, job_handler
+from .models import BookingDraft, BookingGroup, PaymentTransaction, Reservation, SquareWebhookEvent
+
+logger = logging.getLogger(__name__)
+
+PROCESS_EVENTS_TASK = 'square.process_webhook_events'
+PAYMENT_EVENT_TYPES = ('payment.created', 'payment.updated')
+BATCH_SIZE = 200
+
+# Square の決済ステータス → PaymentTransaction.status（APPROVED / PENDING は保留中のまま）
+PAYMENT_STATUS_MAP = {
+    'COMPLETED': 'completed',
+    'FAILED': 'failed',
+    'CANCELED': 'cancelled',
+}
+
+
+def ingest_event(body):
+    """
+    Webhook の本文を保存し、処理ジョブを予約する。JSON として不正な場合は ValueError。
+    既に受信済みのイベント ID は無視する。
+    """
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError('イベントの形式が不正です')
+    event_id = data.get('event_id') or hashlib.sha256(body).hexdigest()
+    created_at = parse_datetime(data.get('created_at') or '') or timezone.now()
+    SquareWebhookEvent.objects.bulk_create([
+        SquareWebhookEvent(
+            event_id=event_id,
+            event_type=data.get('type') or '',
+            payload=data,
+            event_created_at=created_at,
+        ),
+    ], ignore_conflicts=True)
+    enqueue_once(PROCESS_EVENTS_TASK)
+    return event_id
+
+
+def requeue_events(queryset):
+    """失敗したイベントを未処理に戻して再処理する（管理画面の操作用）。"""
+    count = queryset.exclude(status='pending').update(status='pending', error='', processed_at=None)
+    if count:
+        enqueue_once(PROCESS_EVENTS_TASK)
+    return count
+
+
+@job_handler(PROCESS_EVENTS_TASK)
+def process_webhook_events(payload):
+    """
+    未処理のイベントを発生順に最大 BATCH_SIZE 件処理し、残りがあれば次のジョブを予約する。
+    SKIP LOCKED がない場合は、未処理のままのイベントだけを 1 件ずつ条件付き UPDATE で取得する（claim_rows）。
+    """
+    limit = payload.get('batch_size') or BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        qs = SquareWebhookEvent.objects.filter(status='pending').order_by('event_created_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            events = list(qs.select_for_update(skip_locked=True)[:limit])
+        else:
+            events = claim_rows(
+                SquareWebhookEvent, list(qs[:limit]), {'status': 'pending', 'processed_at': None}, processed_at=now,
+            )
+        if not events:
+            return
+
+        transactions = TransactionIndex(_payment_of(event) for event in events)
+        for event in events:
+            try:
+                with transaction.atomic():
+                    event.status = _process_event(event, transactions)
+                event.error = ''
+            except Exception as e:
+                logger.exception('Square Webhook イベント %s の処理に失敗しました', event.event_id)
+                event.status = 'failed'
+                event.error = str(e)[:2000]
+            event.processed_at = now
+        SquareWebhookEvent.objects.bulk_update(events, ['status', 'error', 'processed_at'])
+
+    if len(events) >= limit:
+        enqueue_once(PROCESS_EVENTS_TASK)
+
+
+class TransactionIndex:
+    """複数の決済（Square の payment オブジェクト）に対応する PaymentTransaction を 1 クエリで取得し、注文 ID・決済 ID で引けるようにする。"""
+
+    def __init__(self, payments):
+        order_ids, payment_ids = set(), set()
+        for payment in payments:
+            if payment.get('order_id'):
+                order_ids.add(payment['order_id'])
+            if payment.get('id'):
+                payment_ids.add(payment['id'])
+        self.by_order = {}
+        self.by_payment = {}
+        if order_ids or payment_ids:
+            qs = PaymentTransaction.objects.filter(
+                Q(square_order_id__in=order_ids) | Q(square_payment_id__in=payment_ids)
+            ).order_by('id')
+            for tx in qs:
+                self.add(tx)
+
+    def add(self, tx):
+        if tx.square_order_id:
+            self.by_order.setdefault(tx.square_order_id, tx)
+        if tx.square_payment_id:
+            self.by_payment.setdefault(tx.square_payment_id, tx)
+
+    def find(self, order_id, payment_id):
+        return (order_id and self.by_order.get(order_id)) or (payment_id and self.by_payment.get(payment_id)) or None
+
+
+def _payment_of(event):
+    if event.event_type not in PAYMENT_EVENT_TYPES:
+        return {}
+    return ((event.payload.get('data') or {}).get('object') or {}).get('payment') or {}
+
+
+def payment_sequence(payment):
+    """決済オブジェクトの新しさ（version、なければ updated_at）。古い更新で上書きしないために使う。"""
+    return [payment.get('version') or 0, payment.get('updated_at') or '']
+
+
+def is_newer_payment(tx, status, sequence):
+    """決済の状態が tx に記録済みのものより新しいか（古い状態で上書きしないための判定）。"""
+    previous = tx.metadata.get('square_payment_sequence')
+    if previous and any(sequence) and sequence <= previous:
+        return False
+    return not (tx.status == 'completed' and status == 'pending')
+
+
+def _process_event(event, transactions):
+    """1 件のイベントを反映し、イベントのステータスを返す。"""
+    payment = _payment_of(event)
+    if not payment:
+        return 'ignored'
+
+    payment_id = payment.get('id')
+    order_id = payment.get('order_id')
+    status = PAYMENT_STATUS_MAP.get(payment.get('status'), 'pending')
+    sequence = payment_sequence(payment)
+
+    tx = transactions.find(order_id, payment_id)
+    if tx is None:
+        amount = int((payment.get('amount_money') or {}).get('amount', 0))
+        if amount <= 0:
+            return 'ignored'
+        # JPYの場合はそのまま（セント単位ではない）
+        amount_yen = amount if amount < 10000 else amount / 100
+        tx = PaymentTransaction.objects.create(
+            square_payment_id=payment_id,
+            square_order_id=order_id,
+            amount=amount_yen,
+            status=status,
+            metadata={'square_payment_sequence': sequence},
+        )
+        transactions.add(tx)
+        return 'processed'
+
+    # 後から届いた古いイベント（payment.updated の後の payment.created など）や再送は反映しない
+    if not is_newer_payment(tx, status, sequence):
+        return 'ignored'
+
+    tx.square_payment_id = payment_id or tx.square_payment_id
+    tx.status = status
+    tx.metadata = {**tx.metadata, 'square_payment_sequence': sequence}
+    tx.save(update_fields=['square_payment_id', 'status', 'metadata', 'updated_at'])
+    transactions.add(tx)
+
+    if status == 'completed':
+        complete_bookings([tx])
+    return 'processed'
+
+
+def complete_bookings(transactions):
+    """
+    決済が完了したトランザクションの予約を確定する。
+    予約手続き中データが残っているもの（決済完了後に予約を作るフロー）はここで予約を作成し、それ以外は既存の予約を確定する。
+    戻り値は確定・作成した予約数。
+    """
+    with_draft = set(
+        BookingDraft.objects.filter(payment_transaction__in=transactions).values_list('payment_transaction_id', flat=True)
+    )
+    created = sum(len(booking_drafts.finalize(tx)) for tx in transactions if tx.pk in with_draft)
+    return created + confirm_reservations([tx for tx in transactions if tx.pk not in with_draft])
+
+
+def confirm_reservations(transactions):
+    """
+    決済が完了したトランザクションに紐づく予約を確定する。
+    予約グループがあればグループ内の予約を 1 回の UPDATE でまとめて確定する（グループのない古いトランザクションは予約 1 件）。
+    戻り値は確定した予約数。
+    """
+    group_ids = {tx.booking_group_id for tx in transactions if tx.booking_group_id}
+    reservation_ids = {tx.reservation_id for tx in transactions if tx.reservation_id and not tx.booking_group_id}
+    now = timezone.now()
+    confirmed = 0
+    if group_ids:
+        BookingGroup.objects.filter(pk__in=group_ids).exclude(status='confirmed').update(
+            status='confirmed', updated_at=now,
+        )
+        confirmed += Reservation.objects.filter(booking_group_id__in=group_ids).exclude(status='confirmed').update(
+            status='confirmed', updated_at=now,
+        )
+    if reservation_ids:
+        confirmed += Reservation.objects.filter(pk__in=reservation_ids).exclude(status='confirmed').update(
+            status='confirmed', updated_at=now,
+        )
+    if confirmed:
+        # QuerySet.update() ではシグナルが出ないため、日別集計はここで更新する
+        daily_stats.refresh_matching_on_commit(
+            Reservation.objects.filter(Q(booking_group_id__in=group_ids) | Q(pk__in=reservation_ids))
+        )
+    return confirmed
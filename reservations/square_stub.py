@@ -0,0 +1,162 @@
+"""
+テスト・ローカル開発用の Square API スタブサーバ（標準ライブラリの http.server のみ使用）。
+
+    with SquareStubServer() as stub:
+        with override_settings(SQUARE_BASE_URL=stub.url):
+            ...
+
+対応するエンドポイント:
+  POST /v2/online-checkout/payment-links   決済リンク作成（同じ idempotency_key には同じリンクを返す）
+  GET  /v2/payments                        決済一覧（limit / cursor によるページング）
+  GET  /v2/payments/<id>                   決済取得
+
+fail_next() で次の n 回を指定ステータスで失敗させ、delay で応答を遅らせられる。
+"""
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class SquareStubServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.payments = []
+        self.payment_links = {}
+        self.requests = []
+        self.delay = 0.0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self._server.server_address[1]}'
+
+    def start(self):
+        self._server = _QuietServer((self.host, self.port), _make_handler(self))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail_next(self, count=1, status=503):
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def add_payment(self, **fields):
+        payment = {
+            'id': fields.pop('id', None) or f'PAY_{uuid.uuid4().hex[:12].upper()}',
+            'status': 'COMPLETED',
+            'amount_money': {'amount': 1000, 'currency': 'JPY'},
+            'created_at': '2025-01-01T00:00:00Z',
+            'updated_at': '2025-01-01T00:00:00Z',
+            'version': 1,
+        }
+        payment.update(fields)
+        self.payments.append(payment)
+        return payment
+
+    def _next_failure(self):
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    # --- エンドポイント ---
+
+    def create_payment_link(self, body):
+        key = body.get('idempotency_key')
+        if key in self.payment_links:
+            return 200, {'payment_link': self.payment_links[key]}
+        link_id = f'LINK_{uuid.uuid4().hex[:12].upper()}'
+        link = {
+            'id': link_id,
+            'version': 1,
+            'order_id': f'ORDER_{uuid.uuid4().hex[:12].upper()}',
+            'url': f'{self.url}/checkout/{link_id}',
+            'created_at': '2025-01-01T00:00:00Z',
+        }
+        self.payment_links[key] = link
+        return 200, {'payment_link': link}
+
+    def list_payments(self, query):
+        limit = int(query.get('limit', ['100'])[0])
+        offset = int(query.get('cursor', ['0'])[0] or 0)
+        page = self.payments[offset:offset + limit]
+        body = {'payments': page} if page else {}
+        if offset + limit < len(self.payments):
+            body['cursor'] = str(offset + limit)
+        return 200, body
+
+    def get_payment(self, payment_id):
+        for payment in self.payments:
+            if payment['id'] == payment_id:
+                return 200, {'payment': payment}
+        return 404, {'errors': [{'category': 'INVALID_REQUEST_ERROR', 'code': 'NOT_FOUND', 'detail': 'Payment not found'}]}
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # タイムアウトでクライアントが切断した場合など。テストの出力を汚さない
+        pass
+
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _dispatch(self, method):
+            parsed = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            body = json.loads(raw) if raw else {}
+            stub.requests.append((method, parsed.path, body))
+
+            if stub.delay:
+                threading.Event().wait(stub.delay)
+
+            failure = stub._next_failure()
+            if failure:
+                status, payload = failure, {'errors': [{'category': 'API_ERROR', 'code': 'SERVICE_UNAVAILABLE'}]}
+            elif method == 'POST' and parsed.path == '/v2/online-checkout/payment-links':
+                status, payload = stub.create_payment_link(body)
+            elif method == 'GET' and parsed.path == '/v2/payments':
+                status, payload = stub.list_payments(parse_qs(parsed.query))
+            elif method == 'GET' and parsed.path.startswith('/v2/payments/'):
+                status, payload = stub.get_payment(parsed.path.rsplit('/', 1)[-1])
+            else:
+                status, payload = 404, {'errors': [{'category': 'INVALID_REQUEST_ERROR', 'code': 'NOT_FOUND'}]}
+
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+    return Handler
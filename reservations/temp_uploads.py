@@ -0,0 +1,172 @@
+"""
+複数ステップのフォームで一時的に保持するアップロード（会員登録の顔写真など）。
+
+ファイルはチャンク単位で MEDIA_ROOT/tmp に書き出し、セッションには推測できないハンドルだけを置く。
+フォーム完了時は move_to_field() でモデルの保存先へ os.replace で移動する（コピーしない）。
+TEMP_UPLOAD_TTL_SECONDS を過ぎたファイルは purge_expired() で削除する。
+"""
+import base64
+import binascii
+import os
+import re
+import secrets
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+
+TEMP_DIR_NAME = 'tmp'
+ALLOWED_SUFFIXES = ('.jpg', '.png', '.webp', '.gif')
+SUFFIX_ALIASES = {'.jpeg': '.jpg'}
+# secrets.token_urlsafe() + 拡張子
+HANDLE_RE = re.compile(r'[A-Za-z0-9_-]{16,64}\.[a-z]{3,4}')
+# Base64 は 4 文字 = 3 バイト単位で区切ればそのまま分割してデコードできる
+BASE64_CHUNK_CHARS = 64 * 1024
+
+
+def temp_dir():
+    return Path(settings.MEDIA_ROOT) / TEMP_DIR_NAME
+
+
+def ttl_seconds():
+    return getattr(settings, 'TEMP_UPLOAD_TTL_SECONDS', 3600)
+
+
+def suffix_for(filename, default='.jpg'):
+    """ファイル名から一時ファイルの拡張子を決める（未対応の形式は default）。"""
+    suffix = Path(filename or '').suffix.lower()
+    suffix = SUFFIX_ALIASES.get(suffix, suffix)
+    return suffix if suffix in ALLOWED_SUFFIXES else default
+
+
+def _path(handle):
+    """ハンドルからパスを得る。形式が不正（パス操作を含むなど）なら None。"""
+    if not isinstance(handle, str) or not HANDLE_RE.fullmatch(handle):
+        return None
+    if Path(handle).suffix not in ALLOWED_SUFFIXES:
+        return None
+    return temp_dir() / handle
+
+
+def save_stream(chunks, suffix='.jpg'):
+    """
+    バイト列のチャンクを順に一時ファイルへ書き出してハンドルを返す。
+    書き込み中のファイルは .part として置き、書き終えてから名前を変えるため、途中のファイルを読むことはない。
+    """
+    if suffix not in ALLOWED_SUFFIXES:
+        raise ValueError(f'未対応のファイル形式です: {suffix}')
+    directory = temp_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    handle = f'{secrets.token_urlsafe(24)}{suffix}'
+    partial = directory / f'.{handle}.part'
+    try:
+        with open(partial, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(partial, directory / handle)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return handle
+
+
+def save_bytes(data, suffix='.jpg'):
+    """バイト列を一時ファイルに保存してハンドルを返す。"""
+    return save_stream([data], suffix)
+
+
+def save_upload(uploaded_file):
+    """UploadedFile をチャンクごとに一時ファイルへ書き出してハンドルを返す。"""
+    return save_stream(uploaded_file.chunks(), suffix_for(uploaded_file.name))
+
+
+def _decode_base64_chunks(data):
+    for start in range(0, len(data), BASE64_CHUNK_CHARS):
+        yield base64.b64decode(data[start:start + BASE64_CHUNK_CHARS], validate=True)
+
+
+def save_base64(data):
+    """
+    Base64 文字列（data:image/...;base64, 付きでも可）を少しずつデコードして一時ファイルに保存する。
+    不正な Base64 なら ValueError。
+    """
+    suffix = '.jpg'
+    if data.startswith('data:'):
+        header, _, data = data.partition(',')
+        mime = header[5:].split(';', 1)[0]
+        suffix = suffix_for('photo.' + mime.rpartition('/')[2])
+    data = ''.join(data.split())
+    if len(data) % 4:
+        raise ValueError('Base64 データの長さが不正です')
+    try:
+        return save_stream(_decode_base64_chunks(data), suffix)
+    except binascii.Error as e:
+        raise ValueError(f'Base64 データを読み込めません: {e}') from e
+
+
+def exists(handle):
+    path = _path(handle)
+    return bool(path) and path.is_file() and time.time() - path.stat().st_mtime < ttl_seconds()
+
+
+def open_upload(handle):
+    """一時ファイルを開く（期限切れ・存在しない場合は None）。"""
+    if not exists(handle):
+        return None
+    return open(_path(handle), 'rb')
+
+
+def move_to_field(handle, field_file, filename=None):
+    """
+    一時ファイルをモデルの FileField（field_file）の保存先へ移動し、インスタンスを保存する。
+    保存先がローカルのファイルシステムなら os.replace で移動し、それ以外のストレージでは通常どおり保存する。
+    一時ファイルがない（期限切れなど）場合は False。
+    """
+    if not exists(handle):
+        return False
+    source = _path(handle)
+    filename = filename or f'photo{source.suffix}'
+    storage = field_file.storage
+    name = field_file.field.generate_filename(field_file.instance, filename)
+    try:
+        storage.path(name)
+    except NotImplementedError:
+        with open(source, 'rb') as f:
+            field_file.save(filename, File(f), save=True)
+        discard(handle)
+        return True
+
+    name = storage.get_available_name(name, max_length=field_file.field.max_length)
+    destination = Path(storage.path(name))
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(source, destination)
+    if storage.file_permissions_mode is not None:
+        os.chmod(destination, storage.file_permissions_mode)
+    field_file.name = name
+    field_file.instance.save(update_fields=[field_file.field.attname])
+    return True
+
+
+def discard(handle):
+    path = _path(handle)
+    if path:
+        path.unlink(missing_ok=True)
+
+
+def purge_expired():
+    """期限切れの一時ファイル（書き込み途中で残った .part を含む）を削除し、削除件数を返す。"""
+    directory = temp_dir()
+    if not directory.is_dir():
+        return 0
+    threshold = time.time() - ttl_seconds()
+    removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < threshold:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
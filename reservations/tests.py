@@ -1,3 +1,1045 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.management.base import CommandError
+from django.db import connection
+from django.template import Context
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, booking_drafts, calendar_feed, daily_stats, imports, jobs, no_shows, photo_processing, series, square_client, square_events
+from .models import (
+    ArchivedReservation, ArchivedVisitRecord, BackgroundJob, BookingDraft, BookingGroup, DailyReservationStat, Location,
+    MemberProfile, PaymentTransaction, Reservation, ReservationSeries, SquareWebhookEvent, TimeSlot, VisitRecord,
+)
+from .email_rendering import email_engine, render_email
+from .square_stub import SquareStubServer
+from .views import VIEW_MODULES
+
+
+class SquareStubMixin:
+    """Square API の接続先をスタブサーバに向ける"""
+
+    def setUp(self):
+        super().setUp()
+        self.stub = SquareStubServer().start()
+        self.addCleanup(self.stub.stop)
+        square_client.reset()
+        self.addCleanup(square_client.reset)
+        overrides = override_settings(
+            SQUARE_INTEGRATION_ENABLED=True,
+            SQUARE_BASE_URL=self.stub.url,
+            SQUARE_LOCATION_ID='LOC',
+            SQUARE_TIMEOUT_SECONDS=2,
+            SQUARE_MAX_RETRIES=2,
+            SQUARE_RETRY_BACKOFF_SECONDS=0,
+            SQUARE_CIRCUIT_FAILURE_THRESHOLD=3,
+            SQUARE_CIRCUIT_RESET_SECONDS=60,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class ClaimJobsTests(TestCase):
+    """複数のワーカーが同じジョブを取得しないこと（SKIP LOCKED のない SQLite）"""
+
+    def setUp(self):
+        self.jobs = [BackgroundJob.objects.create(task='test.noop') for _ in range(3)]
+
+    def test_job_claimed_by_another_worker_is_skipped(self):
+        claim_rows = jobs.claim_rows
+
+        def racing(model, rows, condition, **values):
+            # 読み取った後、UPDATE の前に別のワーカーが 1 件目を取得した
+            BackgroundJob.objects.filter(pk=rows[0].pk).update(status='running')
+            return claim_rows(model, rows, condition, **values)
+
+        with mock.patch.object(jobs, 'claim_rows', racing):
+            claimed = jobs.claim_jobs()
+        self.assertEqual([job.pk for job in claimed], [job.pk for job in self.jobs[1:]])
+        self.assertEqual(jobs.claim_jobs(), [])
+
+    def test_stale_read_claims_nothing(self):
+        stale = list(BackgroundJob.objects.filter(status='pending'))
+        self.assertEqual(len(jobs.claim_jobs()), 3)
+        self.assertEqual(jobs.claim_rows(BackgroundJob, stale, {'status': 'pending'}, status='running'), [])
+
+
+class SquareClientTests(SquareStubMixin, SimpleTestCase):
+    """Square API 呼び出し（square_client）をスタブサーバに対して確認する"""
+
+    def test_create_payment_link(self):
+        from .views import create_payment_link
+
+        result = create_payment_link(None, 1500, 'reservation_1', '予約料金')
+        self.assertTrue(result['success'], result)
+        self.assertTrue(result['payment_link_url'].startswith(self.stub.url))
+        self.assertIs(square_client.get_client(), square_client.get_client())
+
+    def test_idempotent_call_is_retried(self):
+        self.stub.fail_next(2)
+        result = square_client.call('payments.list_payments', idempotent=True)
+        self.assertEqual(result.status_code, 200)
+        ops = square_client.metrics_snapshot()['operations']['payments.list_payments']
+        self.assertEqual((ops['calls'], ops['errors'], ops['retries']), (3, 2, 2))
+
+    def test_non_idempotent_call_is_not_retried(self):
+        self.stub.fail_next(1)
+        result = square_client.call('payments.list_payments')
+        self.assertEqual(result.status_code, 503)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.stub.fail_next(10)
+        with self.assertLogs('reservations.square_client', 'WARNING'):
+            square_client.call('payments.list_payments', idempotent=True)
+        self.assertEqual(square_client.breaker.state, 'open')
+        with self.assertRaises(square_client.SquareUnavailable):
+            square_client.call('payments.list_payments')
+        self.assertEqual(len(self.stub.requests), 3)
+
+
+class ReconcilePaymentsTests(SquareStubMixin, TestCase):
+    def test_reconcile_updates_transactions_in_bulk(self):
+        location = Location.objects.create(name='会議室A', capacity=10)
+        slot = TimeSlot.objects.create(start_time=time(10, 0), end_time=time(10, 30))
+        reservation = Reservation.objects.create(
+            location=location, time_slot=slot, date=date(2025, 1, 1),
+            customer_name='テスト', customer_email='test@example.com', status='pending',
+        )
+        transactions = [
+            PaymentTransaction.objects.create(square_order_id=f'ORDER_{i}', amount=1000, status='pending')
+            for i in range(5)
+        ]
+        transactions[0].reservation = reservation
+        transactions[0].save()
+        for i in range(5):
+            self.stub.add_payment(id=f'PAY_{i}', order_id=f'ORDER_{i}', status='FAILED' if i == 4 else 'COMPLETED')
+        self.stub.add_payment(id='PAY_OTHER', order_id='ORDER_OTHER')
+
+        out = StringIO()
+        with self.assertNumQueries(11):
+            # ページごとに 取得・SAVEPOINT・bulk_update・手続き中データ確認・RELEASE の 5 クエリ（1 ページ目のみ予約確定 1 を追加）
+            call_command('reconcile_payments', page_size=3, stdout=out)
+        self.assertIn('更新 5件', out.getvalue())
+        self.assertEqual(len(self.stub.requests), 2)
+
+        statuses = dict(PaymentTransaction.objects.values_list('square_order_id', 'status'))
+        self.assertEqual(statuses['ORDER_0'], 'completed')
+        self.assertEqual(statuses['ORDER_4'], 'failed')
+        self.assertEqual(PaymentTransaction.objects.get(square_order_id='ORDER_1').square_payment_id, 'PAY_1')
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'confirmed')
+
+        # 2 回目は変更なし
+        call_command('reconcile_payments', page_size=3, stdout=out)
+        self.assertIn('更新 0件', out.getvalue())
+
+
+class GroupPaymentTests(SquareStubMixin, TestCase):
+    """複数日の予約を 1 件の決済（予約グループ）にまとめ、決済完了でまとめて確定する"""
+
+    def setUp(self):
+        super().setUp()
+        self.location = Location.objects.create(name='会議室A', capacity=10, price_per_30min=500)
+        self.slot = TimeSlot.objects.create(start_time=time(10, 0), end_time=time(10, 30))
+        self.dates = [date(2030, 1, 7) + timedelta(weeks=i) for i in range(3)]
+        self.user = User.objects.create_user('member', 'member@example.com', 'pw')
+        self.client.force_login(self.user)
+        draft = BookingDraft.objects.create(
+            data={
+                'location': self.location.pk,
+                'is_multi_date': True,
+                'multi_date_slots': {day.isoformat(): [self.slot.pk] for day in self.dates},
+                'customer_name': 'テスト',
+                'customer_email': 'member@example.com',
+            },
+            user=self.user,
+            expires_at=timezone.now() + booking_drafts.DRAFT_TTL,
+        )
+        session = self.client.session
+        session[booking_drafts.SESSION_KEY] = draft.token
+        session.save()
+
+    def test_group_payment_confirms_every_reservation_with_one_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('reservations:reservation_confirm_submit'))
+        self.assertTrue(response['Location'].startswith(self.stub.url), response['Location'])
+        group = BookingGroup.objects.get()
+        tx = PaymentTransaction.objects.get()
+        self.assertEqual((tx.booking_group, tx.amount, group.total_amount), (group, 1500, 1500))
+        self.assertEqual(list(group.reservations.values_list('status', flat=True)), ['pending'] * 3)
+
+        tx.status = 'completed'
+        tx.save()
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(square_events.complete_bookings([tx]), 3)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "reservations_reservation"')]
+        self.assertEqual(len(updates), 1)
+        group.refresh_from_db()
+        self.assertEqual(group.status, 'confirmed')
+        self.assertEqual(list(group.reservations.values_list('status', flat=True)), ['confirmed'] * 3)
+        stats = DailyReservationStat.objects.filter(location=self.location).order_by('date')
+        self.assertEqual([(s.date, s.confirmed_count) for s in stats], [(day, 1) for day in self.dates])
+
+        # 2 回目（Webhook の再送など）は何も変えない
+        self.assertEqual(square_events.confirm_reservations([tx]), 0)
+
+
+@override_settings(BACKGROUND_JOBS_EAGER=False)
+class SquareWebhookEventTests(SquareStubMixin, TestCase):
+    """Square Webhook イベントの取り込みと処理（square_events）"""
+
+    def setUp(self):
+        super().setUp()
+        self.tx = PaymentTransaction.objects.create(square_order_id='ORDER', amount=1000, status='pending')
+
+    def post(self, event_id, status, version, created_at='2025-01-01T10:00:00Z'):
+        body = json.dumps({
+            'event_id': event_id,
+            'type': 'payment.updated',
+            'created_at': created_at,
+            'data': {'object': {'payment': {
+                'id': 'PAY', 'order_id': 'ORDER', 'status': status, 'version': version,
+                'amount_money': {'amount': 1000, 'currency': 'JPY'},
+            }}},
+        })
+        response = self.client.post(reverse('reservations:square_webhook'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            square_events.process_webhook_events({})
+        self.tx.refresh_from_db()
+
+    def test_redelivered_event_is_stored_once(self):
+        self.post('EV1', 'COMPLETED', 1)
+        self.post('EV1', 'COMPLETED', 1)
+        self.assertEqual(SquareWebhookEvent.objects.count(), 1)
+        self.assertEqual(BackgroundJob.objects.filter(task=square_events.PROCESS_EVENTS_TASK).count(), 1)
+        self.process()
+        self.assertEqual(self.tx.status, 'completed')
+        self.assertEqual(SquareWebhookEvent.objects.get().status, 'processed')
+
+    def test_older_payment_state_is_ignored(self):
+        self.post('EV2', 'COMPLETED', 2)
+        # 後から届いた古い版（version 1）は反映しない
+        self.post('EV1', 'APPROVED', 1, created_at='2025-01-01T10:00:01Z')
+        self.process()
+        self.assertEqual(self.tx.status, 'completed')
+        self.assertEqual(self.tx.metadata['square_payment_sequence'], [2, ''])
+        self.assertEqual(SquareWebhookEvent.objects.get(event_id='EV1').status, 'ignored')
+        self.assertFalse(square_events.is_newer_payment(self.tx, 'completed', [2, '']))
+        self.assertTrue(square_events.is_newer_payment(self.tx, 'cancelled', [3, '']))
+
+    def test_completed_event_creates_reservations_from_draft(self):
+        location = Location.objects.create(name='会議室A', capacity=10, price_per_30min=500)
+        slot = TimeSlot.objects.create(start_time=time(10, 0), end_time=time(10, 30))
+        BookingDraft.objects.create(
+            data={
+                'location': location.pk, 'date': '2030-01-07', 'time_slot_ids': [slot.pk],
+                'customer_name': 'テスト', 'customer_email': 'test@example.com',
+            },
+            payment_transaction=self.tx,
+            expires_at=timezone.now() + booking_drafts.PAYMENT_DRAFT_TTL,
+        )
+        self.post('EV1', 'COMPLETED', 1)
+        self.process()
+        reservation = Reservation.objects.get()
+        self.assertEqual((reservation.status, reservation.time_slot_id), ('confirmed', slot.pk))
+        self.assertEqual(self.tx.reservation, reservation)
+        self.assertFalse(BookingDraft.objects.exists())
+
+    def test_event_claimed_by_another_worker_is_skipped(self):
+        self.post('EV1', 'COMPLETED', 1)
+        self.post('EV2', 'FAILED', 2, created_at='2025-01-01T10:00:01Z')
+        claim_rows = square_events.claim_rows
+
+        def racing(model, rows, condition, **values):
+            # 読み取った後、取得する前に別のワーカーが 1 件目を処理した
+            SquareWebhookEvent.objects.filter(pk=rows[0].pk).update(status='processed', processed_at=timezone.now())
+            return claim_rows(model, rows, condition, **values)
+
+        with mock.patch.object(square_events, 'claim_rows', racing):
+            self.process()
+        # 2 件目（FAILED）だけをこのワーカーが処理した
+        self.assertEqual(self.tx.status, 'failed')
+        self.assertEqual(SquareWebhookEvent.objects.get(event_id='EV2').status, 'processed')
+
+
+class FinalizeBookingTests(TestCase):
+    """決済完了時に手続き中データから予約を作成する（booking_drafts.finalize）"""
+
+    def setUp(self):
+        self.location = Location.objects.create(name='会議室A', capacity=10, price_per_30min=500)
+        self.slots = [TimeSlot.objects.create(start_time=time(hour, 0), end_time=time(hour, 30)) for hour in (10, 11)]
+        self.day = date(2030, 1, 7)
+        group = BookingGroup.objects.create(customer_email='test@example.com', total_amount=1000)
+        self.tx = PaymentTransaction.objects.create(
+            booking_group=group, payment_link_id='LINK', amount=1000, status='completed',
+        )
+        BookingDraft.objects.create(
+            data={
+                'location': self.location.pk,
+                'date': self.day.isoformat(),
+                'time_slot_ids': [slot.pk for slot in self.slots],
+                'customer_name': 'テスト',
+                'customer_email': 'test@example.com',
+            },
+            payment_transaction=self.tx,
+            expires_at=timezone.now() + booking_drafts.PAYMENT_DRAFT_TTL,
+        )
+
+    def take(self, slot):
+        Reservation.objects.create(
+            location=self.location, time_slot=slot, date=self.day,
+            customer_name='先客', customer_email='other@example.com', status='confirmed',
+        )
+
+    def complete(self):
+        return self.client.get(reverse('reservations:payment_complete'), {'payment_link_id': 'LINK'})
+
+    def test_webhook_and_redirect_create_reservations_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(square_events.complete_bookings([self.tx]), 2)
+        self.assertFalse(BookingDraft.objects.exists())
+        reservations = list(Reservation.objects.order_by('id'))
+        self.assertEqual([r.status for r in reservations], ['confirmed', 'confirmed'])
+
+        # リダイレクトが後から届いても、作成済みの予約を返すだけ
+        self.assertEqual(booking_drafts.finalize(self.tx), reservations)
+        response = self.complete()
+        self.assertRedirects(
+            response, reverse('reservations:reservation_detail', args=[reservations[0].pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(Reservation.objects.count(), 2)
+        self.assertEqual(DailyReservationStat.objects.get(date=self.day).confirmed_count, 2)
+
+    def test_slot_taken_during_payment_is_recorded_for_refund(self):
+        self.take(self.slots[0])
+        with self.assertLogs('reservations.booking_drafts', 'WARNING'):
+            created = booking_drafts.finalize(self.tx)
+        self.assertEqual([r.time_slot_id for r in created], [self.slots[1].pk])
+        self.tx.refresh_from_db()
+        self.assertEqual(
+            booking_drafts.unfulfilled_slots(self.tx), [{'date': self.day.isoformat(), 'time_slot_id': self.slots[0].pk}],
+        )
+        self.assertEqual(self.tx.reservation, created[0])
+
+        response = self.complete()
+        self.assertIn('返金', ' '.join(str(m) for m in get_messages(response.wsgi_request)))
+
+    def test_all_slots_taken_tells_customer_about_refund(self):
+        for slot in self.slots:
+            self.take(slot)
+        with self.assertLogs('reservations.booking_drafts', 'WARNING'):
+            response = self.complete()
+        self.assertRedirects(response, reverse('reservations:index'), fetch_redirect_response=False)
+        messages = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertTrue(any('返金' in m for m in messages), messages)
+        self.assertFalse(any('決済処理中' in m for m in messages), messages)
+        self.tx.refresh_from_db()
+        self.assertEqual(len(booking_drafts.unfulfilled_slots(self.tx)), 2)
+        self.assertEqual(Reservation.objects.filter(booking_group=self.tx.booking_group).count(), 0)
+
+
+class ReservationOrderingTests(TestCase):
+    """件数・存在確認・values_list に時間枠の JOIN と ORDER BY が付かないこと"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Location.objects.create(name='会議室A', capacity=10)
+        cls.slots = [
+            TimeSlot.objects.create(start_time=time(hour, 0), end_time=time(hour, 30)) for hour in (11, 10)
+        ]
+        cls.day = date(2025, 1, 1)
+        for slot in cls.slots:
+            Reservation.objects.create(
+                location=cls.location, time_slot=slot, date=cls.day,
+                customer_name='テスト', customer_email='test@example.com', status='confirmed',
+            )
+
+    def test_default_queryset_does_not_join_time_slot(self):
+        reservations = Reservation.objects.filter(location=self.location, date=self.day, status__in=['confirmed'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(reservations.exists())
+            self.assertEqual(reservations.count(), 2)
+            self.assertEqual(len(list(reservations.values_list('time_slot_id', flat=True))), 2)
+        self.assertEqual(len(queries), 3)
+        for query in queries:
+            self.assertNotIn('reservations_timeslot', query['sql'])
+            self.assertNotIn('ORDER BY', query['sql'])
+        plan = reservations.values_list('time_slot_id', flat=True).explain()
+        self.assertNotIn('reservations_timeslot', plan)
+
+    def test_for_display_orders_by_date_and_start_time(self):
+        reservations = Reservation.objects.filter(location=self.location).for_display()
+        self.assertEqual([r.time_slot_id for r in reservations], [self.slots[1].pk, self.slots[0].pk])
+        self.assertIn('reservations_timeslot', reservations.explain())
+
+    def test_check_availability_queries_do_not_join_time_slot(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('reservations:check_availability'), {'location': self.location.pk, 'date': '2025-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()['booked_slots']), sorted(slot.pk for slot in self.slots))
+        reservation_queries = [q['sql'] for q in queries if 'FROM "reservations_reservation"' in q['sql']]
+        self.assertTrue(reservation_queries)
+        for sql in reservation_queries:
+            self.assertNotIn('reservations_timeslot', sql)
+
+
+class ConditionalGetTests(TestCase):
+    """カレンダーのフィード・空き状況 API の ETag と 304（calendar_feed.feed_validators / _availability_validators）"""
+
+    def setUp(self):
+        self.location = Location.objects.create(name='会議室A', capacity=10)
+        self.slots = [TimeSlot.objects.create(start_time=time(hour, 0), end_time=time(hour, 30)) for hour in (10, 11)]
+        self.user = User.objects.create_user('member', 'member@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.day = timezone.localdate() + timedelta(days=5)
+        self.reservation = self.book(self.slots[0])
+        self.urls = {
+            'events': (reverse('reservations:calendar_events'), {'start': self.day.isoformat(), 'end': self.day.isoformat()}),
+            'ics': (reverse('reservations:calendar_ics_feed', args=[calendar_feed.feed_token(self.user)]), {}),
+            'availability': (
+                reverse('reservations:check_availability'), {'location': self.location.pk, 'date': self.day.isoformat()},
+            ),
+        }
+
+    def book(self, slot):
+        return Reservation.objects.create(
+            location=self.location, time_slot=slot, date=self.day,
+            customer_name='テスト', customer_email='member@example.com', status='confirmed', created_by=self.user,
+        )
+
+    def etags(self):
+        etags = {}
+        for name, (url, params) in self.urls.items():
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, name)
+            etags[name] = response['ETag']
+        return etags
+
+    def test_repeated_request_gets_304(self):
+        for name, etag in self.etags().items():
+            url, params = self.urls[name]
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, name)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_create_cancel_and_delete_change_the_etag(self):
+        seen = [self.etags()]
+        other = self.book(self.slots[1])
+        seen.append(self.etags())
+        other.status = 'cancelled'
+        other.save()
+        seen.append(self.etags())
+        self.reservation.delete()
+        seen.append(self.etags())
+        for name in self.urls:
+            etags = [etags[name] for etags in seen]
+            self.assertEqual(len(set(etags)), len(etags), name)
+
+    def test_ics_token_with_bad_signature_is_rejected(self):
+        url = self.urls['ics'][0]
+        token = calendar_feed.feed_token(self.user)
+        value, signature = token.rsplit(':', 1)
+        tampered = f'{value}:{signature[:-1]}{"A" if signature[-1] != "A" else "B"}'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url.replace(token, tampered)).status_code, 404)
+        # 別のユーザーの ID に書き換えたトークンも使えない
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        forged = calendar_feed.feed_token(other).rsplit(':', 1)[0] + ':' + signature
+        self.assertEqual(self.client.get(url.replace(token, forged)).status_code, 404)
+        # パスワードを変更すると以前のトークンは無効
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class DailyStatsTests(TestCase):
+    """日別集計（daily_stats）が、どの書き込み経路の後も元データからの再計算と一致すること"""
+
+    def assert_matches_recompute(self):
+        stored = {
+            (row.date, row.location_id): {name: getattr(row, name) for name in daily_stats.STAT_FIELDS}
+            for row in DailyReservationStat.objects.all()
+            if any(getattr(row, name) for name in daily_stats.STAT_FIELDS)
+        }
+        self.assertEqual(stored, daily_stats._collect())
+
+    def test_rollup_matches_full_recompute_after_every_write_path(self):
+        location = Location.objects.create(name='会議室A', capacity=10)
+        slots = [TimeSlot.objects.create(start_time=time(hour, 0), end_time=time(hour, 30)) for hour in (10, 11, 12)]
+        user = User.objects.create_user('member', 'member@example.com', 'pw')
+        profile = MemberProfile.objects.create(user=user, full_name='会員', gender='other')
+        day = timezone.localdate() + timedelta(days=3)
+
+        def reserve(slot, status='confirmed'):
+            return Reservation.objects.create(
+                location=location, time_slot=slot, date=day, customer_name='会員',
+                customer_email='member@example.com', status=status, created_by=user,
+            )
+
+        # 保存・キャンセル・削除（シグナル）
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second = reserve(slots[0]), reserve(slots[1], 'pending')
+            VisitRecord.objects.create(
+                member_profile=profile, location=location, date=day, reservation=first,
+                entry_at=timezone.now(), billed_amount=800,
+            )
+        self.assert_matches_recompute()
+        with self.captureOnCommitCallbacks(execute=True):
+            second.status = 'cancelled'
+            second.save()
+        self.assert_matches_recompute()
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assert_matches_recompute()
+
+        # 繰り返し予約の bulk_create と一括キャンセル
+        dates = series.occurrence_dates(day + timedelta(weeks=1), 1, count=3)
+        reservation_series = ReservationSeries.objects.create(
+            location=location, start_date=dates[0], end_date=dates[-1],
+            customer_name='会員', customer_email='member@example.com', created_by=user,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            series.create_reservations(
+                location, {d: [slots[2].pk] for d in dates}, status='confirmed', customer_name='会員',
+                customer_email='member@example.com', series=reservation_series, created_by=user,
+            )
+        self.assert_matches_recompute()
+        with self.captureOnCommitCallbacks(execute=True):
+            series.cancel_upcoming(reservation_series)
+        self.assert_matches_recompute()
+
+        # CSV 取り込みの bulk_create
+        row = dict.fromkeys(imports.RESERVATION_COLUMNS, '')
+        row.update(date=day.isoformat(), start_time='12:00', location='会議室A', customer_name='取り込み',
+                   customer_email='import@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(imports.import_reservations([(2, row)]).created, 1)
+        self.assert_matches_recompute()
+
+        # 集計がずれても rebuild_daily_stats で元データから作り直せる
+        DailyReservationStat.objects.update(reservation_count=99, billed_amount=0)
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        self.assert_matches_recompute()
+
+
+class NoShowTests(TestCase):
+    """無断キャンセルの判定と会員ごとの件数（no_shows.detect / update_member_counts）"""
+
+    def setUp(self):
+        self.location = Location.objects.create(name='会議室A', capacity=10)
+        self.slot = TimeSlot.objects.create(start_time=time(10, 0), end_time=time(10, 30))
+        self.days = [timezone.localdate() - timedelta(days=i) for i in range(1, 6)]
+        self.alice = self.member('alice', 'Alice_Smith@Example.com')
+        self.bob = self.member('bob', 'bob@example.com')
+
+    def member(self, username, email):
+        user = User.objects.create_user(username, email, 'pw')
+        MemberProfile.objects.create(user=user, full_name=username, gender='other')
+        return user
+
+    def reserve(self, day, email, created_by=None, status='confirmed', slot=None):
+        return Reservation.objects.create(
+            location=self.location, time_slot=slot or self.slot, date=day, customer_name='テスト',
+            customer_email=email, status=status, created_by=created_by,
+        )
+
+    def visit(self, user, day):
+        VisitRecord.objects.create(
+            member_profile=user.memberprofile, location=self.location, date=day, entry_at=timezone.now(),
+        )
+
+    def flagged(self):
+        return set(Reservation.objects.filter(is_no_show=True).values_list('pk', flat=True))
+
+    def test_detect_and_member_counts(self):
+        # 管理者が別のメールアドレスで代わりに予約した（作成者で照合）
+        by_creator = self.reserve(self.days[0], 'front-desk@example.com', created_by=self.alice)
+        self.visit(self.alice, self.days[0])
+        # 大文字・小文字だけが違うメールアドレス
+        by_email = self.reserve(self.days[1], 'alice_smith@example.COM')
+        self.visit(self.alice, self.days[1])
+        # _ をワイルドカードとして扱わない
+        lookalike = self.reserve(
+            self.days[1], 'aliceXsmith@example.com', slot=TimeSlot.objects.create(start_time=time(12, 0), end_time=time(12, 30)),
+        )
+        alice_no_show = self.reserve(self.days[2], 'ALICE_SMITH@example.com')
+        bob_no_shows = [self.reserve(day, 'bob@example.com', created_by=self.bob) for day in self.days[3:5]]
+        # 確認済みでない予約は対象外
+        self.reserve(
+            self.days[2], 'bob@example.com', created_by=self.bob, status='pending',
+            slot=TimeSlot.objects.create(start_time=time(11, 0), end_time=time(11, 30)),
+        )
+
+        flagged, cleared = no_shows.detect(self.days[-1], self.days[0])
+        expected = {lookalike.pk, alice_no_show.pk, *(r.pk for r in bob_no_shows)}
+        self.assertEqual((flagged, cleared), (4, 0))
+        self.assertEqual(self.flagged(), expected)
+        self.assertNotIn(by_creator.pk, self.flagged())
+        self.assertNotIn(by_email.pk, self.flagged())
+
+        self.assertEqual(no_shows.update_member_counts(), 2)
+        self.assertEqual(MemberProfile.objects.get(user=self.alice).no_show_count, 1)
+        self.assertEqual(MemberProfile.objects.get(user=self.bob).no_show_count, 2)
+
+        # キャンセルされた予約は解除し、件数も減らす
+        bob_no_shows[0].refresh_from_db()
+        bob_no_shows[0].status = 'cancelled'
+        bob_no_shows[0].save()
+        self.assertEqual(no_shows.detect(self.days[-1], self.days[0]), (0, 1))
+        self.assertEqual(self.flagged(), expected - {bob_no_shows[0].pk})
+        self.assertEqual(no_shows.update_member_counts(), 1)
+        self.assertEqual(MemberProfile.objects.get(user=self.bob).no_show_count, 1)
+        # 変わっていなければ何も更新しない
+        self.assertEqual(no_shows.update_member_counts(), 0)
+
+
+class ReservationSeriesTests(TestCase):
+    """繰り返し予約の展開・作成・一括変更（series.py）"""
+
+    def setUp(self):
+        self.location = Location.objects.create(name='会議室A', capacity=10)
+        self.slots = [TimeSlot.objects.create(start_time=time(hour, 0), end_time=time(hour, 30)) for hour in (10, 11)]
+        self.today = timezone.localdate()
+
+    def create(self, slots_by_date, reservation_series=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return series.create_reservations(
+                self.location, slots_by_date, status='confirmed', customer_name='繰り返し',
+                customer_email='member@example.com', notes='元の備考', series=reservation_series,
+            )
+
+    def test_occurrence_dates(self):
+        start = date(2030, 1, 7)
+        self.assertEqual(
+            series.occurrence_dates(start, 2, count=3), [start, date(2030, 1, 21), date(2030, 2, 4)],
+        )
+        # until の日も含む
+        self.assertEqual(series.occurrence_dates(start, 1, until=date(2030, 1, 21)), [
+            start, date(2030, 1, 14), date(2030, 1, 21),
+        ])
+        self.assertEqual(len(series.occurrence_dates(start, 1, count=2, until=date(2030, 12, 31))), 2)
+        self.assertEqual(series.occurrence_dates(start, 1, until=start - timedelta(days=1)), [])
+        # 回数・終了日にかかわらず MAX_OCCURRENCES 回まで
+        self.assertEqual(len(series.occurrence_dates(start, 1, count=100)), series.MAX_OCCURRENCES)
+        self.assertEqual(len(series.occurrence_dates(start, 1, until=date(2040, 1, 1))), series.MAX_OCCURRENCES)
+
+    def test_taken_slots_are_skipped(self):
+        dates = series.occurrence_dates(date(2030, 1, 7), 1, count=3)
+        self.create({dates[1]: [self.slots[0].pk]})
+        cancelled = self.create({dates[2]: [self.slots[0].pk]})[0]
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        wanted = {day: [slot.pk for slot in self.slots] for day in dates}
+
+        with self.assertNumQueries(1):
+            taken = series.taken_slots(self.location.pk, wanted)
+        self.assertEqual(taken, {(dates[1], self.slots[0].pk)})
+
+        created = self.create(wanted)
+        self.assertEqual(len(created), 5)
+        self.assertNotIn((dates[1], self.slots[0].pk), {(r.date, r.time_slot_id) for r in created})
+        self.assertEqual(self.create(wanted), [])
+
+    def test_update_and_cancel_touch_only_upcoming_active_occurrences(self):
+        dates = [self.today + timedelta(weeks=i) for i in (-1, 0, 1, 2)]
+        reservation_series = ReservationSeries.objects.create(
+            location=self.location, start_date=dates[0], end_date=dates[-1],
+            customer_name='繰り返し', customer_email='member@example.com', notes='元の備考',
+        )
+        past, today, cancelled, future = self.create({day: [self.slots[0].pk] for day in dates}, reservation_series)
+        Reservation.objects.filter(pk=cancelled.pk).update(status='cancelled')
+
+        self.assertEqual(series.update_upcoming(reservation_series, customer_name='変更後', notes='新しい備考'), 2)
+        names = dict(Reservation.objects.values_list('pk', 'customer_name'))
+        self.assertEqual(
+            [names[r.pk] for r in (past, today, cancelled, future)], ['繰り返し', '変更後', '繰り返し', '変更後'],
+        )
+        reservation_series.refresh_from_db()
+        self.assertEqual((reservation_series.customer_name, reservation_series.notes), ('変更後', '新しい備考'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(series.cancel_upcoming(reservation_series), 2)
+        statuses = dict(Reservation.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[r.pk] for r in (past, today, cancelled, future)], ['confirmed', 'cancelled', 'cancelled', 'cancelled'],
+        )
+        reservation_series.refresh_from_db()
+        self.assertIsNotNone(reservation_series.cancelled_at)
+        self.assertEqual(DailyReservationStat.objects.get(date=future.date).cancelled_count, 1)
+        self.assertEqual(series.cancel_upcoming(reservation_series), 0)
+
+
+class MemberPhotoProcessingTests(TestCase):
+    """会員の顔写真の縮小とサムネイル作成（photo_processing）"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = Path(directory.name)
+        overrides = override_settings(MEDIA_ROOT=directory.name, BACKGROUND_JOBS_EAGER=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        user = User.objects.create_user('member', 'member@example.com', 'pw')
+        self.profile = MemberProfile.objects.create(user=user, full_name='会員', gender='other')
+
+    def image(self, size, image_format):
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new('RGB', size, (200, 120, 40)).save(buf, image_format)
+        return buf.getvalue()
+
+    def open(self, data):
+        from PIL import Image
+
+        return Image.open(io.BytesIO(data))
+
+    def files(self):
+        return sorted(str(path.relative_to(self.media_root)) for path in self.media_root.rglob('*') if path.is_file())
+
+    def test_process_image(self):
+        normalized, thumbnail = photo_processing.process_image(self.image((2000, 1000), 'PNG'))
+        self.assertEqual((self.open(normalized).format, self.open(normalized).size), ('JPEG', (1024, 512)))
+        self.assertEqual(self.open(thumbnail).size, (160, 160))
+        # 条件を満たす JPEG はそのまま使う
+        normalized, thumbnail = photo_processing.process_image(self.image((300, 200), 'JPEG'))
+        self.assertIsNone(normalized)
+        self.assertEqual(self.open(thumbnail).size, (160, 160))
+        with self.assertRaises(ValueError):
+            photo_processing.process_image(b'not an image')
+
+    def test_new_photo_is_resized_in_the_background(self):
+        self.profile.photo.save('photo.png', ContentFile(self.image((2000, 1500), 'PNG')))
+        original = self.profile.photo.name
+        self.assertEqual(BackgroundJob.objects.filter(task=photo_processing.PROCESS_TASK).count(), 1)
+
+        self.assertEqual(jobs.run_jobs(jobs.claim_jobs()), 1)
+        self.profile.refresh_from_db()
+        self.assertNotEqual(self.profile.photo.name, original)
+        with self.profile.photo.open('rb') as f:
+            self.assertEqual(self.open(f.read()).size, (1024, 768))
+        self.assertTrue(self.profile.photo_thumbnail.name.startswith(f'member_photos/{self.profile.user_id}/thumbs/'))
+        # 元の PNG は削除し、写真とサムネイルだけが残る
+        self.assertEqual(self.files(), sorted([self.profile.photo.name, self.profile.photo_thumbnail.name]))
+        # 結果の保存は QuerySet.update() なので、もう一度ジョブが登録されることはない
+        self.assertEqual(BackgroundJob.objects.filter(status='pending').count(), 0)
+
+    def test_photo_replaced_while_processing_is_kept(self):
+        self.profile.photo.save('first.png', ContentFile(self.image((2000, 1500), 'PNG')))
+        stale = MemberProfile.objects.get(pk=self.profile.pk)
+        result = photo_processing.process_image(photo_processing.read_photo(stale))
+        self.profile.photo.save('second.jpg', ContentFile(self.image((300, 200), 'JPEG')))
+        before = self.files()
+
+        self.assertFalse(photo_processing.apply_result(stale, *result))
+        self.assertEqual(self.files(), before)
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.photo.name.endswith('second.jpg'))
+        self.assertFalse(self.profile.photo_thumbnail)
+
+
+class ImportCommandTests(TestCase):
+    """manage.py import_members / import_reservations"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+        self.location = Location.objects.create(name='会議室A', capacity=10)
+        self.slots = [TimeSlot.objects.create(start_time=time(hour, 0), end_time=time(hour, 30)) for hour in (10, 11)]
+        User.objects.create_user('taken@example.com', 'taken@example.com')
+
+    def write(self, header, rows):
+        path = self.dir / 'import.csv'
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows([header, *rows])
+        return path
+
+    def run_command(self, command, path, *args):
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(command, str(path), *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def members(self):
+        return self.write(['email', 'full_name'], [
+            ['a@example.com', '会員A'],
+            ['taken@example.com', '登録済み'],
+            ['A@example.com', '重複'],
+            ['b@example.com', '会員B'],
+        ])
+
+    def reservations(self):
+        return self.write(['date', 'start_time', 'location', 'customer_name', 'customer_email', 'status'], [
+            ['2030-01-07', '10:00', '会議室A', '先客と重複', 'x@example.com', ''],
+            ['2030-01-07', '11:00', '会議室A', 'テスト', 'taken@example.com', ''],
+            ['2030-01-07', '10:00', '会議室A', 'キャンセル済み', 'x@example.com', 'cancelled'],
+        ])
+
+    def book(self, slot, day=date(2030, 1, 7)):
+        return Reservation.objects.create(
+            location=self.location, time_slot=slot, date=day,
+            customer_name='先客', customer_email='other@example.com', status='confirmed',
+        )
+
+    def test_members_with_duplicate_emails(self):
+        out, err = self.run_command('import_members', self.members())
+        self.assertIn('会員 2件を取り込みました', out)
+        self.assertIn('3行目: 登録済みのメールアドレスです', err)
+        self.assertIn('4行目: ファイル内でメールアドレスが重複しています', err)
+        self.assertEqual(
+            sorted(MemberProfile.objects.values_list('user__email', 'full_name')),
+            [('a@example.com', '会員A'), ('b@example.com', '会員B')],
+        )
+        self.assertFalse(User.objects.get(email='a@example.com').has_usable_password())
+
+    def test_member_registered_during_import_rejects_only_that_row(self):
+        # 照合の後に同じメールアドレスが登録された（一意制約違反）
+        with mock.patch.object(imports, '_registered_emails', return_value=set()):
+            out, err = self.run_command('import_members', self.members(), '--batch-size', '10')
+        self.assertIn('会員 2件を取り込みました', out)
+        self.assertIn('3行目: taken@example.com を保存できませんでした', err)
+        self.assertEqual(MemberProfile.objects.count(), 2)
+
+    def test_members_dry_run(self):
+        out, _ = self.run_command('import_members', self.members(), '--dry-run')
+        self.assertIn('会員 2件を取り込めます', out)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_reservations_with_slot_conflict(self):
+        self.book(self.slots[0])
+        out, err = self.run_command('import_reservations', self.reservations())
+        self.assertIn('予約 2件を取り込みました', out)
+        self.assertIn('2行目:', err)
+        imported = Reservation.objects.exclude(customer_name='先客').order_by('time_slot__start_time')
+        self.assertEqual([r.status for r in imported], ['cancelled', 'confirmed'])
+        self.assertEqual(imported[1].created_by, User.objects.get(email='taken@example.com'))
+        self.assertEqual(DailyReservationStat.objects.get(date=date(2030, 1, 7)).confirmed_count, 2)
+
+    def test_slot_booked_during_import_rejects_only_that_row(self):
+        self.book(self.slots[0])
+        with mock.patch.object(imports, '_booked_slots', return_value=set()):
+            out, err = self.run_command('import_reservations', self.reservations())
+        self.assertIn('予約 2件を取り込みました', out)
+        self.assertIn('2行目:', err)
+        self.assertEqual(Reservation.objects.count(), 3)
+
+    def test_reservations_dry_run(self):
+        self.book(self.slots[0])
+        out, _ = self.run_command('import_reservations', self.reservations(), '--dry-run')
+        self.assertIn('予約 2件を取り込めます', out)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_export_data_file_can_be_imported_again(self):
+        for slot in self.slots:
+            self.book(slot, date(2030, 1, 8))
+        path = self.dir / 'export.csv'
+        call_command('export_data', 'reservations', '--output', str(path), stderr=StringIO())
+        fields = ('date', 'time_slot_id', 'customer_name', 'customer_email', 'status')
+        before = sorted(Reservation.objects.values_list(*fields))
+
+        # 同じ枠はすでに予約されている
+        out, err = self.run_command('import_reservations', path)
+        self.assertIn('予約 0件を取り込みました', out)
+        self.assertEqual(err.count('すでに予約されています'), 2)
+
+        Reservation.objects.all().delete()
+        out, _ = self.run_command('import_reservations', path)
+        self.assertIn('予約 2件を取り込みました', out)
+        self.assertEqual(sorted(Reservation.objects.values_list(*fields)), before)
+
+
+@override_settings(NO_SHOW_WINDOW_DAYS=1000)
+class ArchiveHistoryTests(TestCase):
+    """古い予約・入退室記録のアーカイブ（archive.py）"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.cutoff = self.today - timedelta(days=365)
+        old = self.today - timedelta(days=400)
+        recent = self.today - timedelta(days=10)
+        self.location = Location.objects.create(name='会議室A', capacity=10)
+        slots = [TimeSlot.objects.create(start_time=time(hour, 0), end_time=time(hour, 30)) for hour in range(9, 14)]
+        self.user = User.objects.create_user('member', 'member@example.com', 'pw')
+        self.profile = MemberProfile.objects.create(user=self.user, full_name='会員', gender='other')
+
+        def reserve(slot, day):
+            return Reservation.objects.create(
+                location=self.location, time_slot=slot, date=day, customer_name='会員',
+                customer_email='member@example.com', status='confirmed', created_by=self.user,
+            )
+
+        def visit(day, reservation=None, billed_amount=None):
+            return VisitRecord.objects.create(
+                member_profile=self.profile, location=self.location, date=day, reservation=reservation,
+                entry_at=timezone.now(), billed_amount=billed_amount,
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.old_reservations = [reserve(slot, old - timedelta(days=i)) for i, slot in enumerate(slots)]
+            # 来場あり: 予約に紐付いた入退室記録と、同じ日の入退室記録
+            visit(self.old_reservations[0].date, self.old_reservations[0], 500)
+            visit(self.old_reservations[1].date, billed_amount=300)
+            # 決済から参照されている予約と、まだアーカイブしない入退室記録から参照されている予約
+            self.paid = self.old_reservations[3]
+            PaymentTransaction.objects.create(reservation=self.paid, amount=1000, status='completed')
+            self.linked = self.old_reservations[4]
+            visit(recent, self.linked)
+            self.recent = reserve(slots[0], recent)
+        no_shows.detect(old - timedelta(days=10), self.today)
+
+    def archive(self, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive.archive_history(self.cutoff, **options)
+
+    def snapshot(self):
+        no_shows.update_member_counts()
+        self.profile.refresh_from_db()
+        return {
+            'stats': sorted(DailyReservationStat.objects.values_list(
+                'date', 'location_id', 'reservation_count', 'confirmed_count', 'visit_count', 'billed_amount',
+            )),
+            'recent': [(r.pk, r.date) for r in archive.recent_reservations(self.user)],
+            'no_show_count': self.profile.no_show_count,
+        }
+
+    def test_archive_resumes_in_batches(self):
+        self.assertEqual(self.archive(batch_size=1, max_batches=1), (1, 1))
+        self.assertEqual((ArchivedVisitRecord.objects.count(), ArchivedReservation.objects.count()), (1, 1))
+        # 続きから移す（移した行は対象から外れている）
+        self.assertEqual(self.archive(batch_size=1), (1, 2))
+        self.assertEqual(self.archive(), (0, 0))
+        self.assertFalse(Reservation.objects.filter(pk__in=[r.pk for r in self.old_reservations[:3]]).exists())
+
+    def test_referenced_reservations_are_kept(self):
+        self.archive()
+        self.assertEqual(
+            set(ArchivedReservation.objects.values_list('pk', flat=True)),
+            {r.pk for r in self.old_reservations[:3]},
+        )
+        self.assertEqual(
+            set(Reservation.objects.values_list('pk', flat=True)), {self.paid.pk, self.linked.pk, self.recent.pk},
+        )
+        self.assertTrue(PaymentTransaction.objects.filter(reservation=self.paid).exists())
+        self.assertTrue(VisitRecord.objects.filter(reservation=self.linked).exists())
+
+    def test_reports_are_unchanged(self):
+        before = self.snapshot()
+        self.assertEqual(before['no_show_count'], 2)
+        self.archive()
+        self.assertEqual(self.snapshot(), before)
+        self.assertTrue(any(isinstance(r, ArchivedReservation) for r in archive.recent_reservations(self.user)))
+        daily_stats.rebuild()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_recent_cutoff_is_rejected(self):
+        with self.assertRaises(ValueError):
+            archive.archive_history(self.today)
+        with self.assertRaises(CommandError):
+            call_command('archive_history', '--before', self.today.isoformat(), stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('archive_history', '--days', '30', stdout=StringIO())
+        self.assertFalse(ArchivedReservation.objects.exists())
+
+
+class EmailRenderingTests(SimpleTestCase):
+    """メールの件名・テキスト・HTML の描画（email_rendering）"""
+
+    NAME = 'A&B <会議室>'
+
+    def contexts(self):
+        plan = SimpleNamespace(name='一般会員')
+        user = SimpleNamespace(username='member', email='member@example.com')
+        profile = SimpleNamespace(full_name=self.NAME, plan=plan, user=user, created_at=datetime(2025, 4, 1, 10, 0))
+        location = SimpleNamespace(name=self.NAME)
+        slot = SimpleNamespace(start_time=time(10, 0), end_time=time(10, 30))
+        reservation = SimpleNamespace(date=date(2025, 4, 1), time_slot=slot, location=location)
+        common = {'site_url': 'https://example.com/?a=1&b=2'}
+        return {
+            'registration_complete': {**common, 'user': user, 'profile': profile},
+            'registration_admin_notice': {**common, 'user': user, 'profile': profile},
+            'registration_admin_digest': {**common, 'profiles': [profile]},
+            'reservation_confirmed': {
+                **common, 'customer_name': self.NAME, 'reservations': [reservation], 'total_amount': 1000,
+            },
+        }
+
+    def test_every_email_renders_without_escaping_plain_text(self):
+        for name, context in self.contexts().items():
+            with self.subTest(name):
+                mail = render_email(name, context)
+                self.assertTrue(mail.subject)
+                self.assertNotIn('\n', mail.subject)
+                self.assertNotIn('&amp;', mail.subject + mail.text)
+                self.assertIn(self.NAME, mail.text)
+                self.assertIn('https://example.com/?a=1&b=2', mail.text)
+                self.assertIn('A&amp;B &lt;会議室&gt;', mail.html)
+        mail = render_email('reservation_confirmed', self.contexts()['reservation_confirmed'])
+        self.assertIn(self.NAME, mail.subject)
+
+    def test_engine_loads_the_site_tag_libraries(self):
+        template = email_engine().from_string('{% load static %}{% static "logo.png" %}')
+        self.assertEqual(template.render(Context()), f'{settings.STATIC_URL}logo.png')
+
+
+class StartupImportTests(SimpleTestCase):
+    """
+    起動時（URL 設定・WSGI アプリ・ジョブハンドラの読み込み）の import を python -X importtime で計測する。
+    重い任意依存（Square SDK・qrcode・Pillow）とビューのモジュールは最初に使うときまで読み込まないこと。
+    """
+
+    # 起動時の import に使ってよい時間（各モジュールの self 時間の合計）。遅い CI でも通る程度に余裕を持たせる
+    IMPORT_BUDGET_MS = 2000
+    # ビューのモジュールも URL に最初にアクセスするまで読み込まない
+    LAZY_MODULES = ['square', 'qrcode', 'PIL'] + [f'reservations.views.{name}' for name in VIEW_MODULES]
+    SCRIPT = (
+        'import django; django.setup()\n'
+        'from django.urls import get_resolver; get_resolver().url_patterns\n'
+        'from reservation_system.wsgi import application\n'
+        'from reservations import jobs; jobs._load_handlers()\n'
+    )
+
+    def measure(self):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'reservation_system.settings'}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', self.SCRIPT],
+            cwd=Path(settings.BASE_DIR), env=env, capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, _, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(self_us)
+        return modules
+
+    def test_heavy_dependencies_are_not_imported_at_startup(self):
+        modules = self.measure()
+        for name in self.LAZY_MODULES:
+            loaded = sorted(m for m in modules if m == name or m.startswith(f'{name}.'))
+            self.assertEqual(loaded, [], f'{name} が起動時に読み込まれています')
+        total_ms = sum(modules.values()) / 1000
+        self.assertLess(total_ms, self.IMPORT_BUDGET_MS, f'起動時の import に {total_ms:.0f}ms かかっています')
@@ -1,59 +1,69 @@
 from django.urls import path
-from django.contrib.auth.views import LoginView, LogoutView
-from . import views
+from django.contrib.auth.views import LogoutView
+
+from .views import lazy
 
 app_name = 'reservations'
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('locations/', views.location_list, name='location_list'),
-    path('reservations/', views.reservation_list, name='reservation_list'),
-    path('my-reservations/', views.my_reservations, name='my_reservations'),
-    path('reservations/create/', views.reservation_create, name='reservation_create'),
-    path('reservations/confirm/', views.reservation_confirm, name='reservation_confirm'),
-    path('reservations/confirm/submit/', views.reservation_confirm_submit, name='reservation_confirm_submit'),
-    path('reservations/<int:pk>/', views.reservation_detail, name='reservation_detail'),
-    path('reservations/<int:pk>/edit/', views.reservation_edit, name='reservation_edit'),
-    path('reservations/<int:pk>/delete/', views.reservation_delete, name='reservation_delete'),
-    path('check-availability/', views.check_availability, name='check_availability'),
-    path('reservations/weekly-calendar/', views.reservation_weekly_calendar, name='reservation_weekly_calendar'),
+    path('', lazy('index'), name='index'),
+    path('locations/', lazy('location_list'), name='location_list'),
+    path('reservations/', lazy('reservation_list'), name='reservation_list'),
+    path('my-reservations/', lazy('my_reservations'), name='my_reservations'),
+    path('reservations/create/', lazy('reservation_create'), name='reservation_create'),
+    path('reservations/confirm/', lazy('reservation_confirm'), name='reservation_confirm'),
+    path('reservations/confirm/submit/', lazy('reservation_confirm_submit'), name='reservation_confirm_submit'),
+    path('reservations/<int:pk>/', lazy('reservation_detail'), name='reservation_detail'),
+    path('reservations/<int:pk>/edit/', lazy('reservation_edit'), name='reservation_edit'),
+    path('reservations/<int:pk>/delete/', lazy('reservation_delete'), name='reservation_delete'),
+    path('reservations/series/create/', lazy('reservation_series_create'), name='reservation_series_create'),
+    path('reservations/series/<int:pk>/', lazy('reservation_series_detail'), name='reservation_series_detail'),
+    path('reservations/series/<int:pk>/cancel/', lazy('reservation_series_cancel'), name='reservation_series_cancel'),
+    path('check-availability/', lazy('check_availability'), name='check_availability'),
+    path('reservations/weekly-calendar/', lazy('reservation_weekly_calendar'), name='reservation_weekly_calendar'),
     path(
         'reservations/weekly-calendar/delete-all/',
-        views.reservation_weekly_calendar_delete_all,
+        lazy('reservation_weekly_calendar_delete_all'),
         name='reservation_weekly_calendar_delete_all',
     ),
-    path('check-weekly-availability/', views.check_weekly_availability, name='check_weekly_availability'),
-    path('dashboard/', views.admin_dashboard, name='admin_dashboard'),
-    path('visit-management/', views.visit_management, name='visit_management'),
-    path('api/visit/entry/', views.visit_api_entry, name='visit_api_entry'),
-    path('api/visit/exit/preview/', views.visit_api_exit_preview, name='visit_api_exit_preview'),
-    path('api/visit/exit/confirm/', views.visit_api_exit_confirm, name='visit_api_exit_confirm'),
-    path('location-management/', views.location_management, name='location_management'),
-    path('location-management/add/', views.location_add, name='location_add'),
-    path('locations/<int:pk>/edit/', views.location_edit, name='location_edit'),
-    path('locations/<int:pk>/delete/', views.location_delete, name='location_delete'),
-    path('time-slot-management/', views.time_slot_management, name='time_slot_management'),
-    path('time-slot-management/add/', views.time_slot_add, name='time_slot_add'),
-    path('time-slots/<int:pk>/edit/', views.time_slot_edit, name='time_slot_edit'),
-    path('time-slots/<int:pk>/delete/', views.time_slot_delete, name='time_slot_delete'),
-    path('plan-management/', views.plan_management, name='plan_management'),
-    path('plan-management/add/', views.plan_add, name='plan_add'),
-    path('plans/<int:pk>/edit/', views.plan_edit, name='plan_edit'),
-    path('plans/<int:pk>/delete/', views.plan_delete, name='plan_delete'),
-    path('user-management/', views.user_management, name='user_management'),
-    path('users/<int:pk>/', views.user_detail, name='user_detail'),
-    path('users/<int:pk>/edit/', views.user_edit, name='user_edit'),
-    path('users/<int:pk>/delete/', views.user_delete, name='user_delete'),
-    path('login/', views.custom_login, name='custom_login'),
+    path('check-weekly-availability/', lazy('check_weekly_availability'), name='check_weekly_availability'),
+    path('dashboard/', lazy('admin_dashboard'), name='admin_dashboard'),
+    path('dashboard/analytics/', lazy('analytics_report'), name='analytics_report'),
+    path('dashboard/export/', lazy('data_export'), name='data_export'),
+    path('visit-management/', lazy('visit_management'), name='visit_management'),
+    path('api/visit/entry/', lazy('visit_api_entry'), name='visit_api_entry'),
+    path('api/visit/exit/preview/', lazy('visit_api_exit_preview'), name='visit_api_exit_preview'),
+    path('api/visit/exit/confirm/', lazy('visit_api_exit_confirm'), name='visit_api_exit_confirm'),
+    path('location-management/', lazy('location_management'), name='location_management'),
+    path('location-management/add/', lazy('location_add'), name='location_add'),
+    path('locations/<int:pk>/edit/', lazy('location_edit'), name='location_edit'),
+    path('locations/<int:pk>/delete/', lazy('location_delete'), name='location_delete'),
+    path('time-slot-management/', lazy('time_slot_management'), name='time_slot_management'),
+    path('time-slot-management/add/', lazy('time_slot_add'), name='time_slot_add'),
+    path('time-slots/<int:pk>/edit/', lazy('time_slot_edit'), name='time_slot_edit'),
+    path('time-slots/<int:pk>/delete/', lazy('time_slot_delete'), name='time_slot_delete'),
+    path('plan-management/', lazy('plan_management'), name='plan_management'),
+    path('plan-management/add/', lazy('plan_add'), name='plan_add'),
+    path('plans/<int:pk>/edit/', lazy('plan_edit'), name='plan_edit'),
+    path('plans/<int:pk>/delete/', lazy('plan_delete'), name='plan_delete'),
+    path('user-management/', lazy('user_management'), name='user_management'),
+    path('users/<int:pk>/', lazy('user_detail'), name='user_detail'),
+    path('users/<int:pk>/edit/', lazy('user_edit'), name='user_edit'),
+    path('users/<int:pk>/delete/', lazy('user_delete'), name='user_delete'),
+    path('login/', lazy('custom_login'), name='custom_login'),
     path('logout/', LogoutView.as_view(next_page='reservations:index'), name='logout'),
-    path('api/calendar/events/', views.get_calendar_events, name='calendar_events'),
-    path('member-registration/', views.member_registration, name='member_registration'),
-    path('member-registration/simple/', views.member_registration_simple, name='member_registration_simple'),
-    path('user-profile/', views.user_profile, name='user_profile'),
-    path('member-qr/', views.member_qr_page, name='member_qr_page'),
-    path('user-profile/member-qr.png', views.member_qr_image, name='member_qr_image'),
-    path('payment/create/', views.payment_create, name='payment_create'),
-    path('payment/create/<int:reservation_id>/', views.payment_create, name='payment_create_reservation'),
-    path('payment/complete/', views.payment_complete, name='payment_complete'),
-    path('webhooks/square/', views.square_webhook, name='square_webhook'),
+    path('api/calendar/events/', lazy('get_calendar_events'), name='calendar_events'),
+    path('api/calendar/feed/<str:token>.ics', lazy('calendar_ics_feed'), name='calendar_ics_feed'),
+    path('member-registration/', lazy('member_registration'), name='member_registration'),
+    path('member-registration/simple/', lazy('member_registration_simple'), name='member_registration_simple'),
+    path('user-profile/', lazy('user_profile'), name='user_profile'),
+    path('member-qr/', lazy('member_qr_page'), name='member_qr_page'),
+    path('user-profile/member-qr.png', lazy('member_qr_image'), name='member_qr_image'),
+    path('user-profile/member-qr/<slug:version>.svg', lazy('member_qr_image'), name='member_qr_image_versioned'),
+    path('payment/create/', lazy('payment_create'), name='payment_create'),
+    path('payment/create/<int:reservation_id>/', lazy('payment_create'), name='payment_create_reservation'),
+    path('payment/complete/', lazy('payment_complete'), name='payment_complete'),
+    path('webhooks/square/', lazy('square_webhook'), name='square_webhook'),
+    path('api/square/metrics/', lazy('square_metrics'), name='square_metrics'),
+    path('api/memory/', lazy('memory_report'), name='memory_report'),
 ]
@@ -0,0 +1,93 @@
+"""
+画面・API のビュー。機能ごとのモジュールに分け、URL 設定からは lazy() で参照する。
+
+各モジュールは、そのモジュールの URL に最初にアクセスしたときに読み込まれる
+（ワーカーが使わない機能のコードとその依存を読み込まずに済む）。
+既存コードとの互換のため、reservations.views.<ビュー名> でも参照できる（参照した時点で該当モジュールを読み込む）。
+"""
+from functools import update_wrapper
+from importlib import import_module
+
+# ビュー名 → 定義しているモジュール（reservations.views.<モジュール>）
+VIEW_MODULES = {
+    'booking': [
+        'index', 'my_reservations', 'location_list', 'reservation_create', 'reservation_confirm',
+        'reservation_confirm_submit', 'reservation_detail', 'reservation_edit', 'reservation_delete',
+    ],
+    'series': ['reservation_series_create', 'reservation_series_detail', 'reservation_series_cancel'],
+    'calendar': [
+        'get_calendar_events', 'calendar_ics_feed', 'check_availability', 'reservation_weekly_calendar',
+        'reservation_weekly_calendar_delete_all', 'check_weekly_availability',
+    ],
+    'admin': [
+        'reservation_list', 'admin_dashboard',
+        'location_management', 'location_add', 'location_edit', 'location_delete',
+        'time_slot_management', 'time_slot_add', 'time_slot_edit', 'time_slot_delete',
+        'plan_management', 'plan_add', 'plan_edit', 'plan_delete',
+        'user_management', 'user_detail', 'user_edit', 'user_delete',
+        'analytics_report', 'data_export', 'memory_report',
+    ],
+    'members': [
+        'custom_login', 'member_registration_simple', 'member_registration', 'user_profile',
+        'member_qr_page', 'member_qr_image',
+    ],
+    'visits': ['visit_management', 'visit_api_entry', 'visit_api_exit_preview', 'visit_api_exit_confirm'],
+    'payments': [
+        'square_payments_enabled', 'get_square_client', 'create_payment_link',
+        'payment_create', 'payment_complete', 'square_webhook', 'square_metrics',
+    ],
+}
+_MODULE_OF = {name: module for module, names in VIEW_MODULES.items() for name in names}
+
+
+def _resolve(name):
+    return getattr(import_module(f'{__name__}.{_MODULE_OF[name]}'), name)
+
+
+class LazyView:
+    """
+    最初に呼び出されたときにビューのモジュールを読み込むラッパー。
+    csrf_exempt などビューに付いた属性は、参照された時点で読み込んだビューから返す。
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._view = None
+        self.__name__ = self.__qualname__ = name
+        self.__module__ = f'{__name__}.{_MODULE_OF[name]}'
+
+    def _load(self):
+        if self._view is None:
+            self._view = _resolve(self._name)
+            update_wrapper(self, self._view)
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self._load()(request, *args, **kwargs)
+
+    def __getattr__(self, attr):
+        # インスタンスに無い属性だけがここに来る
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f'<LazyView {self.__module__}.{self._name}>'
+
+
+_lazy_views = {}
+
+
+def lazy(name):
+    """URL 設定用。name のビューを最初の呼び出しまで読み込まないラッパーを返す。"""
+    if name not in _MODULE_OF:
+        raise ValueError(f'未登録のビューです: {name}')
+    if name not in _lazy_views:
+        _lazy_views[name] = LazyView(name)
+    return _lazy_views[name]
+
+
+def __getattr__(name):
+    if name in _MODULE_OF:
+        return _resolve(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
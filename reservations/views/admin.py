@@ -0,0 +1,490 @@
+"""管理者向けの画面（ダッシュボード・予約一覧・場所・時間帯・プラン・ユーザー管理）。"""
+from django.conf import settings
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+from datetime import date, timedelta
+from ..models import Location, TimeSlot, Reservation, Plan, MemberProfile
+from ..forms import ReservationSearchForm, LocationForm, TimeSlotForm, PlanForm, AdminUserEditForm, AnalyticsPeriodForm, DataExportForm
+from ..decorators import superuser_required
+from .. import analytics, archive, daily_stats, exports, memory_profiling
+from .common import group_consecutive_reservations
+
+
+@login_required
+@superuser_required
+def reservation_list(request):
+    """予約一覧（スーパーユーザーのみ）"""
+    form = ReservationSearchForm(request.GET)
+    reservations = Reservation.objects.all()
+    
+    if form.is_valid():
+        location = form.cleaned_data.get('location')
+        reservation_date = form.cleaned_data.get('date')
+        time_slot = form.cleaned_data.get('time_slot')
+        
+        if location:
+            reservations = reservations.filter(location=location)
+        if reservation_date:
+            reservations = reservations.filter(date=reservation_date)
+        if time_slot:
+            reservations = reservations.filter(time_slot=time_slot)
+    
+    # 連続予約をまとめる
+    reservations_list = list(reservations.order_by('date', 'location', 'customer_email', 'time_slot__start_time'))
+    grouped_reservations = group_consecutive_reservations(reservations_list)
+    
+    # ページネーション
+    paginator = Paginator(grouped_reservations, 20)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    return render(request, 'reservations/reservation_list.html', {
+        'page_obj': page_obj,
+        'form': form
+    })
+
+
+@login_required
+@superuser_required
+def admin_dashboard(request):
+    """管理者ダッシュボード"""
+    # 今日・今月の予約数（日別集計から）
+    today = date.today()
+    counts = daily_stats.reservation_counts(today)
+    
+    # 最近の予約（最新5件）
+    recent_reservations = Reservation.objects.order_by('-created_at')[:5]
+    
+    # 場所別の予約数
+    location_stats = daily_stats.locations_with_reservation_count()
+    
+    # 今週の予約
+    week_start = today - timedelta(days=today.weekday())
+    week_reservations = Reservation.objects.filter(
+        date__gte=week_start,
+        date__lte=week_start + timedelta(days=6)
+    ).order_by('date', 'time_slot__start_time')
+    
+    context = {
+        'today_reservations': counts['today'],
+        'month_reservations': counts['month'],
+        'recent_reservations': recent_reservations,
+        'location_stats': location_stats,
+        'week_reservations': week_reservations,
+    }
+    
+    return render(request, 'reservations/admin_dashboard.html', context)
+
+
+@login_required
+@superuser_required
+def location_management(request):
+    """場所管理（管理者のみ）"""
+    try:
+        locations = Location.objects.all()
+        return render(request, 'reservations/location_management.html', {
+            'locations': locations
+        })
+    except Exception as e:
+        print(f"Debug: Error in location_management - {str(e)}")
+        messages.error(request, f'場所管理画面の読み込み中にエラーが発生しました: {str(e)}')
+        return redirect('reservations:admin_dashboard')
+
+
+@login_required
+@superuser_required
+def location_add(request):
+    """場所追加（管理者のみ）"""
+    if request.method == 'POST':
+        form = LocationForm(request.POST)
+        if form.is_valid():
+            form.save()
+            messages.success(request, '場所が正常に追加されました。')
+            return redirect('reservations:location_management')
+    else:
+        form = LocationForm()
+    
+    return render(request, 'reservations/location_form.html', {
+        'form': form,
+        'title': '場所追加'
+    })
+
+
+@login_required
+@superuser_required
+def location_edit(request, pk):
+    """場所編集（管理者のみ）"""
+    location = get_object_or_404(Location, pk=pk)
+    if request.method == 'POST':
+        form = LocationForm(request.POST, instance=location)
+        if form.is_valid():
+            form.save()
+            messages.success(request, '場所が正常に更新されました。')
+            return redirect('reservations:location_management')
+    else:
+        form = LocationForm(instance=location)
+    
+    return render(request, 'reservations/location_form.html', {
+        'form': form,
+        'title': '場所編集',
+        'location': location
+    })
+
+
+@login_required
+@superuser_required
+def location_delete(request, pk):
+    """場所削除（管理者のみ）"""
+    location = get_object_or_404(Location, pk=pk)
+    if request.method == 'POST':
+        location.delete()
+        messages.success(request, '場所が正常に削除されました。')
+        return redirect('reservations:location_management')
+    
+    return render(request, 'reservations/location_confirm_delete.html', {
+        'location': location
+    })
+
+
+@login_required
+@superuser_required
+def time_slot_management(request):
+    """時間枠管理"""
+    time_slots = TimeSlot.objects.all().order_by('start_time')
+    return render(request, 'reservations/time_slot_management.html', {
+        'time_slots': time_slots
+    })
+
+
+@login_required
+@superuser_required
+def time_slot_add(request):
+    """時間枠追加"""
+    if request.method == 'POST':
+        form = TimeSlotForm(request.POST)
+        if form.is_valid():
+            form.save()
+            messages.success(request, '時間枠を追加しました。')
+            return redirect('reservations:time_slot_management')
+    else:
+        form = TimeSlotForm()
+    
+    return render(request, 'reservations/time_slot_form.html', {
+        'form': form,
+        'title': '時間枠追加'
+    })
+
+
+@login_required
+@superuser_required
+def time_slot_edit(request, pk):
+    """時間枠編集"""
+    time_slot = get_object_or_404(TimeSlot, pk=pk)
+    
+    if request.method == 'POST':
+        form = TimeSlotForm(request.POST, instance=time_slot)
+        if form.is_valid():
+            form.save()
+            messages.success(request, '時間枠を更新しました。')
+            return redirect('reservations:time_slot_management')
+    else:
+        form = TimeSlotForm(instance=time_slot)
+    
+    return render(request, 'reservations/time_slot_form.html', {
+        'form': form,
+        'title': '時間枠編集',
+        'time_slot': time_slot
+    })
+
+
+@login_required
+@superuser_required
+def time_slot_delete(request, pk):
+    """時間枠削除"""
+    time_slot = get_object_or_404(TimeSlot, pk=pk)
+    
+    # 既存の予約があるかチェック
+    existing_reservations = Reservation.objects.filter(time_slot=time_slot)
+    
+    if request.method == 'POST':
+        if existing_reservations.exists():
+            messages.error(request, f'この時間枠には {existing_reservations.count()} 件の予約があります。削除できません。')
+        else:
+            time_slot.delete()
+            messages.success(request, '時間枠を削除しました。')
+        return redirect('reservations:time_slot_management')
+    
+    return render(request, 'reservations/time_slot_confirm_delete.html', {
+        'time_slot': time_slot,
+        'existing_reservations': existing_reservations
+    })
+
+
+@login_required
+@superuser_required
+def plan_management(request):
+    """プラン管理（管理者のみ）"""
+    try:
+        plans = Plan.objects.all().order_by('price')
+        return render(request, 'reservations/plan_management.html', {
+            'plans': plans
+        })
+    except Exception as e:
+        print(f"Debug: Error in plan_management - {str(e)}")
+        messages.error(request, f'プラン管理画面の読み込み中にエラーが発生しました: {str(e)}')
+        return redirect('reservations:admin_dashboard')
+
+
+@login_required
+@superuser_required
+def plan_add(request):
+    """プラン追加（管理者のみ）"""
+    if request.method == 'POST':
+        form = PlanForm(request.POST)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'プランが正常に追加されました。')
+            return redirect('reservations:plan_management')
+    else:
+        form = PlanForm()
+    
+    return render(request, 'reservations/plan_form.html', {
+        'form': form,
+        'title': 'プラン追加'
+    })
+
+
+@login_required
+@superuser_required
+def plan_edit(request, pk):
+    """プラン編集（管理者のみ）"""
+    plan = get_object_or_404(Plan, pk=pk)
+    if request.method == 'POST':
+        form = PlanForm(request.POST, instance=plan)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'プランが正常に更新されました。')
+            return redirect('reservations:plan_management')
+    else:
+        form = PlanForm(instance=plan)
+    
+    return render(request, 'reservations/plan_form.html', {
+        'form': form,
+        'title': 'プラン編集',
+        'plan': plan
+    })
+
+
+@login_required
+@superuser_required
+def plan_delete(request, pk):
+    """プラン削除（管理者のみ）"""
+    plan = get_object_or_404(Plan, pk=pk)
+    
+    # 既存の会員プロファイルがあるかチェック
+    existing_profiles = MemberProfile.objects.filter(plan=plan)
+    
+    if request.method == 'POST':
+        if existing_profiles.exists():
+            messages.error(request, f'このプランを使用している会員が {existing_profiles.count()} 名います。削除できません。')
+        else:
+            plan.delete()
+            messages.success(request, 'プランが正常に削除されました。')
+        return redirect('reservations:plan_management')
+    
+    return render(request, 'reservations/plan_confirm_delete.html', {
+        'plan': plan,
+        'existing_profiles': existing_profiles
+    })
+
+
+@login_required
+@superuser_required
+def user_management(request):
+    """ユーザー管理（管理者のみ）"""
+    try:
+        # すべてのユーザーを取得
+        users = User.objects.all().order_by('-date_joined')
+        # 各ユーザーのMemberProfileを取得
+        users_with_profiles = []
+        for user in users:
+            try:
+                profile = MemberProfile.objects.get(user=user)
+            except MemberProfile.DoesNotExist:
+                profile = None
+            users_with_profiles.append({
+                'user': user,
+                'profile': profile
+            })
+        return render(request, 'reservations/user_management.html', {
+            'users_with_profiles': users_with_profiles
+        })
+    except Exception as e:
+        print(f"Debug: Error in user_management - {str(e)}")
+        messages.error(request, f'ユーザー管理画面の読み込み中にエラーが発生しました: {str(e)}')
+        return redirect('reservations:admin_dashboard')
+
+
+@login_required
+@superuser_required
+def user_detail(request, pk):
+    """ユーザー詳細（管理者のみ）"""
+    user = get_object_or_404(User, pk=pk)
+    
+    # MemberProfileを取得または作成
+    try:
+        profile = MemberProfile.objects.get(user=user)
+    except MemberProfile.DoesNotExist:
+        # MemberProfileが存在しない場合は作成
+        profile = MemberProfile.objects.create(
+            user=user,
+            full_name=user.get_full_name() or user.username,
+            gender='other',
+            phone='',
+        )
+    
+    # ユーザーの予約履歴（アーカイブ済みの予約を含む）
+    reservations = archive.recent_reservations(user, 10)
+    
+    return render(request, 'reservations/user_detail.html', {
+        'member_user': user,
+        'profile': profile,
+        'reservations': reservations,
+        'no_show_window_days': getattr(settings, 'NO_SHOW_WINDOW_DAYS', 180),
+    })
+
+
+@login_required
+@superuser_required
+def user_edit(request, pk):
+    """ユーザー編集（管理者のみ）"""
+    user = get_object_or_404(User, pk=pk)
+    
+    # MemberProfileを取得または作成
+    try:
+        profile = MemberProfile.objects.get(user=user)
+    except MemberProfile.DoesNotExist:
+        profile = MemberProfile.objects.create(
+            user=user,
+            full_name=user.get_full_name() or user.username,
+            gender='other',
+            phone='',
+        )
+    
+    if request.method == 'POST':
+        form = AdminUserEditForm(request.POST, user=user, profile=profile)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'ユーザー情報が正常に更新しました。')
+            return redirect('reservations:user_detail', pk=user.pk)
+    else:
+        form = AdminUserEditForm(user=user, profile=profile)
+    
+    return render(request, 'reservations/user_edit.html', {
+        'form': form,
+        'member_user': user,
+        'profile': profile,
+    })
+
+
+@login_required
+@superuser_required
+def user_delete(request, pk):
+    """ユーザー削除（管理者のみ）"""
+    target_user = get_object_or_404(User, pk=pk)
+    try:
+        profile = MemberProfile.objects.get(user=target_user)
+    except MemberProfile.DoesNotExist:
+        profile = None
+
+    if request.method == 'POST':
+        if target_user.pk == request.user.pk:
+            messages.error(request, '自分自身のアカウントは削除できません。')
+            return redirect('reservations:user_detail', pk=pk)
+        if target_user.is_superuser:
+            other_super = User.objects.filter(is_superuser=True).exclude(pk=target_user.pk).exists()
+            if not other_super:
+                messages.error(request, '最後の管理者アカウントは削除できません。')
+                return redirect('reservations:user_detail', pk=pk)
+        label = target_user.username
+        target_user.delete()
+        messages.success(request, f'ユーザー「{label}」を削除しました。')
+        return redirect('reservations:user_management')
+
+    reservation_count = Reservation.objects.filter(created_by=target_user).count()
+    return render(request, 'reservations/user_confirm_delete.html', {
+        'target_user': target_user,
+        'profile': profile,
+        'reservation_count': reservation_count,
+    })
+
+
+@login_required
+@superuser_required
+def analytics_report(request):
+    """分析レポート（時間枠ごとの予約率・プラン別／場所別の売上・無断キャンセル率）"""
+    start, end = analytics.default_period()
+    form = AnalyticsPeriodForm(request.GET or {'start': start, 'end': end})
+    context = {'form': form, 'weekdays': analytics.WEEKDAYS}
+    if form.is_valid():
+        data = analytics.report(form.cleaned_data['start'], form.cleaned_data['end'])
+        context.update(data, revenue_tables=[
+            ('プラン別の売上', data['revenue_by_plan']),
+            ('場所別の売上', data['revenue_by_location']),
+        ])
+    return render(request, 'reservations/analytics_report.html', context)
+
+
+@login_required
+@superuser_required
+def data_export(request):
+    """予約・入退室記録・決済の CSV 出力。条件を指定すると CSV を少しずつ返す（何年分でもメモリを使わない）"""
+    form = DataExportForm(request.GET or None)
+    if not form.is_valid():
+        return render(request, 'reservations/data_export.html', {'form': form})
+
+    location = form.cleaned_data['location']
+    filters = exports.ExportFilter(
+        start_date=form.cleaned_data['start'],
+        end_date=form.cleaned_data['end'],
+        location_id=location.pk if location else None,
+    )
+    dataset = form.cleaned_data['dataset']
+    response = StreamingHttpResponse(exports.iter_csv(dataset, filters), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{exports.filename(dataset, filters)}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@superuser_required
+@require_http_methods(['GET', 'POST'])
+def memory_report(request):
+    """
+    このワーカープロセスのメモリの状況（RSS・tracemalloc のスナップショット・ビューごとの確保量）。
+    GET ?limit=件数&diff=1 で基準スナップショットとの差分。POST action=start|stop|baseline|reset で計測を操作する。
+    """
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'start':
+            memory_profiling.start_tracing()
+        elif action == 'stop':
+            memory_profiling.stop_tracing()
+        elif action == 'baseline':
+            memory_profiling.take_baseline()
+        elif action == 'reset':
+            memory_profiling.view_stats.reset()
+        else:
+            return JsonResponse({'error': 'action は start / stop / baseline / reset のいずれかです'}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 200)
+    except ValueError:
+        limit = 20
+    data = memory_profiling.snapshot(limit=limit, diff=request.GET.get('diff') == '1')
+    data['views'] = memory_profiling.view_stats.snapshot()
+    return JsonResponse(data)
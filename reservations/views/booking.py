@@ -0,0 +1,1355 @@
+"""予約の作成・確認・詳細・編集・削除と、トップページ・マイ予約。"""
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db.models import Q
+from datetime import date, datetime, timedelta
+from ..models import Location, TimeSlot, Reservation, ReservationSeries, BookingGroup, PaymentTransaction
+from ..forms import ReservationForm
+from .. import booking_drafts, daily_stats, series
+from ..time_slot_merge import merge_consecutive_time_slot_details, merge_consecutive_time_slots_for_display
+from .common import _consecutive_reservations_group, _reservation_form_back_url, group_consecutive_reservations
+from .payments import create_payment_link, square_payments_enabled
+
+
+def index(request):
+    """予約システムのトップページ"""
+    locations = Location.objects.filter(is_active=True)
+    context = {
+        'locations': locations
+    }
+    
+    # ログイン時は管理者向けの統計データを追加
+    if request.user.is_authenticated:
+        today = date.today()
+        
+        # 今日・今月・最近（過去7日間）の予約数（日別集計から）
+        counts = daily_stats.reservation_counts(today)
+        
+        # 利用可能な場所数
+        location_count = locations.count()
+        
+        # ログインユーザーの予約一覧を取得（未来の予約のみ、確認済み・保留中のみ）
+        user_reservations = Reservation.objects.filter(
+            Q(created_by=request.user) | Q(customer_email=request.user.email),
+            date__gte=today,
+            status__in=['confirmed', 'pending']
+        ).select_related('location', 'time_slot').order_by('date', 'time_slot__start_time')
+        
+        # 連続予約をまとめる
+        grouped_user_reservations = group_consecutive_reservations(list(user_reservations))
+        
+        context.update({
+            'today_reservations': counts['today'],
+            'month_reservations': counts['month'],
+            'location_count': location_count,
+            'recent_count': counts['recent'],
+            'user_reservations': grouped_user_reservations,
+        })
+    
+    return render(request, 'reservations/index.html', context)
+
+
+@login_required
+def my_reservations(request):
+    """マイ予約一覧"""
+    today = date.today()
+    
+    # ログインユーザーの予約一覧を取得（未来の予約のみ、確認済み・保留中のみ）
+    user_reservations = Reservation.objects.filter(
+        Q(created_by=request.user) | Q(customer_email=request.user.email),
+        date__gte=today,
+        status__in=['confirmed', 'pending']
+    ).select_related('location', 'time_slot').order_by('date', 'time_slot__start_time')
+    
+    # 連続予約をまとめる
+    grouped_user_reservations = group_consecutive_reservations(list(user_reservations))
+    
+    # ページネーション
+    paginator = Paginator(grouped_user_reservations, 20)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    return render(request, 'reservations/my_reservations.html', {
+        'page_obj': page_obj,
+        'user_reservations': grouped_user_reservations,
+    })
+
+
+def location_list(request):
+    """場所一覧"""
+    locations = Location.objects.filter(is_active=True)
+    return render(request, 'reservations/location_list.html', {
+        'locations': locations
+    })
+
+
+def reservation_create(request):
+    """予約作成"""
+    if request.method == 'POST':
+        # セッションから複数日の予約データを取得
+        existing_data = booking_drafts.load(request)
+        is_multi_date = existing_data.get('is_multi_date', False)
+        
+        form = ReservationForm(request.POST, user=request.user, is_multi_date=is_multi_date)
+        if form.is_valid():
+            # セッションに予約情報を保存して確認画面へ
+            
+            # セッションから既存の予約データを取得（複数日の予約データがある場合）
+            existing_data = booking_drafts.load(request)
+            is_multi_date = existing_data.get('is_multi_date', False)
+            multi_date_slots = existing_data.get('multi_date_slots', {})
+            
+            if is_multi_date and multi_date_slots:
+                # 複数日の予約の場合：お客様情報のみを更新
+                cleaned_data = {
+                    'location': existing_data.get('location'),
+                    'multi_date_slots': multi_date_slots,
+                    'is_multi_date': True,
+                    'customer_name': form.cleaned_data.get('customer_name'),
+                    'customer_email': form.cleaned_data.get('customer_email'),
+                    'customer_phone': '',
+                    'notes': form.cleaned_data.get('notes', ''),
+                }
+            else:
+                # 単一日の予約の場合：既存の処理
+                cleaned_data = form.cleaned_data.copy()
+                # locationをIDに変換
+                if 'location' in cleaned_data and cleaned_data['location']:
+                    cleaned_data['location'] = cleaned_data['location'].id
+                # time_slotsをIDのリストに変換（選択されていない場合は空リスト）
+                if 'time_slots' in cleaned_data and cleaned_data['time_slots']:
+                    cleaned_data['time_slot_ids'] = [ts.id for ts in cleaned_data['time_slots']]
+                else:
+                    cleaned_data['time_slot_ids'] = []
+                if 'time_slots' in cleaned_data:
+                    del cleaned_data['time_slots']
+                # dateを文字列に変換
+                if 'date' in cleaned_data and cleaned_data['date']:
+                    cleaned_data['date'] = cleaned_data['date'].isoformat()
+                
+                # ログイン済みユーザーの既存予約を取得して、選択解除された予約を特定
+                if request.user.is_authenticated:
+                    location_id = cleaned_data.get('location')
+                    reservation_date_str = cleaned_data.get('date')
+                    reservation_date = datetime.fromisoformat(reservation_date_str).date() if reservation_date_str else None
+                    selected_time_slot_ids = cleaned_data.get('time_slot_ids', [])
+                    
+                    if location_id and reservation_date:
+                        # その日の自分の既存予約を取得
+                        existing_reservations = Reservation.objects.filter(
+                            location_id=location_id,
+                            date=reservation_date,
+                            created_by=request.user,
+                            status__in=['confirmed', 'pending']
+                        )
+                        
+                        # 選択解除された予約IDを保存（確定時に削除するため）
+                        deselected_reservation_ids = []
+                        for reservation in existing_reservations:
+                            if reservation.time_slot.id not in selected_time_slot_ids:
+                                deselected_reservation_ids.append(reservation.id)
+                        
+                        cleaned_data['deselected_reservation_ids'] = deselected_reservation_ids
+            
+            booking_drafts.save(request, cleaned_data)
+            return redirect('reservations:reservation_confirm')
+        else:
+            print(f"Debug: Form errors - {form.errors}")
+            messages.error(request, 'フォームにエラーがあります。以下を確認してください。')
+            for field, errors in form.errors.items():
+                for error in errors:
+                    messages.error(request, f'{field}: {error}')
+            
+            # エラー時も複数日の予約データを保持してフォームを再表示
+            # セッションから複数日の予約データを取得
+            existing_data = booking_drafts.load(request)
+            is_multi_date = existing_data.get('is_multi_date', False)
+            multi_date_slots = existing_data.get('multi_date_slots', {})
+            multi_date_details = None
+            
+            if is_multi_date and multi_date_slots:
+                multi_date_details = []
+                for date_str, time_slot_ids in multi_date_slots.items():
+                    reservation_date = datetime.fromisoformat(date_str).date()
+                    time_slots = TimeSlot.objects.filter(id__in=time_slot_ids).order_by('start_time')
+                    multi_date_details.append({
+                        'date': reservation_date,
+                        'date_str': date_str,
+                        'time_slots': time_slots,
+                        'merged_slot_ranges': merge_consecutive_time_slots_for_display(time_slots),
+                    })
+            
+            return render(request, 'reservations/reservation_form.html', {
+                'form': form,
+                'title': '新規予約',
+                'initial_time_slot_ids': [],
+                'is_multi_date': is_multi_date,
+                'multi_date_slots': multi_date_slots,
+                'multi_date_details': multi_date_details,
+                'reservation_form_back_url': _reservation_form_back_url(
+                    request, form, is_multi_date=is_multi_date, session_location_id=existing_data.get('location'),
+                ),
+            })
+    else:
+        # GETリクエストの場合：URLパラメータからlocationとdateを取得
+        existing_data_pre = booking_drafts.load(request)
+        location_id = request.GET.get('location')
+        date_str = request.GET.get('date')
+        time_slots_str = request.GET.get('time_slots')  # 週間カレンダーから選択された時間枠（旧形式）
+        multi_date_slots_str = request.GET.get('multi_date_slots')  # 複数日の予約データ（新形式）
+        edit_pk = request.GET.get('edit_reservation')
+        use_weekly_false = request.GET.get('use_weekly') == 'false'
+
+        has_calendar_selection = bool(multi_date_slots_str) or (
+            bool(location_id) and bool(date_str) and bool(time_slots_str)
+        )
+        has_session_multi = bool(
+            existing_data_pre.get('is_multi_date') and existing_data_pre.get('multi_date_slots')
+        )
+        # 確認画面から「戻る」した単一日予約など（セッションに location あり）
+        has_session_reservation = bool(
+            existing_data_pre.get('location') or existing_data_pre.get('is_multi_date')
+        )
+
+        # 週間カレンダーからの予約編集（単一日・連続枠）
+        if edit_pk and location_id and date_str and time_slots_str and not multi_date_slots_str:
+            if not request.user.is_authenticated:
+                return redirect(f"{reverse('reservations:custom_login')}?next={request.get_full_path()}")
+            reservation = get_object_or_404(Reservation, pk=edit_pk)
+            is_owner = (
+                request.user.is_superuser
+                or reservation.created_by_id == request.user.id
+                or reservation.customer_email == request.user.email
+            )
+            if not is_owner:
+                messages.error(request, 'この予約を編集する権限がありません。')
+                return redirect('reservations:reservation_detail', pk=reservation.pk)
+            consecutive_reservations = _consecutive_reservations_group(reservation)
+            initial_data = {
+                'location': reservation.location,
+                'date': reservation.date,
+                'customer_name': reservation.customer_name,
+                'customer_email': reservation.customer_email,
+                'notes': reservation.notes,
+            }
+            form = ReservationForm(initial=initial_data, user=request.user, instance=reservation)
+            try:
+                tids = [int(x.strip()) for x in time_slots_str.split(',') if x.strip()]
+                form.fields['time_slots'].initial = list(TimeSlot.objects.filter(id__in=tids))
+            except (ValueError, TypeError):
+                tids = [r.time_slot.id for r in consecutive_reservations]
+                form.fields['time_slots'].initial = [r.time_slot for r in consecutive_reservations]
+            return render(request, 'reservations/reservation_form.html', {
+                'form': form,
+                'title': '予約編集',
+                'reservation': reservation,
+                'consecutive_reservations': consecutive_reservations,
+                'is_grouped': len(consecutive_reservations) > 1,
+                'initial_time_slot_ids': tids,
+                'reservation_form_back_url': _reservation_form_back_url(request, form, reservation=reservation),
+            })
+
+        # カレンダー経由でないアクセスは週間カレンダーへ（確認画面の戻る・セッション保持時は除外）
+        if (
+            not use_weekly_false
+            and not has_calendar_selection
+            and not has_session_multi
+            and not has_session_reservation
+        ):
+            first = Location.objects.filter(is_active=True).first()
+            if first:
+                target_lid = location_id or first.id
+                week_anchor = date.today().isoformat()
+                if date_str:
+                    try:
+                        week_anchor = datetime.fromisoformat(date_str).date().isoformat()
+                    except ValueError:
+                        pass
+                return redirect(
+                    f"{reverse('reservations:reservation_weekly_calendar')}"
+                    f"?location={target_lid}&week_start={week_anchor}"
+                )
+            messages.warning(request, '予約可能な場所がありません。')
+            return redirect('reservations:index')
+
+        initial_data = {}
+        initial_time_slot_ids = []
+        multi_date_slots_data = None
+
+        if location_id:
+            try:
+                location = Location.objects.get(id=location_id, is_active=True)
+                initial_data['location'] = location
+            except Location.DoesNotExist:
+                messages.warning(request, f'指定された場所（ID: {location_id}）が見つかりません。')
+            except ValueError as e:
+                messages.warning(request, '無効な場所IDが指定されました。')
+            except Exception as e:
+                messages.warning(request, f'場所の読み込み中にエラーが発生しました: {str(e)}')
+        
+        # 複数日の予約データを処理（新形式）
+        if multi_date_slots_str:
+            try:
+                import json
+                from urllib.parse import unquote
+                # URLエンコードされているのでデコード
+                decoded_str = unquote(multi_date_slots_str)
+                multi_date_slots_data = json.loads(decoded_str)
+                # データの形式を確認（辞書形式で、キーが日付文字列、値が時間枠IDのリスト）
+                if not isinstance(multi_date_slots_data, dict):
+                    raise ValueError('複数日予約データは辞書形式である必要があります。')
+                # 最初の日付を初期値として設定（フォーム表示用）
+                if multi_date_slots_data:
+                    first_date = sorted(multi_date_slots_data.keys())[0]
+                    reservation_date = datetime.fromisoformat(first_date).date()
+                    initial_data['date'] = reservation_date
+                    # 時間枠IDを整数に変換
+                    initial_time_slot_ids = [int(id) for id in multi_date_slots_data[first_date] if str(id).isdigit()]
+            except (ValueError, TypeError, json.JSONDecodeError) as e:
+                import traceback
+                print(f"Error parsing multi_date_slots: {e}")
+                print(f"Raw data: {multi_date_slots_str}")
+                traceback.print_exc()
+                messages.warning(request, f'無効な複数日予約データが指定されました: {str(e)}')
+                multi_date_slots_data = None
+        elif date_str:
+            # 旧形式：単一日の予約
+            try:
+                # YYYY-MM-DD形式の文字列をdateオブジェクトに変換
+                reservation_date = datetime.fromisoformat(date_str).date()
+                initial_data['date'] = reservation_date
+            except (ValueError, TypeError) as e:
+                messages.warning(request, '無効な日付が指定されました。')
+            except Exception as e:
+                messages.warning(request, f'日付の読み込み中にエラーが発生しました: {str(e)}')
+        
+        # 週間カレンダーから選択された時間枠を取得（旧形式）
+        if time_slots_str and not multi_date_slots_str:
+            try:
+                time_slot_ids = [int(id.strip()) for id in time_slots_str.split(',') if id.strip()]
+                initial_time_slot_ids = time_slot_ids
+            except (ValueError, TypeError) as e:
+                messages.warning(request, '無効な時間枠IDが指定されました。')
+        
+        # 複数日の予約かどうかをチェック
+        existing_data = booking_drafts.load(request)
+        is_multi_date = existing_data.get('is_multi_date', False) or (multi_date_slots_data is not None)
+        
+        form = ReservationForm(initial=initial_data, user=request.user, is_multi_date=is_multi_date)
+        
+        # 複数日の予約データがある場合は、セッションに保存して予約フォームを表示
+        # （お客様情報を入力してもらうため）
+        if multi_date_slots_data:
+            # セッションに複数日の予約データを保存
+            cleaned_data = {
+                'location': int(location_id),
+                'multi_date_slots': multi_date_slots_data,  # {'2026-01-21': [1, 2, 3], '2026-01-22': [4, 5]}
+                'is_multi_date': True,
+            }
+            booking_drafts.save(request, cleaned_data)
+            # 予約フォームを表示（お客様情報を入力してもらう）
+            # 時間枠は既に選択済みなので、フォームで非表示にする
+    
+    # セッションから複数日の予約データを取得
+    existing_data = booking_drafts.load(request)
+    is_multi_date = existing_data.get('is_multi_date', False)
+    multi_date_slots = existing_data.get('multi_date_slots', {})
+    multi_date_details = None
+    
+    # 複数日の予約データがある場合、時間枠情報を取得
+    if is_multi_date and multi_date_slots:
+        multi_date_details = []
+        for date_str, time_slot_ids in multi_date_slots.items():
+            reservation_date = datetime.fromisoformat(date_str).date()
+            time_slots = TimeSlot.objects.filter(id__in=time_slot_ids).order_by('start_time')
+            multi_date_details.append({
+                'date': reservation_date,
+                'date_str': date_str,
+                'time_slots': time_slots,
+                'merged_slot_ranges': merge_consecutive_time_slots_for_display(time_slots),
+            })
+    
+    return render(request, 'reservations/reservation_form.html', {
+        'form': form,
+        'title': '新規予約',
+        'initial_time_slot_ids': initial_time_slot_ids,
+        'is_multi_date': is_multi_date,
+        'multi_date_slots': multi_date_slots,
+        'multi_date_details': multi_date_details,
+        'reservation_form_back_url': _reservation_form_back_url(
+            request, form, is_multi_date=is_multi_date, session_location_id=existing_data.get('location'),
+        ),
+    })
+
+
+def _slot_amount(time_slot, price_per_30min):
+    """時間枠 1 つの料金（30分単位に切り上げ。日をまたぐ枠にも対応）"""
+    start_datetime = datetime.combine(date.today(), time_slot.start_time)
+    end_datetime = datetime.combine(date.today(), time_slot.end_time)
+    if end_datetime < start_datetime:
+        end_datetime += timedelta(days=1)
+    total_minutes = (end_datetime - start_datetime).total_seconds() / 60
+    return int((total_minutes + 29) // 30) * price_per_30min
+
+
+def reservation_confirm(request):
+    """予約確認画面"""
+    reservation_data = booking_drafts.load(request)
+    
+    if not reservation_data:
+        messages.warning(request, '予約情報が見つかりません。最初から入力してください。')
+        return redirect('reservations:reservation_create')
+    
+    # 複数日の予約かどうかをチェック
+    is_multi_date = reservation_data.get('is_multi_date', False)
+    multi_date_slots = reservation_data.get('multi_date_slots', {})
+    
+    if is_multi_date and multi_date_slots:
+        # 複数日の予約処理
+        location_id = reservation_data.get('location')
+        
+        try:
+            location = Location.objects.get(id=location_id)
+        except Location.DoesNotExist:
+            messages.error(request, '予約情報の読み込み中にエラーが発生しました。')
+            return redirect('reservations:reservation_create')
+        
+        price_per_30min = location.price_per_30min or 0
+        total_amount = 0
+        multi_date_details = []
+        
+        # 各日付ごとに予約情報を整理（時間枠は全日付分をまとめて取得）
+        all_time_slots = TimeSlot.objects.in_bulk(
+            {int(tid) for time_slot_ids in multi_date_slots.values() for tid in time_slot_ids}
+        )
+        for date_str, time_slot_ids in sorted(multi_date_slots.items()):
+            reservation_date = datetime.fromisoformat(date_str).date()
+            time_slots = sorted(
+                (all_time_slots[int(tid)] for tid in time_slot_ids if int(tid) in all_time_slots),
+                key=lambda time_slot: time_slot.start_time,
+            )
+            
+            date_total = 0
+            date_slot_details = []
+            
+            for time_slot in time_slots:
+                # 開始時間と終了時間の差を計算
+                start_datetime = datetime.combine(date.today(), time_slot.start_time)
+                end_datetime = datetime.combine(date.today(), time_slot.end_time)
+                if end_datetime < start_datetime:
+                    end_datetime += timedelta(days=1)
+                
+                duration = end_datetime - start_datetime
+                total_minutes = duration.total_seconds() / 60
+                units_30min = int((total_minutes + 29) // 30)
+                slot_amount = units_30min * price_per_30min
+                
+                date_slot_details.append({
+                    'time_slot': time_slot,
+                    'duration_minutes': int(total_minutes),
+                    'units_30min': units_30min,
+                    'amount': slot_amount
+                })
+                date_total += slot_amount
+            
+            date_slot_details = merge_consecutive_time_slot_details(date_slot_details)
+            multi_date_details.append({
+                'date': reservation_date,
+                'time_slots': time_slots,
+                'time_slot_details': date_slot_details,
+                'date_total': date_total
+            })
+            total_amount += date_total
+        
+        context = {
+            'location': location,
+            'multi_date_details': multi_date_details,
+            'customer_name': reservation_data.get('customer_name'),
+            'customer_email': reservation_data.get('customer_email'),
+            'customer_phone': reservation_data.get('customer_phone'),
+            'notes': reservation_data.get('notes', ''),
+            'price_per_30min': price_per_30min,
+            'total_amount': total_amount,
+            'is_multi_date': True,
+            'is_edit': False,
+            'series': reservation_data.get('series'),
+        }
+        
+        return render(request, 'reservations/reservation_confirm_multi.html', context)
+    
+    # 単一日の予約処理（既存の処理）
+    location_id = reservation_data.get('location')
+    time_slot_ids = reservation_data.get('time_slot_ids', [])
+    reservation_date_str = reservation_data.get('date')
+    
+    try:
+        location = Location.objects.get(id=location_id)
+        time_slots = list(
+            TimeSlot.objects.filter(id__in=time_slot_ids).order_by('start_time')
+        ) if time_slot_ids else []
+        reservation_date = datetime.fromisoformat(reservation_date_str).date() if reservation_date_str else None
+    except (Location.DoesNotExist, ValueError, TypeError) as e:
+        messages.error(request, '予約情報の読み込み中にエラーが発生しました。')
+        return redirect('reservations:reservation_create')
+    
+    # 時間枠が選択されていない場合（新規予約の場合）
+    if not time_slots:
+        messages.warning(request, '時間枠を選択してください。')
+        return redirect('reservations:reservation_create')
+    
+    # 金額を計算（30分単位）
+    total_amount = 0
+    time_slot_details = []
+    price_per_30min = location.price_per_30min or 0
+    
+    for time_slot in time_slots:
+        # 開始時間と終了時間の差を計算
+        start_datetime = datetime.combine(date.today(), time_slot.start_time)
+        end_datetime = datetime.combine(date.today(), time_slot.end_time)
+        if end_datetime < start_datetime:
+            # 日をまたぐ場合（例：23:00-01:00）
+            end_datetime += timedelta(days=1)
+        
+        duration = end_datetime - start_datetime
+        total_minutes = duration.total_seconds() / 60
+        # 30分単位に切り上げ
+        units_30min = int((total_minutes + 29) // 30)  # 切り上げ
+        slot_amount = units_30min * price_per_30min
+        
+        time_slot_details.append({
+            'time_slot': time_slot,
+            'duration_minutes': int(total_minutes),
+            'units_30min': units_30min,
+            'amount': slot_amount
+        })
+        total_amount += slot_amount
+    
+    time_slot_details = merge_consecutive_time_slot_details(time_slot_details)
+    
+    # 編集モードかどうかをチェック
+    is_edit = reservation_data.get('is_edit', False)
+    edit_reservation_ids = reservation_data.get('edit_reservation_ids', [])
+    
+    context = {
+        'location': location,
+        'time_slots': time_slots,
+        'time_slot_details': time_slot_details,
+        'date': reservation_date,
+        'customer_name': reservation_data.get('customer_name'),
+        'customer_email': reservation_data.get('customer_email'),
+        'customer_phone': reservation_data.get('customer_phone'),
+        'notes': reservation_data.get('notes', ''),
+        'price_per_30min': price_per_30min,
+        'total_amount': total_amount,
+        'is_edit': is_edit,
+        'edit_reservation_ids': edit_reservation_ids,
+        'is_multi_date': False,
+    }
+    
+    return render(request, 'reservations/reservation_confirm.html', context)
+
+
+def reservation_confirm_submit(request):
+    """予約確定処理"""
+    reservation_data = booking_drafts.load(request)
+    
+    if not reservation_data:
+        messages.warning(request, '予約情報が見つかりません。最初から入力してください。')
+        return redirect('reservations:reservation_create')
+    
+    if request.method != 'POST':
+        return redirect('reservations:reservation_confirm')
+    
+    try:
+        # 複数日の予約かどうかをチェック
+        is_multi_date = reservation_data.get('is_multi_date', False)
+        multi_date_slots = reservation_data.get('multi_date_slots', {})
+        
+        if is_multi_date and multi_date_slots:
+            # 複数日の予約処理（繰り返し予約もここで作成する）
+            location_id = reservation_data.get('location')
+            location = Location.objects.get(id=location_id)
+            price_per_30min = location.price_per_30min or 0
+            slots_by_date = {
+                datetime.fromisoformat(date_str).date(): [int(tid) for tid in time_slot_ids]
+                for date_str, time_slot_ids in multi_date_slots.items()
+            }
+            needs_payment = price_per_30min > 0 and square_payments_enabled()
+            created_by = request.user if request.user.is_authenticated else None
+            booking_group = BookingGroup.objects.create(
+                customer_email=reservation_data.get('customer_email') or '',
+                created_by=created_by,
+            )
+            reservation_series = None
+            series_data = reservation_data.get('series')
+            if series_data:
+                reservation_series = ReservationSeries.objects.create(
+                    location=location,
+                    interval_weeks=series_data['interval_weeks'],
+                    start_date=min(slots_by_date),
+                    end_date=max(slots_by_date),
+                    customer_name=reservation_data.get('customer_name'),
+                    customer_email=reservation_data.get('customer_email'),
+                    notes=reservation_data.get('notes', ''),
+                    created_by=created_by,
+                )
+
+            # すでに予約されている枠を除いて、全日付分をまとめて作成
+            all_created_reservations = series.create_reservations(
+                location,
+                slots_by_date,
+                status='pending' if needs_payment else 'confirmed',
+                customer_name=reservation_data.get('customer_name'),
+                customer_email=reservation_data.get('customer_email'),
+                customer_phone=reservation_data.get('customer_phone'),
+                notes=reservation_data.get('notes', ''),
+                booking_group=booking_group,
+                series=reservation_series,
+                created_by=created_by,
+            )
+            if not all_created_reservations:
+                booking_group.delete()
+                if reservation_series:
+                    reservation_series.delete()
+                messages.error(request, '選択した時間枠はすべて予約済みです。')
+                return redirect('reservations:reservation_confirm')
+            time_slots = TimeSlot.objects.in_bulk({r.time_slot_id for r in all_created_reservations})
+            total_amount = sum(_slot_amount(time_slots[r.time_slot_id], price_per_30min) for r in all_created_reservations)
+
+            # 金額が0より大きい場合はSquare決済リンクを作成
+            if total_amount > 0 and square_payments_enabled():
+                # 決済リンクを作成
+                order_id = f"multi_{datetime.now().timestamp()}"
+                description = f"{location.name} - 複数日予約"
+                payment_result = create_payment_link(request, total_amount, order_id, description)
+                
+                if payment_result.get('success'):
+                    # 決済トランザクションを予約グループに紐付け（決済完了時にグループ内の予約をまとめて確定する）
+                    booking_group.total_amount = total_amount
+                    booking_group.save(update_fields=['total_amount', 'updated_at'])
+                    PaymentTransaction.objects.create(
+                        reservation=all_created_reservations[0] if all_created_reservations else None,
+                        booking_group=booking_group,
+                        payment_link_id=payment_result['payment_link_id'],
+                        payment_link_url=payment_result['payment_link_url'],
+                        square_order_id=payment_result.get('order_id'),
+                        amount=total_amount,
+                        status='pending'
+                    )
+                    
+                    # セッションの予約データをクリア
+                    booking_drafts.clear(request)
+                    
+                    return redirect(payment_result['payment_link_url'])
+                else:
+                    messages.error(request, f'決済リンクの作成に失敗しました: {", ".join(payment_result.get("errors", []))}')
+                    return redirect('reservations:reservation_confirm')
+            else:
+                # 金額が0円の場合は直接予約を確定（予約は確認済みで作成済み）
+                booking_group.status = 'confirmed'
+                booking_group.save(update_fields=['status', 'updated_at'])
+                
+                # セッションの予約データをクリア
+                booking_drafts.clear(request)
+                
+                messages.success(request, f'{len(all_created_reservations)}件の予約を作成しました。')
+                if reservation_series:
+                    return redirect('reservations:reservation_series_detail', pk=reservation_series.pk)
+                return redirect('reservations:index')
+        
+        # 単一日の予約処理（既存の処理）
+        location_id = reservation_data.get('location')
+        time_slot_ids = reservation_data.get('time_slot_ids', [])
+        reservation_date_str = reservation_data.get('date')
+        
+        location = Location.objects.get(id=location_id)
+        time_slots = TimeSlot.objects.filter(id__in=time_slot_ids) if time_slot_ids else []
+        reservation_date = datetime.fromisoformat(reservation_date_str).date() if reservation_date_str else None
+        
+        if not reservation_date:
+            raise ValueError('予約日が不正です。')
+        
+        # 編集モードかどうかをチェック
+        is_edit = reservation_data.get('is_edit', False)
+        edit_reservation_ids = reservation_data.get('edit_reservation_ids', [])
+        
+        # 金額を計算（30分単位）
+        total_amount = 0
+        price_per_30min = location.price_per_30min or 0
+        
+        for time_slot in time_slots:
+            start_datetime = datetime.combine(date.today(), time_slot.start_time)
+            end_datetime = datetime.combine(date.today(), time_slot.end_time)
+            if end_datetime < start_datetime:
+                end_datetime += timedelta(days=1)
+            
+            duration = end_datetime - start_datetime
+            total_minutes = duration.total_seconds() / 60
+            units_30min = int((total_minutes + 29) // 30)
+            slot_amount = units_30min * price_per_30min
+            total_amount += slot_amount
+        
+        # 金額が0より大きい場合はSquare決済リンクを作成
+        if total_amount > 0 and square_payments_enabled():
+            # まず予約を作成（pending状態）。決済 1 件に対応する予約グループにまとめる
+            created_reservations = []
+            booking_group = BookingGroup.objects.create(
+                customer_email=reservation_data.get('customer_email') or '',
+                total_amount=total_amount,
+                created_by=request.user if request.user.is_authenticated else None,
+            )
+            if is_edit and edit_reservation_ids:
+                # 編集モード：既存予約を更新/削除/作成
+                existing_reservations = Reservation.objects.filter(id__in=edit_reservation_ids)
+                
+                # 選択解除された既存予約を削除
+                deselected_reservation_ids = reservation_data.get('deselected_reservation_ids', [])
+                deleted_count = 0
+                if deselected_reservation_ids:
+                    if request.user.is_superuser:
+                        deleted_reservations = Reservation.objects.filter(id__in=deselected_reservation_ids)
+                    else:
+                        deleted_reservations = Reservation.objects.filter(
+                            id__in=deselected_reservation_ids,
+                            created_by=request.user
+                        )
+                    deleted_count = deleted_reservations.delete()[0]
+                
+                # 削除後の既存予約を再取得
+                remaining_reservations = Reservation.objects.filter(id__in=edit_reservation_ids)
+                existing_reservation_dict = {r.time_slot.id: r for r in remaining_reservations}
+                
+                # 各時間枠ごとに予約を更新または作成
+                for time_slot in time_slots:
+                    existing = existing_reservation_dict.get(time_slot.id)
+                    
+                    if existing:
+                        # 既存予約を更新
+                        duplicate = Reservation.objects.filter(
+                            location=location,
+                            time_slot=time_slot,
+                            date=reservation_date,
+                            status__in=['confirmed', 'pending']
+                        ).exclude(pk=existing.pk)
+                        
+                        if duplicate.exists():
+                            continue
+                        
+                        existing.location = location
+                        existing.date = reservation_date
+                        existing.customer_name = reservation_data.get('customer_name')
+                        existing.customer_email = reservation_data.get('customer_email')
+                        existing.customer_phone = reservation_data.get('customer_phone') or ''
+                        existing.notes = reservation_data.get('notes', '')
+                        existing.status = 'pending'  # 決済待ち状態
+                        existing.booking_group = booking_group
+                        existing.save()
+                        created_reservations.append(existing)
+                    else:
+                        # 新規予約を作成
+                        duplicate = Reservation.objects.filter(
+                            location=location,
+                            time_slot=time_slot,
+                            date=reservation_date,
+                            status__in=['confirmed', 'pending']
+                        )
+                        
+                        if duplicate.exists():
+                            continue
+                        
+                        reservation = Reservation.objects.create(
+                            location=location,
+                            time_slot=time_slot,
+                            date=reservation_date,
+                            customer_name=reservation_data.get('customer_name'),
+                            customer_email=reservation_data.get('customer_email'),
+                            customer_phone=reservation_data.get('customer_phone') or '',
+                            notes=reservation_data.get('notes', ''),
+                            status='pending',  # 決済待ち状態
+                            booking_group=booking_group,
+                            created_by=request.user
+                        )
+                        created_reservations.append(reservation)
+            else:
+                # 新規予約モード：予約を作成
+                deselected_reservation_ids = reservation_data.get('deselected_reservation_ids', [])
+                if deselected_reservation_ids and request.user.is_authenticated:
+                    Reservation.objects.filter(
+                        id__in=deselected_reservation_ids,
+                        created_by=request.user
+                    ).delete()
+                
+                for time_slot in time_slots:
+                    # 重複チェック
+                    duplicate = Reservation.objects.filter(
+                        location=location,
+                        time_slot=time_slot,
+                        date=reservation_date,
+                        status__in=['confirmed', 'pending']
+                    )
+                    
+                    if duplicate.exists():
+                        continue
+                    
+                    reservation = Reservation.objects.create(
+                        location=location,
+                        time_slot=time_slot,
+                        date=reservation_date,
+                        customer_name=reservation_data.get('customer_name'),
+                        customer_email=reservation_data.get('customer_email'),
+                        customer_phone=reservation_data.get('customer_phone') or '',
+                        notes=reservation_data.get('notes', ''),
+                        status='pending',  # 決済待ち状態
+                        booking_group=booking_group,
+                        created_by=request.user if request.user.is_authenticated else None
+                    )
+                    created_reservations.append(reservation)
+            
+            if not created_reservations:
+                booking_group.delete()
+                messages.error(request, '予約の作成に失敗しました。')
+                return redirect('reservations:reservation_confirm')
+            
+            # 決済リンクの説明を作成
+            time_slot_str = ', '.join([f"{ts.start_time.strftime('%H:%M')}-{ts.end_time.strftime('%H:%M')}" for ts in time_slots[:3]])
+            if len(time_slots) > 3:
+                time_slot_str += f" 他{len(time_slots)-3}枠"
+            description = f'予約料金 - {location.name} ({reservation_date.strftime("%Y年%m月%d日")} {time_slot_str})'
+            
+            # 決済リンクを作成
+            order_id = f"reservation_edit_{edit_reservation_ids[0]}" if (is_edit and edit_reservation_ids) else f"reservation_{created_reservations[0].id}"
+            result = create_payment_link(request, total_amount, order_id, description)
+            
+            if result['success']:
+                # 決済トランザクションを保存（予約グループと代表として最初の予約に紐付け）
+                transaction = PaymentTransaction.objects.create(
+                    reservation=created_reservations[0],
+                    booking_group=booking_group,
+                    payment_link_id=result['payment_link_id'],
+                    payment_link_url=result['payment_link_url'],
+                    square_order_id=result.get('order_id'),
+                    amount=total_amount,
+                    status='pending'
+                )
+                
+                # セッションから予約データを削除
+                booking_drafts.clear(request)
+                
+                # 予約詳細画面にリダイレクト（決済リンクはテンプレートで新しいタブで開く）
+                messages.success(request, '予約を登録しました。決済を完了してください。')
+                return render(request, 'reservations/reservation_payment.html', {
+                    'reservation': created_reservations[0],
+                    'payment_link_url': result['payment_link_url'],
+                    'total_amount': total_amount,
+                })
+            else:
+                # Square APIエラーの場合、作成した予約を削除してエラーを表示
+                for reservation in created_reservations:
+                    reservation.delete()
+                booking_group.delete()
+                error_msg = ', '.join(result.get('errors', ['決済リンクの作成に失敗しました。']))
+                messages.error(request, f'決済リンクの作成に失敗しました: {error_msg}')
+                return redirect('reservations:reservation_confirm')
+        
+        # 金額が0円の場合は直接予約を作成
+        if is_edit and edit_reservation_ids:
+            # 編集モード：既存予約を更新/削除/作成
+            existing_reservations = Reservation.objects.filter(id__in=edit_reservation_ids)
+            
+            # 選択解除された既存予約を削除（最初に削除する）
+            deselected_reservation_ids = reservation_data.get('deselected_reservation_ids', [])
+            deleted_count = 0
+            if deselected_reservation_ids:
+                # 編集モードでは、選択解除された予約を削除
+                # 権限チェック：自分の予約またはスーパーユーザーの場合のみ削除可能
+                if request.user.is_superuser:
+                    deleted_reservations = Reservation.objects.filter(id__in=deselected_reservation_ids)
+                else:
+                    deleted_reservations = Reservation.objects.filter(
+                        id__in=deselected_reservation_ids,
+                        created_by=request.user
+                    )
+                
+                deleted_count = deleted_reservations.delete()[0]
+                if deleted_count > 0:
+                    messages.info(request, f'{deleted_count}件の既存予約を削除しました。')
+            
+            # 削除後の既存予約を再取得（削除された予約を除外）
+            remaining_reservations = Reservation.objects.filter(id__in=edit_reservation_ids)
+            existing_reservation_dict = {r.time_slot.id: r for r in remaining_reservations}
+            
+            # 各時間枠ごとに予約を更新または作成
+            updated_reservations = []
+            for time_slot in time_slots:
+                # 既存予約があるかチェック
+                existing = existing_reservation_dict.get(time_slot.id)
+                
+                if existing:
+                    # 既存予約を更新（場所、日付、時間枠が変更された場合の重複チェック）
+                    duplicate = Reservation.objects.filter(
+                        location=location,
+                        time_slot=time_slot,
+                        date=reservation_date,
+                        status__in=['confirmed', 'pending']
+                    ).exclude(pk=existing.pk)
+                    
+                    if duplicate.exists():
+                        messages.warning(request, f'時間枠 {time_slot} は既に予約されています。')
+                        continue
+                    
+                    # 既存予約を更新
+                    existing.location = location
+                    existing.date = reservation_date
+                    existing.customer_name = reservation_data.get('customer_name')
+                    existing.customer_email = reservation_data.get('customer_email')
+                    existing.customer_phone = reservation_data.get('customer_phone') or ''
+                    existing.notes = reservation_data.get('notes', '')
+                    existing.save()
+                    updated_reservations.append(existing)
+                else:
+                    # 新規予約を作成する前に重複チェック
+                    duplicate = Reservation.objects.filter(
+                        location=location,
+                        time_slot=time_slot,
+                        date=reservation_date,
+                        status__in=['confirmed', 'pending']
+                    )
+                    
+                    if duplicate.exists():
+                        messages.warning(request, f'時間枠 {time_slot} は既に予約されています。')
+                        continue
+                    
+                    # 新規予約を作成
+                    reservation = Reservation.objects.create(
+                        location=location,
+                        time_slot=time_slot,
+                        date=reservation_date,
+                        customer_name=reservation_data.get('customer_name'),
+                        customer_email=reservation_data.get('customer_email'),
+                        customer_phone=reservation_data.get('customer_phone') or '',
+                        notes=reservation_data.get('notes', ''),
+                        status='pending',
+                        created_by=request.user
+                    )
+                    updated_reservations.append(reservation)
+            
+            # セッションから予約データを削除
+            booking_drafts.clear(request)
+            
+            if updated_reservations:
+                if len(updated_reservations) == 1:
+                    messages.success(request, '予約が正常に更新されました。')
+                    return redirect('reservations:reservation_detail', pk=updated_reservations[0].pk)
+                else:
+                    messages.success(request, f'{len(updated_reservations)}件の予約が正常に更新されました。')
+                    # 最初の予約の詳細画面にリダイレクト
+                    first_reservation = Reservation.objects.filter(
+                        date=reservation_date,
+                        location=location,
+                        customer_email=reservation_data.get('customer_email'),
+                        status__in=['confirmed', 'pending']
+                    ).order_by('time_slot__start_time').first()
+                    
+                    if first_reservation:
+                        return redirect('reservations:reservation_detail', pk=first_reservation.pk)
+                    else:
+                        return redirect('reservations:reservation_list')
+            else:
+                messages.error(request, '予約の更新に失敗しました。')
+                return redirect('reservations:reservation_list')
+        else:
+            # 新規予約モード
+            # 金額を計算（30分単位）
+            total_amount = 0
+            price_per_30min = location.price_per_30min or 0
+            
+            for time_slot in time_slots:
+                start_datetime = datetime.combine(date.today(), time_slot.start_time)
+                end_datetime = datetime.combine(date.today(), time_slot.end_time)
+                if end_datetime < start_datetime:
+                    end_datetime += timedelta(days=1)
+                
+                duration = end_datetime - start_datetime
+                total_minutes = duration.total_seconds() / 60
+                units_30min = int((total_minutes + 29) // 30)
+                slot_amount = units_30min * price_per_30min
+                total_amount += slot_amount
+            
+            # 金額が0より大きい場合はSquare決済リンクを作成
+            if total_amount > 0 and square_payments_enabled():
+                # 決済リンクの説明を作成
+                time_slot_str = ', '.join([f"{ts.start_time.strftime('%H:%M')}-{ts.end_time.strftime('%H:%M')}" for ts in time_slots[:3]])
+                if len(time_slots) > 3:
+                    time_slot_str += f" 他{len(time_slots)-3}枠"
+                description = f'予約料金 - {location.name} ({reservation_date.strftime("%Y年%m月%d日")} {time_slot_str})'
+                
+                # 決済リンクを作成
+                order_id = f"reservation_{datetime.now().timestamp()}"
+                result = create_payment_link(request, total_amount, order_id, description)
+                
+                if result['success']:
+                    # 決済トランザクションを保存（予約は決済完了後にこのグループへ作成）
+                    booking_group = BookingGroup.objects.create(
+                        customer_email=reservation_data.get('customer_email') or '',
+                        total_amount=total_amount,
+                        created_by=request.user if request.user.is_authenticated else None,
+                    )
+                    transaction = PaymentTransaction.objects.create(
+                        reservation=None,  # 予約は決済完了後に紐付け
+                        booking_group=booking_group,
+                        payment_link_id=result['payment_link_id'],
+                        payment_link_url=result['payment_link_url'],
+                        square_order_id=result.get('order_id'),
+                        amount=total_amount,
+                        status='pending'
+                    )
+                    
+                    # 入力内容を決済トランザクションに紐付けて保存（決済完了時に Webhook またはリダイレクトで予約を作成）
+                    booking_drafts.attach_payment(request, reservation_data, transaction)
+                    
+                    # Square決済ページにリダイレクト
+                    messages.info(request, '決済を完了してください。')
+                    return redirect(result['payment_link_url'])
+                else:
+                    # Square APIエラーの場合、エラーメッセージを表示して予約確認画面に戻る
+                    error_msg = ', '.join(result.get('errors', ['決済リンクの作成に失敗しました。']))
+                    messages.error(request, f'決済リンクの作成に失敗しました: {error_msg}')
+                    return redirect('reservations:reservation_confirm')
+            
+            # 金額が0円の場合は直接予約を作成
+            # 選択解除された既存予約を削除
+            deselected_reservation_ids = reservation_data.get('deselected_reservation_ids', [])
+            deleted_count = 0
+            if deselected_reservation_ids and request.user.is_authenticated:
+                deleted_count = Reservation.objects.filter(
+                    id__in=deselected_reservation_ids,
+                    created_by=request.user
+                ).delete()[0]
+                if deleted_count > 0:
+                    messages.info(request, f'{deleted_count}件の既存予約を削除しました。')
+            
+            # 各時間枠ごとに予約を作成（既存予約はスキップ）
+            created_reservations = []
+            for time_slot in time_slots:
+                # 既に自分の予約が存在するかチェック
+                my_existing = Reservation.objects.filter(
+                    location=location,
+                    time_slot=time_slot,
+                    date=reservation_date,
+                    created_by=request.user if request.user.is_authenticated else None,
+                    status__in=['confirmed', 'pending']
+                )
+                if my_existing.exists():
+                    # 既存予約はそのまま維持
+                    created_reservations.append(my_existing.first())
+                    continue
+                
+                # 他人が予約している場合はスキップ
+                others_existing = Reservation.objects.filter(
+                    location=location,
+                    time_slot=time_slot,
+                    date=reservation_date,
+                    status__in=['confirmed', 'pending']
+                )
+                if others_existing.exists():
+                    messages.warning(request, f'時間枠 {time_slot} は既に予約されています。')
+                    continue
+                
+                # 新規予約を作成
+                reservation = Reservation.objects.create(
+                    location=location,
+                    time_slot=time_slot,
+                    date=reservation_date,
+                    customer_name=reservation_data.get('customer_name'),
+                    customer_email=reservation_data.get('customer_email'),
+                    customer_phone=reservation_data.get('customer_phone') or '',
+                    notes=reservation_data.get('notes', ''),
+                    status='pending',
+                    created_by=request.user if request.user.is_authenticated else None
+                )
+                created_reservations.append(reservation)
+            
+            # セッションから予約データを削除
+            booking_drafts.clear(request)
+            
+            if created_reservations:
+                if len(created_reservations) == 1:
+                    messages.success(request, '予約が正常に作成されました。')
+                    return redirect('reservations:reservation_detail', pk=created_reservations[0].pk)
+                else:
+                    messages.success(request, f'{len(created_reservations)}件の予約が正常に作成されました。')
+                    return redirect('reservations:reservation_list')
+            elif deselected_reservation_ids and deleted_count > 0:
+                # 既存予約の削除のみの場合
+                messages.success(request, '予約の変更が完了しました。')
+                return redirect('reservations:reservation_list')
+            else:
+                messages.error(request, '予約の作成に失敗しました。')
+                return redirect('reservations:reservation_create')
+            
+    except Exception as e:
+        print(f"Debug: Error creating reservation - {str(e)}")
+        messages.error(request, f'予約の作成中にエラーが発生しました: {str(e)}')
+        return redirect('reservations:reservation_confirm')
+
+
+def reservation_detail(request, pk):
+    """予約詳細（連続予約も含む）"""
+    reservation = get_object_or_404(Reservation, pk=pk)
+    
+    # 自分の予約か、スーパーユーザーかチェック（表示権限）
+    can_view = True
+    if request.user.is_authenticated:
+        if request.user.is_superuser:
+            can_view = True
+        elif reservation.created_by == request.user:
+            can_view = True
+        elif request.user.email == reservation.customer_email:
+            can_view = True
+        else:
+            # 一般ユーザーは自分の予約のみ閲覧可能
+            can_view = False
+    else:
+        # 未ログインユーザーは閲覧不可
+        can_view = False
+    
+    if not can_view:
+        messages.error(request, 'この予約を閲覧する権限がありません。')
+        return redirect('reservations:index')
+    
+    # 連続予約を取得（同じ日付、場所、ユーザーで時間が連続している予約）
+    consecutive_reservations = [reservation]
+    
+    # 連続している予約を検出
+    all_reservations = list(Reservation.objects.filter(
+        date=reservation.date,
+        location=reservation.location,
+        customer_email=reservation.customer_email,
+        status__in=['confirmed', 'pending']
+    ).select_related('time_slot').order_by('time_slot__start_time'))
+    
+    # 現在の予約の位置を見つける
+    current_index = None
+    for i, r in enumerate(all_reservations):
+        if r.id == reservation.id:
+            current_index = i
+            break
+    
+    if current_index is not None:
+        # 前方向に連続している予約を追加
+        for i in range(current_index - 1, -1, -1):
+            prev_reservation = all_reservations[i]
+            current_start = consecutive_reservations[0].time_slot.start_time
+            prev_end = prev_reservation.time_slot.end_time
+            
+            # 連続しているかチェック
+            if prev_end == current_start or (datetime.combine(date.today(), current_start) - datetime.combine(date.today(), prev_end)).total_seconds() <= 60:
+                consecutive_reservations.insert(0, prev_reservation)
+            else:
+                break
+        
+        # 後方向に連続している予約を追加
+        for i in range(current_index + 1, len(all_reservations)):
+            next_reservation = all_reservations[i]
+            current_end = consecutive_reservations[-1].time_slot.end_time
+            next_start = next_reservation.time_slot.start_time
+            
+            # 連続しているかチェック
+            if current_end == next_start or (datetime.combine(date.today(), next_start) - datetime.combine(date.today(), current_end)).total_seconds() <= 60:
+                consecutive_reservations.append(next_reservation)
+            else:
+                break
+    
+    # 開始時間と終了時間を計算
+    start_time = consecutive_reservations[0].time_slot.start_time
+    end_time = consecutive_reservations[-1].time_slot.end_time
+    
+    # 金額を計算（30分単位）
+    total_amount = 0
+    time_slot_details = []
+    price_per_30min = reservation.location.price_per_30min or 0
+    
+    for res in consecutive_reservations:
+        time_slot = res.time_slot
+        # 開始時間と終了時間の差を計算
+        start_datetime = datetime.combine(date.today(), time_slot.start_time)
+        end_datetime = datetime.combine(date.today(), time_slot.end_time)
+        if end_datetime < start_datetime:
+            # 日をまたぐ場合（例：23:00-01:00）
+            end_datetime += timedelta(days=1)
+        
+        duration = end_datetime - start_datetime
+        total_minutes = duration.total_seconds() / 60
+        # 30分単位に切り上げ
+        units_30min = int((total_minutes + 29) // 30)  # 切り上げ
+        slot_amount = units_30min * price_per_30min
+        
+        time_slot_details.append({
+            'time_slot': time_slot,
+            'duration_minutes': int(total_minutes),
+            'units_30min': units_30min,
+            'amount': slot_amount
+        })
+        total_amount += slot_amount
+    
+    time_slot_details = merge_consecutive_time_slot_details(time_slot_details)
+    
+    return render(request, 'reservations/reservation_detail.html', {
+        'reservation': reservation,
+        'consecutive_reservations': consecutive_reservations,
+        'start_time': start_time,
+        'end_time': end_time,
+        'is_grouped': len(consecutive_reservations) > 1,
+        'time_slot_details': time_slot_details,
+        'total_amount': total_amount,
+        'price_per_30min': price_per_30min,
+    })
+
+
+@login_required
+def reservation_edit(request, pk):
+    """予約編集（連続予約も含む）"""
+    reservation = get_object_or_404(Reservation, pk=pk)
+    
+    # 自分の予約か、スーパーユーザーかチェック
+    is_owner = False
+    if request.user.is_superuser:
+        is_owner = True
+    elif reservation.created_by == request.user:
+        is_owner = True
+    elif request.user.is_authenticated and request.user.email == reservation.customer_email:
+        is_owner = True
+    
+    if not is_owner:
+        messages.error(request, 'この予約を編集する権限がありません。')
+        return redirect('reservations:reservation_detail', pk=pk)
+    
+    # 連続予約を取得
+    consecutive_reservations = [reservation]
+    all_reservations = list(Reservation.objects.filter(
+        date=reservation.date,
+        location=reservation.location,
+        customer_email=reservation.customer_email,
+        status__in=['confirmed', 'pending']
+    ).select_related('time_slot').order_by('time_slot__start_time'))
+    
+    current_index = None
+    for i, r in enumerate(all_reservations):
+        if r.id == reservation.id:
+            current_index = i
+            break
+    
+    if current_index is not None:
+        # 前方向に連続している予約を追加
+        for i in range(current_index - 1, -1, -1):
+            prev_reservation = all_reservations[i]
+            current_start = consecutive_reservations[0].time_slot.start_time
+            prev_end = prev_reservation.time_slot.end_time
+            if prev_end == current_start or (datetime.combine(date.today(), current_start) - datetime.combine(date.today(), prev_end)).total_seconds() <= 60:
+                consecutive_reservations.insert(0, prev_reservation)
+            else:
+                break
+        
+        # 後方向に連続している予約を追加
+        for i in range(current_index + 1, len(all_reservations)):
+            next_reservation = all_reservations[i]
+            current_end = consecutive_reservations[-1].time_slot.end_time
+            next_start = next_reservation.time_slot.start_time
+            if current_end == next_start or (datetime.combine(date.today(), next_start) - datetime.combine(date.today(), current_end)).total_seconds() <= 60:
+                consecutive_reservations.append(next_reservation)
+            else:
+                break
+    
+    if request.method == 'POST':
+        form = ReservationForm(request.POST, user=request.user, instance=reservation)
+        if form.is_valid():
+            # セッションに編集データを保存して確認画面に遷移
+            cleaned_data = form.cleaned_data.copy()
+            # フォームに電話番号欄がないため、既存予約の値を維持する
+            cleaned_data['customer_phone'] = reservation.customer_phone or ''
+
+            # locationオブジェクトをIDに変換
+            if 'location' in cleaned_data and cleaned_data['location']:
+                cleaned_data['location'] = cleaned_data['location'].id
+
+            # dateを文字列に変換
+            if 'date' in cleaned_data and cleaned_data['date']:
+                cleaned_data['date'] = cleaned_data['date'].isoformat()
+
+            # 時間枠IDを保存
+            selected_time_slots = cleaned_data.get('time_slots', [])
+            cleaned_data['time_slot_ids'] = [ts.id for ts in selected_time_slots]
+            # time_slotsオブジェクトはセッションに保存できないので削除
+            if 'time_slots' in cleaned_data:
+                del cleaned_data['time_slots']
+
+            # 編集フラグと既存予約IDを保存
+            cleaned_data['is_edit'] = True
+            cleaned_data['edit_reservation_ids'] = [r.id for r in consecutive_reservations]
+            
+            # 選択解除された予約IDを保存（確定時に削除するため）
+            selected_time_slot_ids = cleaned_data['time_slot_ids']
+            deselected_reservation_ids = []
+            for existing_reservation in consecutive_reservations:
+                if existing_reservation.time_slot.id not in selected_time_slot_ids:
+                    deselected_reservation_ids.append(existing_reservation.id)
+            cleaned_data['deselected_reservation_ids'] = deselected_reservation_ids
+            
+            booking_drafts.save(request, cleaned_data)
+            return redirect('reservations:reservation_confirm')
+    else:
+        # 初期データを設定（連続予約のすべての時間枠を選択）
+        initial_data = {
+            'location': reservation.location,
+            'date': reservation.date,
+            'customer_name': reservation.customer_name,
+            'customer_email': reservation.customer_email,
+            'notes': reservation.notes,
+        }
+        form = ReservationForm(initial=initial_data, user=request.user, instance=reservation)
+        # 連続予約の時間枠を初期選択
+        form.fields['time_slots'].initial = [r.time_slot for r in consecutive_reservations]
+    
+    return render(request, 'reservations/reservation_form.html', {
+        'form': form,
+        'title': '予約編集',
+        'reservation': reservation,
+        'consecutive_reservations': consecutive_reservations,
+        'is_grouped': len(consecutive_reservations) > 1,
+        'initial_time_slot_ids': [r.time_slot.id for r in consecutive_reservations],
+        'reservation_form_back_url': _reservation_form_back_url(request, form, reservation=reservation),
+    })
+
+
+@login_required
+def reservation_delete(request, pk):
+    """予約削除"""
+    reservation = get_object_or_404(Reservation, pk=pk)
+    
+    # 自分の予約か、スーパーユーザーかチェック
+    is_owner = False
+    if request.user.is_superuser:
+        is_owner = True
+    elif reservation.created_by == request.user:
+        is_owner = True
+    elif request.user.is_authenticated and request.user.email == reservation.customer_email:
+        is_owner = True
+    
+    if not is_owner:
+        messages.error(request, 'この予約を削除する権限がありません。')
+        return redirect('reservations:reservation_detail', pk=pk)
+    
+    if request.method == 'POST':
+        reservation.delete()
+        messages.success(request, '予約が正常に削除されました。')
+        if request.user.is_superuser:
+            return redirect('reservations:reservation_list')
+        else:
+            return redirect('reservations:index')
+    
+    return render(request, 'reservations/reservation_confirm_delete.html', {
+        'reservation': reservation
+    })
@@ -0,0 +1,471 @@
+"""空き状況の確認・週間カレンダーとカレンダー用の API。"""
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+from django.db.models import Count, Max, Q
+from datetime import date, datetime, timedelta
+import json
+from ..models import Location, TimeSlot, Reservation, MemberProfile
+from .. import calendar_feed, etags
+
+
+def _event_range(request):
+    """start / end パラメータ（ISO 形式の先頭 10 文字）。省略時は今日から 30 日間。"""
+    start_date = request.GET.get('start')
+    end_date = request.GET.get('end')
+    start_date = datetime.strptime(start_date[:10], '%Y-%m-%d').date() if start_date else date.today()
+    end_date = datetime.strptime(end_date[:10], '%Y-%m-%d').date() if end_date else start_date + timedelta(days=30)
+    return start_date, end_date
+
+
+@require_http_methods(['GET', 'HEAD'])
+def get_calendar_events(request):
+    """
+    Googleカレンダー用の予約データを取得
+    一般ユーザーは自分の予約のみ、スーパーユーザーは全ての予約（未ログインは空）。
+    JSON は予約を少しずつ読みながら書き出し、予約が変わっていなければ 304 を返す。
+    """
+    try:
+        start_date, end_date = _event_range(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    reservations = calendar_feed.reservations_for(request.user, start_date, end_date)
+    validators = calendar_feed.feed_validators(
+        reservations, 'json', request.user.pk, start_date, end_date,
+    )
+    response = etags.not_modified(request, validators)
+    if response is None:
+        response = StreamingHttpResponse(calendar_feed.stream_json(reservations), content_type='application/json')
+    return etags.apply(response, validators)
+
+
+@require_http_methods(['GET', 'HEAD'])
+def calendar_ics_feed(request, token):
+    """
+    外部のカレンダーアプリ購読用の iCalendar。URL の署名付きトークン（calendar_feed.feed_token）で認証する。
+    期間は CALENDAR_FEED_PAST_DAYS 日前から CALENDAR_FEED_FUTURE_DAYS 日後まで。
+    """
+    user = calendar_feed.user_for_token(token)
+    if user is None:
+        raise Http404
+    start_date, end_date = calendar_feed.feed_range()
+    reservations = calendar_feed.reservations_for(user, start_date, end_date)
+    validators = calendar_feed.feed_validators(reservations, 'ics', user.pk, start_date, end_date)
+    response = etags.not_modified(request, validators)
+    if response is None:
+        response = StreamingHttpResponse(
+            calendar_feed.stream_ics(reservations, domain=request.get_host().split(':')[0]),
+            content_type='text/calendar; charset=utf-8',
+        )
+        response['Content-Disposition'] = 'inline; filename="reservations.ics"'
+    return etags.apply(response, validators, vary_cookie=False)
+
+
+def _availability_validators(request, location, start_date, end_date):
+    """
+    空き状況 API の ETag / Last-Modified。場所・期間内の予約と時間枠の件数・最終更新日時だけを集計し、
+    変わっていなければ空き状況の計算と JSON の生成をせずに 304 を返せるようにする。
+    キャンセル済みの予約も集計に含める（ステータスの変更は updated_at に現れる）。
+    """
+    reservations = Reservation.objects.filter(
+        location=location, date__gte=start_date, date__lte=end_date,
+    ).aggregate(count=Count('id'), max_id=Max('id'), updated=Max('updated_at'))
+    time_slots = TimeSlot.objects.aggregate(count=Count('id'), max_id=Max('id'), updated=Max('updated_at'))
+    updated = [
+        value for value in (reservations['updated'], time_slots['updated'], location.updated_at) if value is not None
+    ]
+    return etags.validators(
+        'availability', request.user.pk, location.pk, start_date, end_date,
+        reservations['count'], reservations['max_id'], time_slots['count'], time_slots['max_id'], *updated,
+        last_modified=max(updated),
+    )
+
+
+def check_availability(request):
+    """場所と時間の空き状況をチェック（AJAX）"""
+    if request.method == 'GET':
+        location_id = request.GET.get('location')
+        date_str = request.GET.get('date')
+        
+        if location_id and date_str:
+            try:
+                location = Location.objects.get(id=location_id, is_active=True)
+                reservation_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                validators = _availability_validators(request, location, reservation_date, reservation_date)
+                response = etags.not_modified(request, validators)
+                if response is not None:
+                    return etags.apply(response, validators)
+                
+                # その日の予約済み時間枠を取得
+                all_reservations = Reservation.objects.filter(
+                    location=location,
+                    date=reservation_date,
+                    status__in=['confirmed', 'pending']
+                ).select_related('time_slot', 'created_by')
+                
+                # ログイン済みユーザーの既存予約を取得
+                my_reservation_slot_ids = []
+                if request.user.is_authenticated:
+                    my_reservations = all_reservations.filter(created_by=request.user)
+                    my_reservation_slot_ids = list(my_reservations.values_list('time_slot_id', flat=True))
+                
+                # 他人が予約している時間枠IDを取得
+                others_booked_slot_ids = []
+                if request.user.is_authenticated:
+                    others_reservations = all_reservations.exclude(created_by=request.user)
+                else:
+                    others_reservations = all_reservations
+                others_booked_slot_ids = list(others_reservations.values_list('time_slot_id', flat=True))
+                
+                # すべての予約済み時間枠ID
+                all_booked_slot_ids = list(all_reservations.values_list('time_slot_id', flat=True))
+                
+                # 利用可能な時間枠を取得（他人が予約している時間枠は除外）
+                available_slots = TimeSlot.objects.filter(
+                    is_active=True
+                ).exclude(id__in=others_booked_slot_ids)
+                
+                # 自分の既存予約の詳細情報
+                my_reservations_data = []
+                if request.user.is_authenticated:
+                    for reservation in all_reservations.filter(created_by=request.user).for_display():
+                        my_reservations_data.append({
+                            'id': reservation.id,
+                            'time_slot_id': reservation.time_slot.id,
+                            'time_slot': {
+                                'id': reservation.time_slot.id,
+                                'start_time': reservation.time_slot.start_time.strftime('%H:%M'),
+                                'end_time': reservation.time_slot.end_time.strftime('%H:%M')
+                            }
+                        })
+                
+                return etags.apply(JsonResponse({
+                    'available_slots': list(available_slots.values('id', 'start_time', 'end_time')),
+                    'booked_slots': list(all_booked_slot_ids),
+                    'my_reservation_slot_ids': my_reservation_slot_ids,
+                    'my_reservations': my_reservations_data,
+                    'others_booked_slot_ids': others_booked_slot_ids
+                }), validators)
+            except (Location.DoesNotExist, ValueError):
+                return JsonResponse({'error': '無効なリクエストです。'}, status=400)
+        
+        return JsonResponse({'error': '必要なパラメータが不足しています。'}, status=400)
+    
+    return JsonResponse({'error': 'GETメソッドのみサポートしています。'}, status=405)
+
+
+def reservation_weekly_calendar(request):
+    """週間カレンダーで予約を選択する画面"""
+    location_id = request.GET.get('location')
+    first_location = Location.objects.filter(is_active=True).first()
+    if not location_id:
+        if first_location:
+            return redirect(f"{reverse('reservations:reservation_weekly_calendar')}?location={first_location.id}")
+        messages.warning(request, '予約可能な場所がありません。')
+        return redirect('reservations:index')
+
+    try:
+        location = Location.objects.get(id=location_id, is_active=True)
+    except Location.DoesNotExist:
+        messages.error(request, '指定された場所が見つかりません。')
+        return redirect('reservations:index')
+    
+    # 週の開始日を取得（デフォルトは今日、またはURLパラメータから）
+    week_start_str = request.GET.get('week_start')
+    if week_start_str:
+        try:
+            week_start = datetime.strptime(week_start_str, '%Y-%m-%d').date()
+        except ValueError:
+            week_start = date.today()
+    else:
+        week_start = date.today()
+    
+    # 週の開始日を月曜日に調整（または指定された日から7日間）
+    # 画像を見ると土曜日から始まっているので、選択された日から7日間を表示
+    week_dates = [week_start + timedelta(days=i) for i in range(7)]
+
+    edit_pk = request.GET.get('edit_reservation')
+    edit_reservation_obj = None
+    edit_mode = False
+    initial_slots_json = '{}'
+    if edit_pk and request.user.is_authenticated:
+        try:
+            edit_reservation_obj = Reservation.objects.select_related('location', 'time_slot').get(pk=edit_pk)
+        except Reservation.DoesNotExist:
+            edit_reservation_obj = None
+        if edit_reservation_obj:
+            is_owner = (
+                request.user.is_superuser
+                or edit_reservation_obj.created_by_id == request.user.id
+                or edit_reservation_obj.customer_email == request.user.email
+            )
+            if is_owner and edit_reservation_obj.location_id == location.id:
+                edit_mode = True
+                # 同一日・同一場所の「自分の予約」をすべて初期選択（連続枠に限らない）
+                if request.user.is_superuser:
+                    my_same_day = Reservation.objects.filter(
+                        location=edit_reservation_obj.location,
+                        date=edit_reservation_obj.date,
+                        status__in=['confirmed', 'pending'],
+                        customer_email=edit_reservation_obj.customer_email,
+                    )
+                else:
+                    my_same_day = Reservation.objects.filter(
+                        location=edit_reservation_obj.location,
+                        date=edit_reservation_obj.date,
+                        status__in=['confirmed', 'pending'],
+                    ).filter(
+                        Q(created_by=request.user) | Q(customer_email=request.user.email)
+                    )
+                by_date = {}
+                for r in my_same_day:
+                    ds = str(r.date)
+                    by_date.setdefault(ds, []).append(r.time_slot_id)
+                initial_slots_json = json.dumps(by_date)
+            elif is_owner and edit_reservation_obj.location_id != location.id:
+                return redirect(
+                    f"{reverse('reservations:reservation_weekly_calendar')}"
+                    f"?location={edit_reservation_obj.location_id}"
+                    f"&week_start={week_start.isoformat()}&edit_reservation={edit_pk}"
+                )
+            elif not is_owner:
+                messages.error(request, 'この予約を編集する権限がありません。')
+                edit_reservation_obj = None
+
+    # すべての時間枠を取得
+    all_time_slots = TimeSlot.objects.filter(is_active=True).order_by('start_time')
+
+    # 週間の予約状況を取得
+    week_reservations = Reservation.objects.filter(
+        location=location,
+        date__in=week_dates,
+        status__in=['confirmed', 'pending'],
+    ).select_related('time_slot', 'created_by')
+
+    # 日付と時間枠ごとの予約状況を整理（テンプレートでアクセスしやすい形式）
+    availability_data = []
+    for slot in all_time_slots:
+        slot_data = {
+            'slot': slot,
+            'dates': [],
+        }
+        # 予約可能期間の計算（一般ユーザーは1ヶ月、特別ユーザーは3ヶ月）
+        today = date.today()
+        max_days = 30  # デフォルトは1ヶ月
+
+        if request.user.is_authenticated:
+            try:
+                profile = MemberProfile.objects.get(user=request.user)
+                if profile.is_special_user:
+                    max_days = 90  # 特別ユーザーは3ヶ月
+            except MemberProfile.DoesNotExist:
+                pass
+
+        max_date = today + timedelta(days=max_days)
+
+        for d in week_dates:
+            reservations = week_reservations.filter(date=d, time_slot=slot)
+            reservation_here = reservations.first()
+
+            is_mine = False
+            is_other = False
+            if reservation_here:
+                if request.user.is_authenticated:
+                    if edit_mode and edit_reservation_obj:
+                        if request.user.is_superuser:
+                            is_mine = (
+                                reservation_here.customer_email == edit_reservation_obj.customer_email
+                            )
+                        else:
+                            is_mine = (
+                                reservation_here.created_by_id == request.user.id
+                                or reservation_here.customer_email == request.user.email
+                            )
+                    else:
+                        is_mine = (
+                            reservation_here.created_by_id == request.user.id
+                            or reservation_here.customer_email == request.user.email
+                        )
+                if reservation_here and not is_mine:
+                    is_other = True
+
+            is_out_of_range = d < today or d > max_date
+            is_booked_by_others = is_other
+            is_my_reservation = is_mine
+            is_available = reservation_here is None and not is_out_of_range
+            reservation_pk = (
+                reservation_here.pk if reservation_here and is_my_reservation else None
+            )
+
+            slot_data['dates'].append({
+                'date': d,
+                'is_available': is_available,
+                'is_my_reservation': is_my_reservation,
+                'is_booked_by_others': is_booked_by_others,
+                'is_out_of_range': is_out_of_range,
+                'reservation_pk': reservation_pk,
+            })
+        availability_data.append(slot_data)
+    
+    # すべてのアクティブな場所を取得（プルダウン用）
+    all_locations = Location.objects.filter(is_active=True)
+    
+    # 予約可能期間の計算（一般ユーザーは1ヶ月、特別ユーザーは3ヶ月）
+    today = date.today()
+    max_days = 30  # デフォルトは1ヶ月
+    
+    if request.user.is_authenticated:
+        try:
+            profile = MemberProfile.objects.get(user=request.user)
+            if profile.is_special_user:
+                max_days = 90  # 特別ユーザーは3ヶ月
+        except MemberProfile.DoesNotExist:
+            pass
+    
+    max_date = today + timedelta(days=max_days)
+
+    edit_initial_slot_count = 0
+    if edit_mode and initial_slots_json and initial_slots_json != '{}':
+        try:
+            _slot_data = json.loads(initial_slots_json)
+            for _ids in _slot_data.values():
+                edit_initial_slot_count += len(_ids)
+        except (json.JSONDecodeError, TypeError):
+            pass
+
+    context = {
+        'location': location,
+        'locations': all_locations,
+        'week_start': week_start,
+        'week_dates': week_dates,
+        'time_slots': all_time_slots,
+        'availability_data': availability_data,
+        'prev_week': week_start - timedelta(days=7),
+        'next_week': week_start + timedelta(days=7),
+        'max_date': max_date,
+        'today': today,
+        'edit_mode': edit_mode,
+        'initial_slots_json': initial_slots_json,
+        'edit_reservation_pk': edit_reservation_obj.pk if edit_reservation_obj and edit_mode else None,
+        'edit_initial_slot_count': edit_initial_slot_count,
+    }
+
+    return render(request, 'reservations/reservation_weekly_calendar.html', context)
+
+
+@login_required
+@require_http_methods(["POST"])
+def reservation_weekly_calendar_delete_all(request):
+    """週間カレンダー編集: 同一日・同一場所の対象予約（自分分）をすべて削除"""
+    edit_pk = request.POST.get('edit_reservation')
+    if not edit_pk:
+        messages.error(request, '不正なリクエストです。')
+        return redirect('reservations:reservation_weekly_calendar')
+
+    reservation = get_object_or_404(Reservation, pk=edit_pk)
+    is_owner = (
+        request.user.is_superuser
+        or reservation.created_by_id == request.user.id
+        or reservation.customer_email == request.user.email
+    )
+    if not is_owner:
+        messages.error(request, 'この予約を削除する権限がありません。')
+        return redirect('reservations:reservation_detail', pk=reservation.pk)
+
+    if request.user.is_superuser:
+        qs = Reservation.objects.filter(
+            location=reservation.location,
+            date=reservation.date,
+            status__in=['confirmed', 'pending'],
+            customer_email=reservation.customer_email,
+        )
+    else:
+        qs = Reservation.objects.filter(
+            location=reservation.location,
+            date=reservation.date,
+            status__in=['confirmed', 'pending'],
+        ).filter(
+            Q(created_by=request.user) | Q(customer_email=request.user.email)
+        )
+
+    count = qs.count()
+    qs.delete()
+    messages.success(request, f'予約を{count}件削除しました。')
+    return redirect('reservations:reservation_list')
+
+
+def check_weekly_availability(request):
+    """週間の空き状況をチェック（AJAX）"""
+    if request.method == 'GET':
+        location_id = request.GET.get('location')
+        week_start_str = request.GET.get('week_start')
+        
+        if location_id and week_start_str:
+            try:
+                location = Location.objects.get(id=location_id, is_active=True)
+                week_start = datetime.strptime(week_start_str, '%Y-%m-%d').date()
+                
+                # 週の日付リスト
+                week_dates = [week_start + timedelta(days=i) for i in range(7)]
+                validators = _availability_validators(request, location, week_dates[0], week_dates[-1])
+                response = etags.not_modified(request, validators)
+                if response is not None:
+                    return etags.apply(response, validators)
+                
+                # すべての時間枠を取得
+                all_time_slots = TimeSlot.objects.filter(is_active=True).order_by('start_time')
+                
+                # 週間の予約状況を取得
+                week_reservations = Reservation.objects.filter(
+                    location=location,
+                    date__in=week_dates,
+                    status__in=['confirmed', 'pending']
+                ).select_related('time_slot', 'created_by')
+                
+                # 日付と時間枠ごとの予約状況を整理
+                availability_data = {}
+                for d in week_dates:
+                    date_str = d.isoformat()
+                    availability_data[date_str] = {}
+                    
+                    for slot in all_time_slots:
+                        reservations = week_reservations.filter(date=d, time_slot=slot)
+                        is_booked_by_others = False
+                        is_my_reservation = False
+                        
+                        if request.user.is_authenticated:
+                            my_reservation = reservations.filter(created_by=request.user).first()
+                            if my_reservation:
+                                is_my_reservation = True
+                            else:
+                                is_booked_by_others = reservations.exists()
+                        else:
+                            is_booked_by_others = reservations.exists()
+                        
+                        availability_data[date_str][slot.id] = {
+                            'is_available': not is_booked_by_others,
+                            'is_my_reservation': is_my_reservation,
+                            'is_booked_by_others': is_booked_by_others
+                        }
+                
+                return etags.apply(JsonResponse({
+                    'availability': availability_data,
+                    'time_slots': [
+                        {
+                            'id': slot.id,
+                            'start_time': slot.start_time.strftime('%H:%M'),
+                            'end_time': slot.end_time.strftime('%H:%M')
+                        }
+                        for slot in all_time_slots
+                    ]
+                }), validators)
+            except (Location.DoesNotExist, ValueError) as e:
+                return JsonResponse({'error': f'無効なリクエストです: {str(e)}'}, status=400)
+        
+        return JsonResponse({'error': '必要なパラメータが不足しています。'}, status=400)
+    
+    return JsonResponse({'error': 'GETメソッドのみサポートしています。'}, status=405)
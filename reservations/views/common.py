@@ -0,0 +1,139 @@
+"""予約の表示・フォームで共通に使うヘルパー。"""
+from django.urls import reverse
+from datetime import date, datetime
+from ..models import Reservation
+
+
+# ModelBackend + allauth 併用時、create_user 直後の login には backend の指定が必要
+_LOGIN_BACKEND_MODEL = 'django.contrib.auth.backends.ModelBackend'
+
+
+def _consecutive_reservations_group(reservation):
+    """予約編集と同じく、同一日・同一場所・連続する時間枠のグループを返す。"""
+    consecutive = [reservation]
+    all_reservations = list(Reservation.objects.filter(
+        date=reservation.date,
+        location=reservation.location,
+        customer_email=reservation.customer_email,
+        status__in=['confirmed', 'pending'],
+    ).select_related('time_slot').order_by('time_slot__start_time'))
+    current_index = next((i for i, r in enumerate(all_reservations) if r.id == reservation.id), None)
+    if current_index is None:
+        return consecutive
+    for i in range(current_index - 1, -1, -1):
+        prev_reservation = all_reservations[i]
+        current_start = consecutive[0].time_slot.start_time
+        prev_end = prev_reservation.time_slot.end_time
+        if prev_end == current_start or (
+            datetime.combine(date.today(), current_start) - datetime.combine(date.today(), prev_end)
+        ).total_seconds() <= 60:
+            consecutive.insert(0, prev_reservation)
+        else:
+            break
+    for i in range(current_index + 1, len(all_reservations)):
+        next_reservation = all_reservations[i]
+        current_end = consecutive[-1].time_slot.end_time
+        next_start = next_reservation.time_slot.start_time
+        if current_end == next_start or (
+            datetime.combine(date.today(), next_start) - datetime.combine(date.today(), current_end)
+        ).total_seconds() <= 60:
+            consecutive.append(next_reservation)
+        else:
+            break
+    return consecutive
+
+
+def _reservation_form_back_url(request, form, *, is_multi_date=False, session_location_id=None, reservation=None):
+    """
+    予約フォームの「戻る」先。カレンダーで時間選択後は週間カレンダーへ戻す。
+    予約編集時は週間カレンダーの編集モードへ。
+    場所が特定できない場合のみトップへ。
+    """
+    weekly = reverse('reservations:reservation_weekly_calendar')
+    lid = request.GET.get('location')
+    if lid:
+        return f'{weekly}?location={lid}'
+    if is_multi_date and session_location_id is not None:
+        return f'{weekly}?location={session_location_id}'
+    if reservation is not None:
+        ws = reservation.date.isoformat()
+        return (
+            f'{weekly}?location={reservation.location_id}'
+            f'&week_start={ws}&edit_reservation={reservation.pk}'
+        )
+    if form is not None and getattr(form, 'data', None) and form.data.get('location'):
+        return f'{weekly}?location={form.data.get("location")}'
+    init_loc = (form.initial or {}).get('location') if form else None
+    if init_loc is not None:
+        pk = init_loc.pk if hasattr(init_loc, 'pk') else init_loc
+        return f'{weekly}?location={pk}'
+    return reverse('reservations:index')
+
+
+def group_consecutive_reservations(reservations):
+    """連続した予約をまとめる"""
+    if not reservations:
+        return []
+    
+    # 日付、場所、ユーザー（email）でグループ化し、時間順にソート
+    grouped = {}
+    for reservation in reservations:
+        key = (reservation.date, reservation.location.id, reservation.customer_email)
+        if key not in grouped:
+            grouped[key] = []
+        grouped[key].append(reservation)
+    
+    # 各グループ内で時間順にソート
+    for key in grouped:
+        grouped[key].sort(key=lambda r: r.time_slot.start_time)
+    
+    # 連続した予約をまとめる
+    grouped_reservations = []
+    for key, group in grouped.items():
+        if len(group) == 1:
+            grouped_reservations.append({
+                'reservations': group,
+                'start_time': group[0].time_slot.start_time,
+                'end_time': group[0].time_slot.end_time,
+                'customer_name': group[0].customer_name,
+                'customer_email': group[0].customer_email,
+                'location': group[0].location,
+                'date': group[0].date,
+                'status': group[0].status,
+                'notes': group[0].notes or '',
+                'ids': [r.id for r in group]
+            })
+        else:
+            # 連続しているかチェック
+            consecutive_groups = []
+            current_group = [group[0]]
+            
+            for i in range(1, len(group)):
+                prev_end = current_group[-1].time_slot.end_time
+                curr_start = group[i].time_slot.start_time
+                
+                # 前の終了時間と現在の開始時間が同じか、1分以内なら連続
+                if prev_end == curr_start or (datetime.combine(date.today(), curr_start) - datetime.combine(date.today(), prev_end)).total_seconds() <= 60:
+                    current_group.append(group[i])
+                else:
+                    consecutive_groups.append(current_group)
+                    current_group = [group[i]]
+            
+            consecutive_groups.append(current_group)
+            
+            # 各連続グループをまとめる
+            for consecutive_group in consecutive_groups:
+                grouped_reservations.append({
+                    'reservations': consecutive_group,
+                    'start_time': consecutive_group[0].time_slot.start_time,
+                    'end_time': consecutive_group[-1].time_slot.end_time,
+                    'customer_name': consecutive_group[0].customer_name,
+                    'customer_email': consecutive_group[0].customer_email,
+                    'location': consecutive_group[0].location,
+                    'date': consecutive_group[0].date,
+                    'status': consecutive_group[0].status,
+                    'notes': consecutive_group[0].notes or '',
+                    'ids': [r.id for r in consecutive_group]
+                })
+    
+    return grouped_reservations
@@ -0,0 +1,421 @@
+"""ログイン・会員登録・ユーザー情報・会員QRコード。"""
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth import authenticate, login
+from django.contrib.auth.models import User
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import url_has_allowed_host_and_scheme
+import base64
+import logging
+from ..models import Plan, MemberProfile, PaymentTransaction
+from ..member_utils import get_default_regular_member_plan
+from ..forms import (
+    MemberRegistrationStep1Form,
+    MemberRegistrationStep2Form,
+    MemberRegistrationStep3Form,
+    MemberRegistrationStep4Form,
+    MemberRegistrationSimpleForm,
+)
+from ..registration_notifications import send_registration_mails
+from .. import calendar_feed, member_qr, temp_uploads
+from .common import _LOGIN_BACKEND_MODEL
+from .payments import create_payment_link, square_payments_enabled
+
+logger = logging.getLogger(__name__)
+
+
+def custom_login(request):
+    """カスタムログインビュー"""
+    if request.method == 'POST':
+        username = request.POST.get('username')
+        password = request.POST.get('password')
+        user = authenticate(request, username=username, password=password)
+        if user is not None:
+            login(request, user)
+            messages.success(request, 'ログインしました。')
+            next_url = request.POST.get('next') or request.GET.get('next')
+            if next_url and url_has_allowed_host_and_scheme(
+                next_url,
+                allowed_hosts={request.get_host()},
+                require_https=request.is_secure(),
+            ):
+                return redirect(next_url)
+            return redirect('reservations:index')
+        else:
+            messages.error(request, 'ユーザー名またはパスワードが正しくありません。')
+
+    return render(request, 'reservations/login.html', {
+        'next': request.GET.get('next', ''),
+    })
+
+
+def member_registration_simple(request):
+    """会員登録（簡易）: 氏名・メール・パスワードのみ。プランはデフォルト通常会員。"""
+    if request.user.is_authenticated:
+        return redirect('reservations:index')
+
+    if request.method == 'POST':
+        form = MemberRegistrationSimpleForm(request.POST)
+        if form.is_valid():
+            plan = get_default_regular_member_plan()
+            if not plan:
+                messages.error(
+                    request,
+                    '利用可能な会員プランが設定されていません。管理者にお問い合わせください。',
+                )
+                return render(request, 'reservations/member_registration_simple.html', {'form': form})
+
+            try:
+                user = User.objects.create_user(
+                    username=form.cleaned_data['email'],
+                    email=form.cleaned_data['email'],
+                    password=form.cleaned_data['password'],
+                )
+                profile = MemberProfile.objects.create(
+                    user=user,
+                    full_name=form.cleaned_data['full_name'],
+                    gender='other',
+                    phone='',
+                    postal_code='',
+                    address='',
+                    plan=plan,
+                )
+
+                if plan.price > 0 and square_payments_enabled():
+                    request.session['pending_registration_user_id'] = user.id
+                    result = create_payment_link(
+                        request,
+                        amount=plan.price,
+                        order_id=f'member_registration_{user.id}',
+                        description=f'会員登録料金 - {plan.name}',
+                    )
+                    if result['success']:
+                        PaymentTransaction.objects.create(
+                            member_profile=profile,
+                            payment_link_id=result['payment_link_id'],
+                            payment_link_url=result['payment_link_url'],
+                            square_order_id=result.get('order_id'),
+                            amount=plan.price,
+                            status='pending',
+                        )
+                        return redirect(result['payment_link_url'])
+                    messages.error(
+                        request,
+                        f'決済リンクの作成に失敗しました: {", ".join(result["errors"])}',
+                    )
+                    profile.delete()
+                    user.delete()
+                    return render(request, 'reservations/member_registration_simple.html', {'form': form})
+
+                # 料金ゼロ、または Square 無効時は決済なしで完了
+                login(request, user, backend=_LOGIN_BACKEND_MODEL)
+                send_registration_mails(request, user, profile)
+                messages.success(request, '会員登録が完了しました。')
+                return redirect('reservations:index')
+            except Exception as e:
+                messages.error(request, f'会員登録中にエラーが発生しました: {str(e)}')
+    else:
+        form = MemberRegistrationSimpleForm()
+
+    return render(request, 'reservations/member_registration_simple.html', {'form': form})
+
+
+def member_registration(request):
+    """会員登録ウィザード"""
+    # セッションキー
+    session_key = 'member_registration_data'
+    
+    # ステップを取得
+    step = int(request.GET.get('step', 1))
+    
+    # セッションからデータを取得
+    registration_data = request.session.get(session_key, {})
+    
+    if step == 1:
+        # Step1: 基本情報
+        if request.method == 'POST':
+            form = MemberRegistrationStep1Form(request.POST)
+            if form.is_valid():
+                # セッションに保存
+                cleaned_data = form.cleaned_data.copy()
+                registration_data['step1'] = cleaned_data
+                request.session[session_key] = registration_data
+                return redirect(f"{reverse('reservations:member_registration')}?step=2")
+        else:
+            # セッションからデータを復元
+            initial_data = registration_data.get('step1', {}).copy()
+            form = MemberRegistrationStep1Form(initial=initial_data)
+        
+        return render(request, 'reservations/member_registration_step1.html', {
+            'form': form,
+            'step': 1,
+            'total_steps': 4
+        })
+    
+    elif step == 2:
+        # Step1のデータが必要
+        if 'step1' not in registration_data:
+            messages.warning(request, '最初から入力してください。')
+            return redirect(f"{reverse('reservations:member_registration')}?step=1")
+        
+        # Step2: プラン選択
+        if request.method == 'POST':
+            form = MemberRegistrationStep2Form(request.POST)
+            if form.is_valid():
+                # セッションに保存（PlanオブジェクトをIDに変換）
+                cleaned_data = form.cleaned_data.copy()
+                if 'plan' in cleaned_data and cleaned_data['plan']:
+                    cleaned_data['plan_id'] = cleaned_data['plan'].id
+                    del cleaned_data['plan']  # Planオブジェクトを削除
+                registration_data['step2'] = cleaned_data
+                request.session[session_key] = registration_data
+                return redirect(f"{reverse('reservations:member_registration')}?step=3")
+        else:
+            # セッションからデータを復元（IDからPlanオブジェクトに変換）
+            initial_data = registration_data.get('step2', {}).copy()
+            if 'plan_id' in initial_data:
+                try:
+                    initial_data['plan'] = Plan.objects.get(id=initial_data['plan_id'])
+                    del initial_data['plan_id']
+                except Plan.DoesNotExist:
+                    pass
+            # セッションにデータがない場合は、フォームのデフォルト値を使用
+            form = MemberRegistrationStep2Form(initial=initial_data)
+        
+        return render(request, 'reservations/member_registration_step2.html', {
+            'form': form,
+            'step': 2,
+            'total_steps': 4,
+            'plans': Plan.objects.filter(is_active=True)
+        })
+    
+    elif step == 3:
+        # Step1とStep2のデータが必要
+        if 'step1' not in registration_data or 'step2' not in registration_data:
+            messages.warning(request, '最初から入力してください。')
+            return redirect(f"{reverse('reservations:member_registration')}?step=1")
+        
+        # Step3: 顔写真登録
+        if request.method == 'POST':
+            form = MemberRegistrationStep3Form(request.POST, request.FILES)
+            # 画像は一時ファイルにチャンク単位で書き出し、セッションにはハンドルだけを置く
+            photo_base64 = request.POST.get('photo_base64')
+            photo_handle = None
+            if form.is_valid() and form.cleaned_data.get('photo'):
+                # ファイルアップロード（カメラ撮影も Blob として送られる）
+                photo_handle = temp_uploads.save_upload(form.cleaned_data['photo'])
+            elif photo_base64:
+                # Base64データ（ファイル入力に Blob を設定できないブラウザ向け）
+                try:
+                    photo_handle = temp_uploads.save_base64(photo_base64)
+                except ValueError:
+                    messages.error(request, '写真を読み込めませんでした。もう一度お試しください。')
+                    return redirect(f"{reverse('reservations:member_registration')}?step=3")
+            if photo_handle or form.is_valid():
+                previous = registration_data.get('step3', {}).get('photo_handle')
+                if previous:
+                    temp_uploads.discard(previous)
+                registration_data['step3'] = (
+                    {'photo_type': 'upload', 'photo_handle': photo_handle} if photo_handle else {}
+                )
+                request.session[session_key] = registration_data
+                return redirect(f"{reverse('reservations:member_registration')}?step=4")
+        else:
+            form = MemberRegistrationStep3Form()
+        
+        # アップロード済みの写真がある場合
+        photo_data = registration_data.get('step3', {})
+        
+        return render(request, 'reservations/member_registration_step3.html', {
+            'form': form,
+            'step': 3,
+            'total_steps': 4,
+            'photo_data': photo_data
+        })
+    
+    elif step == 4:
+        # Step1、Step2、Step3のデータが必要
+        if 'step1' not in registration_data or 'step2' not in registration_data:
+            messages.warning(request, '最初から入力してください。')
+            return redirect(f"{reverse('reservations:member_registration')}?step=1")
+        
+        # Step4: クレジットカード情報
+        if request.method == 'POST':
+            form = MemberRegistrationStep4Form(request.POST)
+            if form.is_valid():
+                registration_data['step4'] = form.cleaned_data
+                request.session[session_key] = registration_data
+                
+                # すべてのステップが完了したら、会員を作成
+                try:
+                    step1_data = registration_data['step1']
+                    step2_data = registration_data['step2']
+                    step3_data = registration_data.get('step3', {})
+                    step4_data = registration_data['step4']
+                    
+                    # ユーザー作成
+                    user = User.objects.create_user(
+                        username=step1_data['email'],
+                        email=step1_data['email'],
+                        password=step1_data['password']
+                    )
+                    
+                    # Planオブジェクトを取得
+                    plan = None
+                    if 'plan_id' in step2_data:
+                        plan = Plan.objects.get(id=step2_data['plan_id'])
+                    elif 'plan' in step2_data:
+                        plan = step2_data['plan']
+                    
+                    profile = MemberProfile.objects.create(
+                        user=user,
+                        full_name=step1_data['full_name'],
+                        gender=step1_data['gender'],
+                        phone=step1_data.get('phone', ''),
+                        postal_code=step1_data.get('postal_code', ''),
+                        address=step1_data.get('address', ''),
+                        plan=plan
+                    )
+                    
+                    # クレジットカード情報（簡易実装：実際には暗号化すべき）
+                    # ここではセッションから取得したデータをそのまま保存（非推奨）
+                    card_number = step4_data['card_number'].replace('-', '').replace(' ', '')
+                    profile.card_number_encrypted = base64.b64encode(card_number.encode()).decode()
+                    profile.card_expiry_month = step4_data['card_expiry_month']
+                    profile.card_expiry_year = step4_data['card_expiry_year']
+                    profile.card_cvc_encrypted = base64.b64encode(step4_data['card_cvc'].encode()).decode()
+                    profile.save()
+                    
+                    # 顔写真の保存（Step3 で一時保存した画像を保存先へ移動）
+                    # 縮小処理のジョブが写真を差し替えるため、プロフィールの保存より後に行う
+                    if step3_data.get('photo_type') == 'upload':
+                        try:
+                            temp_uploads.move_to_field(step3_data.get('photo_handle'), profile.photo)
+                        except Exception:
+                            # エラーが発生しても登録は続行
+                            logger.exception('会員 %s の顔写真を保存できませんでした', profile.pk)
+                    
+                    # プランの料金があり Square 有効時のみ決済へ
+                    if plan and plan.price > 0 and square_payments_enabled():
+                        # セッションにユーザーIDを保存（決済完了後に会員登録を完了させるため）
+                        request.session['pending_registration_user_id'] = user.id
+                        
+                        # Square決済リンクを作成
+                        result = create_payment_link(
+                            request,
+                            amount=plan.price,
+                            order_id=f"member_registration_{user.id}",
+                            description=f'会員登録料金 - {plan.name}'
+                        )
+                        
+                        if result['success']:
+                            # 決済トランザクションを保存
+                            transaction = PaymentTransaction.objects.create(
+                                member_profile=profile,
+                                payment_link_id=result['payment_link_id'],
+                                payment_link_url=result['payment_link_url'],
+                                square_order_id=result.get('order_id'),
+                                amount=plan.price,
+                                status='pending'
+                            )
+                            
+                            # セッションをクリア（決済完了まで保持）
+                            # del request.session[session_key]  # 決済完了まで保持
+                            
+                            # Square決済ページにリダイレクト
+                            return redirect(result['payment_link_url'])
+                        else:
+                            # 決済リンク作成失敗時はエラーメッセージを表示
+                            messages.error(request, f'決済リンクの作成に失敗しました: {", ".join(result["errors"])}')
+                            # ユーザーとプロフィールを削除（ロールバック）
+                            profile.delete()
+                            user.delete()
+                            return redirect(f"{reverse('reservations:member_registration')}?step=1")
+                    else:
+                        # 料金が0、または Square 無効時は決済なしで会員登録を完了
+                        # セッションをクリア
+                        del request.session[session_key]
+                        
+                        # 自動ログイン
+                        login(request, user, backend=_LOGIN_BACKEND_MODEL)
+                        send_registration_mails(request, user, profile)
+                        messages.success(request, '会員登録が完了しました。')
+                        return redirect('reservations:index')
+                
+                except Exception as e:
+                    messages.error(request, f'会員登録中にエラーが発生しました: {str(e)}')
+                    return redirect(f"{reverse('reservations:member_registration')}?step=1")
+        else:
+            form = MemberRegistrationStep4Form()
+        
+        return render(request, 'reservations/member_registration_step4.html', {
+            'form': form,
+            'step': 4,
+            'total_steps': 4
+        })
+    
+    else:
+        messages.error(request, '無効なステップです。')
+        return redirect(f"{reverse('reservations:member_registration')}?step=1")
+
+
+@login_required
+def user_profile(request):
+    """ユーザー情報表示"""
+    try:
+        profile = MemberProfile.objects.get(user=request.user)
+    except MemberProfile.DoesNotExist:
+        profile = None
+
+    return render(request, 'reservations/user_profile.html', {
+        'profile': profile,
+        'qr_image_url': member_qr.image_url(profile) if profile else None,
+        'calendar_feed_url': request.build_absolute_uri(
+            reverse('reservations:calendar_ics_feed', args=[calendar_feed.feed_token(request.user)])
+        ),
+    })
+
+
+@login_required
+def member_qr_page(request):
+    """会員QRコードのみ表示"""
+    try:
+        profile = MemberProfile.objects.get(user=request.user)
+    except MemberProfile.DoesNotExist:
+        messages.info(request, '会員プロフィールがないため、会員QRコードを表示できません。')
+        return redirect('reservations:user_profile')
+
+    return render(request, 'reservations/member_qr.html', {
+        'profile': profile,
+        'qr_image_url': member_qr.image_url(profile) if profile else None,
+    })
+
+
+@login_required
+def member_qr_image(request, version=None):
+    """
+    ログイン中ユーザーの会員QRコード（SVG）。生成済みの SVG をキャッシュから返す。
+    version 付きの URL（member_qr.image_url）は内容が変わらないため長期間キャッシュさせ、
+    旧 URL は ETag による再検証（304）のみとする。
+    """
+    profile = get_object_or_404(MemberProfile.objects.only('member_qr_token'), user=request.user)
+    current = member_qr.version(profile.member_qr_token)
+    if version is not None and version != current:
+        raise Http404
+    etag = member_qr.etag(profile.member_qr_token)
+    cache_control = 'private, max-age=31536000, immutable' if version else 'private, no-cache'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            svg = member_qr.get_svg(profile.member_qr_token)
+        except member_qr.QRUnavailable as e:
+            return HttpResponse(str(e), status=503, content_type='text/plain; charset=utf-8')
+        response = HttpResponse(svg, content_type='image/svg+xml; charset=utf-8')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    patch_vary_headers(response, ['Cookie'])
+    return response
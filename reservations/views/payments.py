@@ -0,0 +1,326 @@
+"""Square 決済（決済リンクの作成・決済完了・Webhook・メトリクス）。"""
+from django.shortcuts import redirect, get_object_or_404
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth import login
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from datetime import datetime
+import hmac
+import hashlib
+from ..models import Reservation, MemberProfile, PaymentTransaction
+from ..decorators import superuser_required
+from ..registration_notifications import send_registration_mails
+from .. import booking_drafts, square_client, square_events
+from .common import _LOGIN_BACKEND_MODEL
+
+
+# SDK は読み込みに時間がかかるため、ここでは有無だけ確認し、実際の読み込みは最初の API 呼び出しまで遅らせる
+SQUARE_AVAILABLE = square_client.sdk_available()
+
+
+def square_payments_enabled():
+    """Square 決済連携を使うか（settings.SQUARE_INTEGRATION_ENABLED かつ SDK 利用可）。"""
+    from django.conf import settings
+    return bool(getattr(settings, 'SQUARE_INTEGRATION_ENABLED', False)) and SQUARE_AVAILABLE
+
+
+def get_square_client():
+    """Square APIクライアントを取得（プロセス内で共有。square_client 参照）"""
+    if not SQUARE_AVAILABLE:
+        raise ImportError('Square SDK is not installed')
+    from django.conf import settings as django_settings
+    if not getattr(django_settings, 'SQUARE_INTEGRATION_ENABLED', False):
+        raise RuntimeError('Square integration is disabled (SQUARE_INTEGRATION_ENABLED=False)')
+    return square_client.get_client()
+
+
+def create_payment_link(request, amount, order_id=None, description=''):
+    """Square決済リンクを作成"""
+    from django.conf import settings
+    if not getattr(settings, 'SQUARE_INTEGRATION_ENABLED', False):
+        return {
+            'success': False,
+            'errors': ['Square integration is disabled (SQUARE_INTEGRATION_ENABLED=False).'],
+        }
+    try:
+        get_square_client()
+        
+        # location_idを取得（必須）
+        location_id = settings.SQUARE_LOCATION_ID
+        if not location_id:
+            return {
+                'success': False,
+                'errors': ['SQUARE_LOCATION_IDが設定されていません。']
+            }
+        
+        # 決済リンクの作成（idempotency_key を固定して再試行しても二重作成されないようにする）
+        result = square_client.call(
+            'checkout.create_payment_link',
+            idempotent=True,
+            body={
+                'idempotency_key': f"{order_id}_{datetime.now().timestamp()}" if order_id else f"payment_{datetime.now().timestamp()}",
+                'quick_pay': {
+                    'name': description or '決済',
+                    'price_money': {
+                        'amount': int(amount),
+                        'currency': 'JPY'
+                    },
+                    'location_id': location_id
+                }
+            }
+        )
+        
+        # レスポンスのエラーチェック（Square SDK 39.1.0の形式）
+        if hasattr(result, 'is_success') and not result.is_success():
+            # エラーがある場合
+            errors = []
+            if hasattr(result, 'errors') and result.errors:
+                errors = [str(error) for error in result.errors]
+            elif hasattr(result, 'body') and hasattr(result.body, 'errors'):
+                errors = [str(error) for error in result.body.errors]
+            else:
+                errors = ['決済リンクの作成に失敗しました。']
+            return {
+                'success': False,
+                'errors': errors
+            }
+        
+        # レスポンスボディから決済リンク情報を取得
+        # Square SDK 39.1.0のレスポンス構造を確認
+        import logging
+        logger = logging.getLogger(__name__)
+        
+        # レスポンスが成功しているか確認
+        if hasattr(result, 'is_success') and result.is_success():
+            # 成功の場合、bodyからpayment_linkを取得
+            if hasattr(result, 'body') and result.body:
+                # result.body.payment_link を確認
+                if hasattr(result.body, 'payment_link'):
+                    payment_link = result.body.payment_link
+                # result.body自体がpayment_linkの場合
+                elif hasattr(result.body, 'id') and hasattr(result.body, 'url'):
+                    payment_link = result.body
+                else:
+                    # レスポンス構造をログに記録
+                    body_attrs = [attr for attr in dir(result.body) if not attr.startswith('_')]
+                    logger.error(f"Unknown response structure. Body type: {type(result.body)}, Body attributes: {body_attrs}")
+                    # 辞書形式の場合も試す
+                    if isinstance(result.body, dict):
+                        payment_link = result.body.get('payment_link') or result.body
+                    else:
+                        return {
+                            'success': False,
+                            'errors': [f'決済リンクの作成に失敗しました。レスポンス形式が不明です。Body type: {type(result.body)}, Attributes: {body_attrs}']
+                        }
+                
+                # payment_linkから情報を取得
+                if payment_link:
+                    # オブジェクト形式の場合
+                    if hasattr(payment_link, 'id'):
+                        payment_link_id = payment_link.id
+                        payment_link_url = getattr(payment_link, 'url', None)
+                        order_id = getattr(payment_link, 'order_id', None)
+                    # 辞書形式の場合
+                    elif isinstance(payment_link, dict):
+                        payment_link_id = payment_link.get('id')
+                        payment_link_url = payment_link.get('url')
+                        order_id = payment_link.get('order_id')
+                    else:
+                        return {
+                            'success': False,
+                            'errors': ['決済リンクの作成に失敗しました。レスポンス形式が不明です。']
+                        }
+                    
+                    if payment_link_id and payment_link_url:
+                        return {
+                            'success': True,
+                            'payment_link_id': payment_link_id,
+                            'payment_link_url': payment_link_url,
+                            'order_id': order_id
+                        }
+        
+        # エラーまたは不明なレスポンス形式
+        result_attrs = [attr for attr in dir(result) if not attr.startswith('_')]
+        logger.error(f"Failed to create payment link. Result type: {type(result)}, Attributes: {result_attrs}")
+        return {
+            'success': False,
+            'errors': ['決済リンクの作成に失敗しました。レスポンス形式が不明です。']
+        }
+    
+    except Exception as e:
+        return {
+            'success': False,
+            'errors': [str(e)]
+        }
+
+
+@login_required
+def payment_create(request, reservation_id=None):
+    """決済リンク作成（予約または会員登録用）"""
+    from django.conf import settings as django_settings
+    if not getattr(django_settings, 'SQUARE_INTEGRATION_ENABLED', False):
+        messages.info(request, '現在オンライン決済（Square）は無効です。')
+        return redirect('reservations:index')
+
+    if reservation_id:
+        reservation = get_object_or_404(Reservation, pk=reservation_id)
+        amount = 1000  # 予約料金（仮）
+        description = f'予約料金 - {reservation.location.name}'
+        order_id = f"reservation_{reservation.id}"
+    else:
+        # 会員登録料金
+        try:
+            profile = MemberProfile.objects.get(user=request.user)
+            if profile.plan:
+                amount = int(profile.plan.price)
+            else:
+                amount = 0
+        except MemberProfile.DoesNotExist:
+            amount = 0
+        description = '会員登録料金'
+        order_id = f"member_{request.user.id}"
+    
+    if amount <= 0:
+        messages.warning(request, '決済する金額がありません。')
+        return redirect('reservations:index')
+    
+    # 決済リンクを作成
+    result = create_payment_link(request, amount, order_id, description)
+    
+    if result['success']:
+        # 決済トランザクションを保存
+        try:
+            member_profile = MemberProfile.objects.get(user=request.user) if not reservation_id else None
+        except MemberProfile.DoesNotExist:
+            member_profile = None
+        
+        transaction = PaymentTransaction.objects.create(
+            reservation=reservation if reservation_id else None,
+            member_profile=member_profile,
+            payment_link_id=result['payment_link_id'],
+            payment_link_url=result['payment_link_url'],
+            square_order_id=result.get('order_id'),
+            amount=amount,
+            status='pending'
+        )
+        
+        # 決済リンクにリダイレクト
+        return redirect(result['payment_link_url'])
+    else:
+        messages.error(request, f'決済リンクの作成に失敗しました: {", ".join(result["errors"])}')
+        return redirect('reservations:index')
+
+
+def _warn_unfulfilled(request, transaction):
+    """決済中に他の予約が入って予約できなかった枠があれば、返金が必要なことを伝える。"""
+    missing = booking_drafts.unfulfilled_slots(transaction)
+    if missing:
+        messages.error(
+            request,
+            f'決済は完了しましたが、お支払いの間に他の予約が入ったため {len(missing)}枠を予約できませんでした。'
+            'この分の料金は返金いたしますので、お問い合わせください。',
+        )
+
+
+def payment_complete(request):
+    """決済完了後のリダイレクト先"""
+    payment_link_id = request.GET.get('payment_link_id')
+    order_id = request.GET.get('order_id')
+    
+    transaction = None
+    if payment_link_id:
+        try:
+            transaction = PaymentTransaction.objects.get(payment_link_id=payment_link_id)
+        except PaymentTransaction.DoesNotExist:
+            pass
+    
+    if not transaction and order_id:
+        try:
+            transaction = PaymentTransaction.objects.filter(square_order_id=order_id).first()
+        except:
+            pass
+    
+    if transaction:
+        if transaction.status == 'completed':
+            # 決済完了
+            if transaction.member_profile:
+                # 会員登録の場合は自動ログイン
+                profile = transaction.member_profile
+                user = profile.user
+                login(request, user, backend=_LOGIN_BACKEND_MODEL)
+                send_registration_mails(request, user, profile)
+                messages.success(request, '決済が完了しました。会員登録が完了しました。')
+                return redirect('reservations:index')
+            elif transaction.reservation:
+                # 予約の場合は予約詳細ページへ
+                _warn_unfulfilled(request, transaction)
+                messages.success(request, '決済が完了しました。予約が確定しました。')
+                return redirect('reservations:reservation_detail', pk=transaction.reservation.id)
+            else:
+                # 予約がまだ作成されていない場合、手続き中データから予約を作成（Webhook で作成済みならそれを返す）
+                try:
+                    created_reservations = booking_drafts.finalize(transaction)
+                except Exception as e:
+                    print(f"Error creating reservation in payment_complete: {e}")
+                    messages.error(request, '予約の作成中にエラーが発生しました。')
+                    return redirect('reservations:index')
+                booking_drafts.clear(request)
+                _warn_unfulfilled(request, transaction)
+
+                if created_reservations:
+                    messages.success(request, '決済が完了しました。予約が確定しました。')
+                    return redirect('reservations:reservation_detail', pk=created_reservations[0].pk)
+                if booking_drafts.unfulfilled_slots(transaction):
+                    return redirect('reservations:index')
+
+                messages.info(request, '決済処理中です。しばらくお待ちください。')
+                return redirect('reservations:index')
+        else:
+            messages.info(request, '決済処理中です。しばらくお待ちください。')
+            return redirect('reservations:index')
+    else:
+        messages.error(request, '決済情報が見つかりませんでした。')
+        return redirect('reservations:index')
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def square_webhook(request):
+    """Square Webhookエンドポイント（イベントを保存して即座に 200 を返す）"""
+    from django.conf import settings
+    from decouple import config as decouple_config
+
+    if not getattr(settings, 'SQUARE_INTEGRATION_ENABLED', False):
+        return HttpResponse(status=200, content='Square integration disabled')
+
+    # Webhook署名の検証（本番環境では必須）
+    signature = request.headers.get('X-Square-Signature', '')
+    webhook_secret = decouple_config('SQUARE_WEBHOOK_SECRET', default='')
+    
+    if webhook_secret:
+        # 署名検証（簡易実装）
+        body = request.body
+        expected_signature = hmac.new(
+            webhook_secret.encode('utf-8'),
+            body,
+            hashlib.sha256
+        ).hexdigest()
+        
+        if not hmac.compare_digest(signature, expected_signature):
+            return JsonResponse({'error': 'Invalid signature'}, status=401)
+    
+    # 受信内容を保存して処理ジョブを予約するだけにし、反映は run_worker が行う（square_events 参照）
+    try:
+        square_events.ingest_event(request.body)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({'status': 'success'})
+
+
+@superuser_required
+def square_metrics(request):
+    """Square API の操作ごとのレイテンシ・エラー数とサーキットブレーカーの状態（このワーカープロセス分）"""
+    return JsonResponse(square_client.metrics_snapshot())
@@ -0,0 +1,106 @@
+"""繰り返し予約（毎週・隔週）の作成・詳細・一括変更・キャンセル。"""
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from .. import booking_drafts, series
+from ..forms import ReservationSeriesForm
+from ..models import ReservationSeries
+from .common import group_consecutive_reservations
+
+
+def _can_manage(user, reservation_series):
+    return (
+        user.is_superuser
+        or reservation_series.created_by_id == user.id
+        or (user.email and reservation_series.customer_email == user.email)
+    )
+
+
+@login_required
+def reservation_series_create(request):
+    """
+    繰り返し予約の入力。各回の日付を展開し、空きを 1 回のクエリで確認してから
+    複数日の予約と同じ確認画面（reservation_confirm）へ進む。
+    """
+    if request.method == 'POST':
+        form = ReservationSeriesForm(request.POST, user=request.user)
+        if form.is_valid():
+            location = form.cleaned_data['location']
+            time_slot_ids = sorted(time_slot.pk for time_slot in form.cleaned_data['time_slots'])
+            dates = form.occurrence_dates()
+            taken = series.taken_slots(location.pk, {day: time_slot_ids for day in dates})
+            slots_by_date = {}
+            for day in dates:
+                free = [tid for tid in time_slot_ids if (day, tid) not in taken]
+                if free:
+                    slots_by_date[day.isoformat()] = free
+            if not slots_by_date:
+                form.add_error(None, '指定した日程の時間枠はすべて予約済みです。')
+            else:
+                count = form.cleaned_data['count']
+                if count and len(dates) < count:
+                    messages.warning(request, f'予約可能な期間内の {len(dates)}回分のみ予約します。')
+                booking_drafts.save(request, {
+                    'location': location.pk,
+                    'multi_date_slots': slots_by_date,
+                    'is_multi_date': True,
+                    'customer_name': form.cleaned_data['customer_name'],
+                    'customer_email': form.cleaned_data['customer_email'],
+                    'customer_phone': '',
+                    'notes': form.cleaned_data['notes'],
+                    'series': {
+                        'interval_weeks': form.cleaned_data['interval_weeks'],
+                        'skipped_dates': sorted({day.isoformat() for day, _ in taken}),
+                    },
+                })
+                return redirect('reservations:reservation_confirm')
+    else:
+        form = ReservationSeriesForm(user=request.user)
+
+    return render(request, 'reservations/reservation_series_form.html', {'form': form})
+
+
+@login_required
+def reservation_series_detail(request, pk):
+    """繰り返し予約の詳細。POST で今後の回のお客様名・備考をまとめて変更する。"""
+    reservation_series = get_object_or_404(ReservationSeries.objects.select_related('location'), pk=pk)
+    if not _can_manage(request.user, reservation_series):
+        messages.error(request, 'この予約を閲覧する権限がありません。')
+        return redirect('reservations:index')
+
+    if request.method == 'POST':
+        customer_name = request.POST.get('customer_name', '').strip()
+        if not customer_name:
+            messages.error(request, 'お客様名を入力してください。')
+        else:
+            count = series.update_upcoming(
+                reservation_series,
+                customer_name=customer_name[:100],
+                notes=request.POST.get('notes', '').strip(),
+            )
+            messages.success(request, f'今後の {count}件の予約を変更しました。')
+            return redirect('reservations:reservation_series_detail', pk=pk)
+
+    reservations = list(
+        reservation_series.reservations.select_related('location', 'time_slot').order_by('date', 'time_slot__start_time')
+    )
+    return render(request, 'reservations/reservation_series_detail.html', {
+        'series': reservation_series,
+        'reservation_groups': group_consecutive_reservations(reservations),
+        'upcoming_count': series.upcoming(reservation_series).count(),
+    })
+
+
+@login_required
+@require_POST
+def reservation_series_cancel(request, pk):
+    """繰り返し予約の今日以降の回をまとめてキャンセルする。"""
+    reservation_series = get_object_or_404(ReservationSeries, pk=pk)
+    if not _can_manage(request.user, reservation_series):
+        messages.error(request, 'この予約をキャンセルする権限がありません。')
+        return redirect('reservations:index')
+    count = series.cancel_upcoming(reservation_series)
+    messages.success(request, f'今後の {count}件の予約をキャンセルしました。')
+    return redirect('reservations:reservation_series_detail', pk=pk)